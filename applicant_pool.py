@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Sampling of applicants from college_applications6000.csv.
+
+Every simulation of a script draws n applicants with applications.sample(n, random_state=seed), which copies the
+DataFrame, and the heuristics of rewrite_08_20200430_s1.py then predict the enroll probability of every sampled
+applicant without and with a scholarship. An ApplicantPool keeps the features of all applications as NumPy arrays and
+represents a sample by the array of its row positions:
+    get_sample(n, seed) returns the same applicants, in the same order, as applications.sample(n, random_state=seed),
+        and draw_samples draws the samples of all (size, seed) pairs of a grid up front,
+    get_features(sample) returns the feature arrays of the sampled applicants, e.g., the constant features of a
+        predicted variable block,
+    get_baseline_probabilities(pretrained_model, ...) predicts the enroll probability of every application at every
+        scholarship level in one call; it is computed once per pretrained model and reused for all sizes and seeds
+        (the table is cached with the formulation of the model, see janos_batch.get_formulation).
+
+Usage in a script:
+
+    applicant_pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+    applicant_pool.draw_samples(student_sizes, range(n_simulations))
+    ...
+    sample = applicant_pool.get_sample(n_students, sim_idx)
+    constant_features = applicant_pool.get_features(sample)
+    probabilities = applicant_pool.get_baseline_probabilities(my_model, ["SAT_scaled", "GPA_scaled", "merit"],
+                                                              "merit", scholarships)[sample]
+"""
+
+import sys
+import numpy as np
+from janos_batch import get_formulation, predict
+
+
+class ApplicantPool:
+    """
+    The ApplicantPool class holds the features of all applications as arrays and draws samples as arrays of row
+    positions.
+    """
+
+    def get_sample(self, size, seed, replace=False):
+        """
+        Return the row positions of a sample of applications, drawn as DataFrame.sample(size, random_state=seed,
+        replace=replace) draws them.
+        :param size: number of applicants
+        :param seed: int
+        :param replace: draw with replacement, e.g., for samples larger than the pool
+        :return: read-only array of row positions
+        """
+        key = (size, seed, replace)
+        if key not in self.samples:
+            if size > self.n and not replace:
+                print("JANOS Error: Cannot sample " + str(size) + " of " + str(self.n) + " applications without "
+                      "replacement ... ")
+                sys.exit(1)
+            sample = np.random.RandomState(seed).choice(self.n, size=size, replace=replace).astype(np.intp)
+            sample.setflags(write=False)
+            self.samples[key] = sample
+        return self.samples[key]
+
+    def draw_samples(self, sizes, seeds, replace=False):
+        """
+        Draw the samples of every size and seed.
+        :param sizes: iterable of numbers of applicants
+        :param seeds: iterable of ints
+        :param replace: draw with replacement
+        :return: dict from (size, seed) to the row positions of the sample
+        """
+        return {(size, seed): self.get_sample(size, seed, replace) for size in sizes for seed in seeds}
+
+    def get_features(self, sample, feature_names=None):
+        """
+        Return the features of the sampled applicants.
+        :param sample: array of row positions
+        :param feature_names: None for all features of the pool
+        :return: dict from feature name to array with one value per sampled applicant
+        """
+        if feature_names is None:
+            feature_names = self.feature_names
+        return {feature_name: self.features[feature_name][sample] for feature_name in feature_names}
+
+    def get_baseline_probabilities(self, pretrained_model, feature_names, decision_feature, levels):
+        """
+        Return the prediction of a pretrained model for every application at every scholarship level.
+        :param pretrained_model: LinearRegression, LogisticRegression (probability of enrolling) or MLPRegressor
+        :param feature_names: the features of the model, in order; all but decision_feature are features of the pool
+        :param decision_feature: the feature that takes the scholarship levels, e.g., 'merit'
+        :param levels: list or array of scholarship levels
+        :return: read-only array (number of applications, number of levels); index its rows with a sample
+        """
+        feature_names = list(feature_names)
+        levels = np.asarray(levels, dtype=float).ravel()
+        if decision_feature not in feature_names:
+            print("JANOS Error: " + str(decision_feature) + " is not a feature of the pretrained model ... ")
+            sys.exit(1)
+        for feature_name in feature_names:
+            if feature_name != decision_feature and feature_name not in self.features:
+                print("JANOS Error: The applicant pool has no feature " + str(feature_name) + " ... ")
+                sys.exit(1)
+        decision_index = feature_names.index(decision_feature)
+        constants = np.column_stack([np.zeros(self.n) if feature_name == decision_feature
+                                     else self.features[feature_name] for feature_name in feature_names])
+
+        def compute():
+            features = np.repeat(constants, levels.size, axis=0)
+            features[:, decision_index] = np.tile(levels, self.n)
+            return predict(pretrained_model, features, feature_names).reshape(self.n, levels.size)
+
+        return get_formulation(pretrained_model).get_derived("baseline_probabilities",
+                                                             [constants, levels, decision_index, feature_names],
+                                                             compute, per_model=True)
+
+    def __len__(self):
+        return self.n
+
+    def __init__(self, applications, feature_names):
+        """
+        :param applications: DataFrame of applications
+        :param feature_names: columns to keep, e.g., ["SAT_scaled", "GPA_scaled"]
+        """
+        self.n = len(applications)
+        self.feature_names = list(feature_names)
+        self.features = {}
+        for feature_name in self.feature_names:
+            values = applications[feature_name].to_numpy(dtype=float, copy=True)
+            values.setflags(write=False)
+            self.features[feature_name] = values
+        self.samples = {}  # (size, seed, replace) -> row positions
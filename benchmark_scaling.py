@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the scaling of JANOS (Figure 3 of the paper).
+
+data_all_scale_20200501_summary.csv averages the JANOS time of 5 simulations per cell. This suite sweeps
+    the predictive model: LinReg, LogReg with every number of breakpoints in breakpoint_counts, and NN with every
+        number of hidden layers in nn_depths (nodes_per_layer nodes each),
+    the number of applicants: student_sizes, from 50 to 50,000 (samples larger than the 6000 applications are drawn
+        with replacement),
+and, for every cell, runs n_warmups solves that are discarded (imports, caches, solver start-up) and n_repeats solves
+that are recorded. Repeat r samples the applicants with random_state=r, so two runs of the suite solve the same
+instances. Every solve builds its model from scratch, and the time of a solve is split into
+    build_time: declaring, encoding and loading the model, i.e., janos_time minus the time the solver reports,
+    solve_time: the time the solver reports (m.gurobi_model.runtime),
+    janos_time: m.get_time(), the sum of both.
+The rows are written through a ResultSink (csv by default), together with the installed version of the janos package
+and the solver backend, so results of different versions can be kept side by side.
+
+Usage:
+
+    python benchmark_scaling.py run [--output results.csv] [--label name]
+    python benchmark_scaling.py summarize results.csv
+    python benchmark_scaling.py compare baseline.csv candidate.csv [--threshold 0.1] [--alpha 0.05]
+
+compare matches the cells of two result files, e.g., of the same suite run with two versions of janos, and flags a
+cell as a regression if the median of a timing of the candidate is more than threshold (relatively) above the
+baseline's and a one-sided Mann-Whitney U test on the repeats rejects equal timings at level alpha. A cell is also
+flagged if the median objective values differ by more than the MIPGap, since the versions then do not solve the same
+problem. The exit status is 1 if anything is flagged, so compare can gate a change. The test needs at least 4 repeats
+per cell: with n repeats on each side, its smallest p-value is 1 / binomial(2n, n), which is 0.05 for 3 repeats.
+"""
+
+import sys
+import argparse
+import importlib.metadata
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+from datetime import datetime
+from janos_main import *
+from experiment_runner import build_grid, run_grid
+from janos_batch import BatchJModel
+from janos_backends import SolverResult
+from janos_profiler import get_profile_columns
+from result_sink import ResultSink, read_results
+from model_cache import fit_cached
+from applicant_pool import ApplicantPool
+pd.options.mode.chained_assignment = None
+
+"""
+set the constant in the benchmark
+"""
+scholarships = [0, 2.5]  # lower and upper bound if the scholarship
+student_sizes = [50, 100, 500, 1000, 5000, 10000, 50000]
+model_types = ["LinReg", "LogReg", "NN"]
+breakpoint_counts = [5, 10, 25]  # configurations of LogReg
+nn_depths = [1, 2, 3]  # configurations of NN: number of hidden layers
+nodes_per_layer = 10
+n_warmups = 1
+n_repeats = 5
+time_limit = 1800
+mip_gap = 0.001
+n_workers = 1  # timings are only comparable if the solves do not compete for cores
+profile_phases = False  # True adds the per-phase columns of janos_profiler (tracemalloc slows the build down)
+result_format = "csv"  # "txt" (tab-separated), "csv" or "parquet"
+
+TIMINGS = ["build_time", "solve_time", "janos_time"]
+CELL = ["PM", "configuration", "student_size"]
+COLUMNS = ["label", "janos_version", "solver", "PM", "configuration", "student_size", "repeat", "build_time",
+           "solve_time", "janos_time", "obj_val", "status", "method"]
+
+"""
+load data and pretrained models
+"""
+historical_student_data = pd.read_csv("college_student_enroll-s1-1.csv")
+applications = pd.read_csv("college_applications6000.csv")
+
+features = ["SAT_scaled", "GPA_scaled", "merit"]
+X = historical_student_data[["SAT", "GPA", "merit"]]
+y = historical_student_data[["enroll"]]
+scaler_sat = fit_cached(StandardScaler(), X[["SAT"]])
+scaler_gpa = fit_cached(StandardScaler(), X[["GPA"]])
+X['SAT_scaled'] = scaler_sat.transform(X[['SAT']])
+X['GPA_scaled'] = scaler_gpa.transform(X[['GPA']])
+applications["SAT_scaled"] = scaler_sat.transform(applications[["SAT"]])
+applications["GPA_scaled"] = scaler_gpa.transform(applications[["GPA"]])
+applicant_pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+
+pretrained_models = {("LinReg", None): fit_cached(LinearRegression(), X[features], y)}
+if "LogReg" in model_types:
+    my_logistic_regression = fit_cached(LogisticRegression(random_state=0, solver='lbfgs'), X[features], y)
+    for n_intervals in breakpoint_counts:
+        pretrained_models[("LogReg", n_intervals)] = my_logistic_regression
+if "NN" in model_types:
+    for n_layers in nn_depths:
+        pretrained_models[("NN", n_layers)] = fit_cached(
+            MLPRegressor(hidden_layer_sizes=[nodes_per_layer] * n_layers, random_state=0), X[features], y)
+
+
+def get_janos_version():
+    """
+    Return the version of the installed janos package.
+    :return: str
+    """
+    try:
+        return importlib.metadata.version("janos")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def get_configurations(pm):
+    """
+    Return the configurations benchmarked for a predictive model.
+    :param pm: 'LinReg', 'LogReg' or 'NN'
+    :return: list of numbers of breakpoints (LogReg), numbers of hidden layers (NN), or [None] (LinReg)
+    """
+    if pm == "LogReg":
+        return breakpoint_counts
+    if pm == "NN":
+        return nn_depths
+    return [None]
+
+
+def build_jobs():
+    """
+    Return the (PM, configuration, student_size) cells of the benchmark.
+    :return: list of tuples
+    """
+    jobs = []
+    for pm in model_types:
+        jobs.extend(build_grid([pm], get_configurations(pm), student_sizes))
+    return jobs
+
+
+def build_model(pm, configuration, student_size, seed):
+    """
+    Build the JANOS model of one solve: maximize the expected enrollment of student_size sampled applicants under a
+    budget of 0.2 per applicant.
+    :param pm: 'LinReg', 'LogReg' or 'NN'
+    :param configuration: number of breakpoints (LogReg), number of hidden layers (NN), or None
+    :param student_size: number of applicants
+    :param seed: random_state of the sample
+    :return: BatchJModel
+    """
+    sample = applicant_pool.get_sample(student_size, seed, replace=student_size > len(applicant_pool))
+    constant_features = applicant_pool.get_features(sample)
+
+    m = BatchJModel(profile=profile_phases)
+    assign_scholarship = m.add_regular_variable_block(student_size, "assign_scholarship")
+    assign_scholarship.setContinuousDomain(lower_bound=scholarships[0], upper_bound=scholarships[1])
+    assign_scholarship.setObjectiveCoefficient(0)
+
+    predictive_model = OptimizationPredictiveModel(m, pretrained_model=pretrained_models[(pm, configuration)],
+                                                   feature_names=features)
+    if pm == "LogReg":
+        predictive_model.set_breakpoints(configuration)
+
+    enroll_probabilities = m.add_predicted_variable_block(student_size, "enroll_probs")
+    enroll_probabilities.setObjectiveCoefficient(1)
+    enroll_probabilities.setPM(predictive_model, {"merit": assign_scholarship,
+                                                  "SAT_scaled": constant_features["SAT_scaled"],
+                                                  "GPA_scaled": constant_features["GPA_scaled"]})
+
+    m.add_block_constraint(assign_scholarship, np.ones(student_size), "less_equal", int(0.2 * student_size))
+
+    m.add_gurobi_param_settings('TimeLimit', time_limit)
+    m.add_gurobi_param_settings('DUALREDUCTIONS', 0)
+    m.add_gurobi_param_settings('MIPGap', mip_gap)
+    m.add_gurobi_param_settings('Threads', 1)
+    m.set_output_flag(0)
+    return m
+
+
+def run_benchmark(job):
+    """
+    Run the warmups and repeats of one (PM, configuration, student_size) cell.
+    :param job: tuple of PM, configuration and student_size
+    :return: list of output rows, one per repeat
+    """
+    pm, configuration, student_size = job
+    rows = []
+    for run in range(n_warmups + n_repeats):
+        repeat = max(run - n_warmups, 0)
+        m = build_model(pm, configuration, student_size, seed=repeat)
+        m.solve()
+        if run < n_warmups:
+            continue
+
+        result = m.gurobi_model
+        janos_time = m.get_time()
+        method = result.method if isinstance(result, SolverResult) else m.backend.name
+        obj_val = result.objVal if result.SolCount > 0 else None
+        rows.append([benchmark_label, get_janos_version(), m.backend.name, pm, configuration, student_size, repeat,
+                     janos_time - result.runtime, result.runtime, janos_time, obj_val, result.status, method]
+                    + m.get_profile())
+        if result.status != GRB.OPTIMAL:
+            print("JANOS Warning: " + pm + "(" + str(configuration) + ") with " + str(student_size) +
+                  " students ended with status " + str(result.status) + " ... ")
+    return rows
+
+
+def summarize(results):
+    """
+    Summarize the timings of every cell over its repeats.
+    :param results: DataFrame read from a benchmark result file
+    :return: DataFrame with the number of repeats and the median, mean, standard deviation and 95% confidence
+        interval of the mean of every timing, per label, version, solver and cell
+    """
+    results = results.copy()
+    results["configuration"] = results["configuration"].fillna(-1)
+    summaries = []
+    for keys, group in results.groupby(["label", "janos_version", "solver"] + CELL, sort=False):
+        summary = dict(zip(["label", "janos_version", "solver"] + CELL, keys))
+        summary["repeats"] = len(group)
+        for timing in TIMINGS:
+            values = group[timing].to_numpy(dtype=float)
+            half_width = np.nan
+            if len(values) > 1:
+                half_width = stats.t.ppf(0.975, len(values) - 1) * values.std(ddof=1) / np.sqrt(len(values))
+            summary[timing + "_median"] = np.median(values)
+            summary[timing + "_mean"] = values.mean()
+            summary[timing + "_std"] = values.std(ddof=1) if len(values) > 1 else np.nan
+            summary[timing + "_ci95"] = half_width
+        summaries.append(summary)
+    summary = pd.DataFrame(summaries)
+    summary["configuration"] = summary["configuration"].replace(-1, np.nan)
+    return summary
+
+
+def compare(baseline, candidate, threshold=0.1, alpha=0.05):
+    """
+    Compare the timings and objective values of two benchmark runs cell by cell.
+    :param baseline: DataFrame read from the result file of the baseline
+    :param candidate: DataFrame read from the result file of the candidate
+    :param threshold: relative slowdown of the median beyond which a significant difference is a regression
+    :param alpha: significance level of the one-sided Mann-Whitney U test
+    :return: DataFrame with one row per cell and timing: the medians, their ratio, the p-value and whether the cell
+        regressed; the timing 'obj_val' flags cells whose median objective values differ by more than mip_gap
+    """
+    baseline = baseline.copy()
+    candidate = candidate.copy()
+    for results in [baseline, candidate]:
+        results["configuration"] = results["configuration"].fillna(-1)
+    candidate_cells = dict(list(candidate.groupby(CELL, sort=False)))
+
+    comparisons = []
+    for cell, baseline_group in baseline.groupby(CELL, sort=False):
+        if cell not in candidate_cells:
+            continue
+        candidate_group = candidate_cells[cell]
+        for timing in TIMINGS:
+            baseline_values = baseline_group[timing].to_numpy(dtype=float)
+            candidate_values = candidate_group[timing].to_numpy(dtype=float)
+            baseline_median = np.median(baseline_values)
+            candidate_median = np.median(candidate_values)
+            ratio = candidate_median / baseline_median if baseline_median > 0 else np.nan
+            p_value = stats.mannwhitneyu(candidate_values, baseline_values, alternative="greater").pvalue
+            comparisons.append(list(cell) + [timing, baseline_median, candidate_median, ratio, p_value,
+                                             bool(ratio > 1 + threshold and p_value < alpha)])
+        baseline_obj = baseline_group["obj_val"].median()
+        candidate_obj = candidate_group["obj_val"].median()
+        mismatch = not np.isclose(candidate_obj, baseline_obj, rtol=mip_gap, atol=mip_gap, equal_nan=True)
+        comparisons.append(list(cell) + ["obj_val", baseline_obj, candidate_obj,
+                                         candidate_obj / baseline_obj if baseline_obj else np.nan, np.nan, mismatch])
+
+    comparison = pd.DataFrame(comparisons, columns=CELL + ["metric", "baseline_median", "candidate_median", "ratio",
+                                                           "p_value", "regression"])
+    comparison["configuration"] = comparison["configuration"].replace(-1, np.nan)
+    return comparison
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the scaling of JANOS.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmark suite")
+    run_parser.add_argument("--output", default=None, help="result file; the extension selects the format")
+    run_parser.add_argument("--label", default=None, help="name of this run, e.g., a branch; defaults to the version")
+    summarize_parser = commands.add_parser("summarize", help="summarize a result file")
+    summarize_parser.add_argument("results")
+    compare_parser = commands.add_parser("compare", help="flag regressions of a candidate against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument("--alpha", type=float, default=0.05)
+    return parser.parse_args()
+
+
+benchmark_label = get_janos_version()
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", None)
+
+    if arguments.command == "run":
+        if arguments.label is not None:
+            benchmark_label = arguments.label
+        filename = arguments.output
+        if filename is None:
+            filename = "benchmark_scaling_" + datetime.now().strftime("%H-%M-%S-%Y%m%d") + "." + result_format
+        columns = COLUMNS + (get_profile_columns() if profile_phases else [])
+        with ResultSink(filename, columns) as sink:
+            run_grid(run_benchmark, build_jobs(), n_workers, sink)
+        print(summarize(read_results(filename)).to_string(index=False))
+
+    elif arguments.command == "summarize":
+        print(summarize(read_results(arguments.results)).to_string(index=False))
+
+    elif arguments.command == "compare":
+        comparison = compare(read_results(arguments.baseline), read_results(arguments.candidate),
+                             arguments.threshold, arguments.alpha)
+        print(comparison.to_string(index=False))
+        regressions = comparison[comparison["regression"]]
+        if len(regressions) > 0:
+            print("JANOS Warning: " + str(len(regressions)) + " regression(s) found ... ")
+            sys.exit(1)
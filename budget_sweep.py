@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Enrollment against budget for the scholarship model of rewrite_08_20200430_s1.py.
+
+rewrite_08_20200430_s1.py solves the model for one budget, BUDGET = 0.2 * n_students. This script traces the whole
+curve: for every predictive model in model_ids and every simulation, it builds the JANOS model once (discrete and
+continuous scholarships) and solves it for every budget in budget_fractions * n_students with
+BatchJModel.sweep_budget, which updates the compiled model and warm-starts every budget from the previous one (or, for
+linear regression with continuous scholarships, computes all budgets from one sort of the applicants). The greedy
+heuristic is evaluated at every budget for comparison.
+
+Usage:
+
+    python budget_sweep.py
+
+The result file has one row per algorithm, model, simulation and budget.
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+from datetime import datetime
+from janos_main import *
+from experiment_runner import build_grid, run_grid
+from janos_batch import BatchJModel
+from result_sink import ResultSink
+from model_cache import fit_cached
+from applicant_pool import ApplicantPool
+from janos_heuristics import greedy_heuristic
+pd.options.mode.chained_assignment = None
+
+"""
+set the constant in the sweep
+"""
+scholarships = [0, 0.5, 1.0, 1.5, 2.0, 2.5]
+n_students = 500
+n_simulations = 5
+budget_fractions = np.arange(0.05, 0.55, 0.05)  # budgets as fractions of n_students; rewrite_08 uses 0.2
+model_ids = [0, 1, 2]  # 0: LinReg, 1: LogReg, 2: NN
+nodes_per_layer = 10
+n_workers = None  # None uses every core (or JANOS_N_WORKERS); 1 runs the grid serially
+result_format = "csv"  # "txt" (tab-separated), "csv" or "parquet"
+lookup_table = True  # True encodes JANOS_discrete with the predictions for every scholarship level (exact)
+piecewise_linear = True  # True encodes a neural network by its exact piecewise-linear response in merit
+
+"""
+load data and pretrained models
+"""
+historical_student_data = pd.read_csv("college_student_enroll-s1-1.csv")
+applications = pd.read_csv("college_applications6000.csv")
+
+X = historical_student_data[["SAT", "GPA", "merit"]]
+y = historical_student_data[["enroll"]]
+scaler_sat = fit_cached(StandardScaler(), X[["SAT"]])
+scaler_gpa = fit_cached(StandardScaler(), X[["GPA"]])
+X['SAT_scaled'] = scaler_sat.transform(X[['SAT']])
+X['GPA_scaled'] = scaler_gpa.transform(X[['GPA']])
+applications["SAT_scaled"] = scaler_sat.transform(applications[["SAT"]])
+applications["GPA_scaled"] = scaler_gpa.transform(applications[["GPA"]])
+
+applicant_pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+applicant_pool.draw_samples([n_students], range(n_simulations))
+
+FEATURES = ["SAT_scaled", "GPA_scaled", "merit"]
+model_names = {0: "LinReg", 1: "LogReg", 2: "NN"}
+pretrained_models = {}
+for model_id in model_ids:
+    if model_id == 0:
+        pretrained_models[model_id] = fit_cached(LinearRegression(), X[FEATURES], y)
+    if model_id == 1:
+        pretrained_models[model_id] = fit_cached(LogisticRegression(random_state=0, solver='lbfgs'), X[FEATURES], y)
+    if model_id == 2:
+        pretrained_models[model_id] = fit_cached(MLPRegressor(hidden_layer_sizes=[nodes_per_layer], random_state=0),
+                                                 X[FEATURES], y)
+
+
+def build_model(constant_features, pretrained_model, discrete):
+    """
+    Build the JANOS model of rewrite_08_20200430_s1.py for one sample of applicants.
+    :param constant_features: dict from "SAT_scaled" and "GPA_scaled" to the values of the applicants
+    :param pretrained_model: LinearRegression, LogisticRegression or MLPRegressor
+    :param discrete: True for the scholarship levels, False for any scholarship between the lowest and highest level
+    :return: the model and its budget constraint
+    """
+    m = BatchJModel()
+    assign_scholarship = m.add_regular_variable_block(n_students, "assign_scholarship")
+    if discrete:
+        assign_scholarship.setDiscreteDomain(scholarships)
+    else:
+        assign_scholarship.setContinuousDomain(scholarships[0], scholarships[-1])
+
+    predictive_model = OptimizationPredictiveModel(m, pretrained_model=pretrained_model, feature_names=FEATURES)
+    enroll_probabilities = m.add_predicted_variable_block(n_students, "enroll_probs")
+    enroll_probabilities.setObjectiveCoefficient(1)
+    enroll_probabilities.setPM(predictive_model, {"merit": assign_scholarship,
+                                                  "SAT_scaled": constant_features["SAT_scaled"],
+                                                  "GPA_scaled": constant_features["GPA_scaled"]})
+    if discrete and lookup_table:
+        enroll_probabilities.setLookupTable()
+    elif isinstance(pretrained_model, MLPRegressor) and piecewise_linear:
+        enroll_probabilities.setPiecewiseLinear()
+
+    budget = m.add_block_constraint(assign_scholarship, np.ones(n_students), "less_equal", int(0.2 * n_students))
+    m.add_gurobi_param_settings('TimeLimit', 1800)
+    m.add_gurobi_param_settings('MIPGap', 0.001)
+    m.add_gurobi_param_settings('Threads', 1)
+    m.set_output_flag(0)
+    return m, budget
+
+
+def run_sweep(job):
+    """
+    Trace enrollment against budget for one (model_id, sim_idx) cell of the grid.
+    :param job: tuple of model_id and sim_idx
+    :return: list of output rows
+    """
+    model_id, sim_idx = job
+    pretrained_model = pretrained_models[model_id]
+    model_name = model_names[model_id]
+    budgets = np.floor(budget_fractions * n_students)
+    sample = applicant_pool.get_sample(n_students, sim_idx)
+    constant_features = applicant_pool.get_features(sample)
+    rows = []
+
+    probabilities = applicant_pool.get_baseline_probabilities(pretrained_model, FEATURES, "merit",
+                                                              scholarships)[sample]
+    for budget in budgets:
+        start_time = time.perf_counter()
+        _, obj_val = greedy_heuristic(probabilities, scholarships, budget, level=scholarships[-1])
+        rows.append(["greedy", model_name, n_students, sim_idx, budget, obj_val, None,
+                     time.perf_counter() - start_time])
+
+    for algorithm, discrete in [("janos_discrete", True), ("janos_continuous", False)]:
+        m, budget_constraint = build_model(constant_features, pretrained_model, discrete)
+        frontier = m.sweep_budget(budget_constraint, budgets)
+        for position in range(budgets.size):
+            rows.append([algorithm, model_name, n_students, sim_idx, budgets[position],
+                         frontier["obj_val"][position], frontier["obj_bound"][position],
+                         frontier["runtime"][position], frontier["status"][position]])
+    return rows
+
+
+if __name__ == "__main__":
+    now = datetime.now()
+    date_time = now.strftime("%H-%M-%S-%Y%m%d")
+    filename = "budget_sweep_" + date_time + "." + result_format
+    # the heuristic has no bound and no solver status, which are NULL in its rows
+    columns = ["Algorithm", "PModel", "n_students", "iteration", "budget", "obj_val", "obj_bound", "runtime",
+               "status"]
+
+    jobs = build_grid(model_ids, range(n_simulations))
+    with ResultSink(filename, columns) as sink:
+        run_grid(run_sweep, jobs, n_workers, sink)
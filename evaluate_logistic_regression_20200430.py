@@ -16,6 +16,13 @@ import time
 from sklearn.neural_network import MLPRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error
+from experiment_runner import build_grid, run_grid, get_worker_models
+from janos_batch import BatchJModel
+from janos_backends import SolverResult
+from janos_profiler import get_profile_columns
+from result_sink import ResultSink
+from model_cache import fit_cached
+from applicant_pool import ApplicantPool
 pd.options.mode.chained_assignment = None
 
 """
@@ -35,6 +42,9 @@ scholarships = [0, 2.5]  # lower and upper bound if the scholarship
 n_simulations = 5  # to have meaningful mean and standard deviation;
 student_sizes = [50, 100, 500, 1000]  # we measure these predictions' RMSE
 interview_sizes = [5, 10, 15, 20, 25]
+n_workers = None  # None uses every core (or JANOS_N_WORKERS); 1 runs the grid serially
+profile_phases = False  # True adds the time, memory and model size of every JANOS phase as extra columns
+result_format = "txt"  # "txt" (tab-separated), "csv" or "parquet"
 
 """
 pretrained model
@@ -45,107 +55,154 @@ y = historical_student_data[["enroll"]]
 
 # Before training the model, standardize SAT and GPA.
 # For convenience, we do not standardize merit.
-scaler_sat = StandardScaler().fit(X[["SAT"]])
-scaler_gpa = StandardScaler().fit(X[["GPA"]])
+scaler_sat = fit_cached(StandardScaler(), X[["SAT"]])
+scaler_gpa = fit_cached(StandardScaler(), X[["GPA"]])
 X['SAT_scaled'] = scaler_sat.transform(X[['SAT']])
 X['GPA_scaled'] = scaler_gpa.transform(X[['GPA']])
 
 
 # Then, train the logistic regression model.
-my_logistic_regression = LogisticRegression(random_state=0, solver='lbfgs').fit(X[["SAT_scaled", "GPA_scaled", "merit"]], y)
+my_logistic_regression = fit_cached(LogisticRegression(random_state=0, solver='lbfgs'),
+                                    X[["SAT_scaled", "GPA_scaled", "merit"]], y)
 
 
 # Also, standardize the SAT and GPA in the application data
 applications["SAT_scaled"] = scaler_sat.transform(applications[["SAT"]])
 applications["GPA_scaled"] = scaler_gpa.transform(applications[["GPA"]])
 
+# The samples of all simulations, as row positions into the applications
+applicant_pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+applicant_pool.draw_samples(student_sizes, range(n_simulations))
+
 """
-Prepare the output file
+Experiments:
 """
-now = datetime.now()
-date_time = now.strftime("%H-%M-%S-%Y%m%d")
-filename = "20200501_logistic_regression_" + date_time + ".txt"
-output = open(filename, "w")
-output.write("PM\t\tstudent_size\t\tn_layers\t\titeration\t\tjanos_time\t\tgurobi_time\t\tobj_val\n")
-output.close()
-
-for student_size in student_sizes:
+
+
+def build_model(n_applications, BUDGET, constant_features, my_logistic_regression, n_intervals):
+    """
+    Build the JANOS model of one cell of the grid.
+    :param n_applications: number of applicants
+    :param BUDGET: total scholarship budget
+    :param constant_features: dict from "SAT_scaled" and "GPA_scaled" to the values of the applicants
+    :param my_logistic_regression: pretrained model
+    :param n_intervals: number of breakpoints of the logistic regression model
+    :return: the model, the block of scholarships and the block of enroll probabilities
+    """
+    m = BatchJModel(profile=profile_phases)
+
+    # Define regular variables
+    assign_scholarship = m.add_regular_variable_block(n_applications, "assign_scholarship")
+    assign_scholarship.setContinuousDomain(lower_bound=scholarships[0], upper_bound=scholarships[1])
+    assign_scholarship.setObjectiveCoefficient(0)
+
+    # Define predicted variables
+    # First, we need to create structures of predictive models. In this case, we associate such a structure with an existing / pretrained logistic regression model.
+    logistic_regression_model = OptimizationPredictiveModel(m, pretrained_model=my_logistic_regression,
+                                                            feature_names=["SAT_scaled", "GPA_scaled", "merit"])
+    logistic_regression_model.set_breakpoints(n_intervals)
+
+    # Now, we could define the predicted decision variables and associate them with the predicted model structure.
+    enroll_probabilities = m.add_predicted_variable_block(n_applications, "enroll_probs")
+    enroll_probabilities.setObjectiveCoefficient(1)
+    mapping_of_vars = {"merit": assign_scholarship,
+                       "SAT_scaled": constant_features["SAT_scaled"],
+                       "GPA_scaled": constant_features["GPA_scaled"]}
+    enroll_probabilities.setPM(logistic_regression_model, mapping_of_vars)
+
+    # Construct constraints
+    # \sum_i x_i <= BUDGET
+    m.add_block_constraint(assign_scholarship, np.ones(n_applications), "less_equal", BUDGET)
+
+    # solve the model
+    m.add_gurobi_param_settings('TimeLimit', 1800)
+    m.add_gurobi_param_settings('DUALREDUCTIONS', 0)
+    m.add_gurobi_param_settings('MIPGap', 0.001)
+    m.add_gurobi_param_settings('Threads', 1)
+    m.set_output_flag(0)
+
+    return m, assign_scholarship, enroll_probabilities
+
+
+def run_simulation(job, models):
+    """
+    Solve one (student_size, n_intervals, iter) cell of the grid.
+    :param job: tuple of student_size, n_intervals and iter
+    :param models: dict of the JANOS models built for earlier simulations of the same cell, which are reused
+    :return: list of output rows
+    """
+    student_size, n_intervals, iter = job
+    rows = []
+
     n_applications = student_size
     BUDGET = int(0.2 * n_applications)
 
-    for n_intervals in interview_sizes:
-
-        for iter in range(n_simulations):
-            random_sample = applications.sample(student_size, random_state=iter)
-            random_sample = random_sample.reset_index()
-
-            m = JModel()
-
-            # Define regular variables
-            assign_scholarship = m.add_regular_variables([n_applications], "assign_scholarship")
-            for app_index in range(n_applications):
-                assign_scholarship[app_index].setContinuousDomain(lower_bound=scholarships[0], upper_bound=scholarships[1])
-                assign_scholarship[app_index].setObjectiveCoefficient(0)
-
-            # Define predicted variables
-            # First, we need to create structures of predictive models. In this case, we associate such a structure with an existing / pretrained logistic regression model.
-            logistic_regression_model = OptimizationPredictiveModel(m, pretrained_model=my_logistic_regression,
-                                                                    feature_names=["SAT_scaled", "GPA_scaled", "merit"])
-            logistic_regression_model.set_breakpoints(n_intervals)
-
-            # Now, we could define the predicted decision variables and associate them with the predicted model structure.
-            enroll_probabilities = m.add_predicted_variables([n_applications], "enroll_probs")
-            for app_index in range(n_applications):
-                enroll_probabilities[app_index].setObjectiveCoefficient(1)
-                mapping_of_vars = {"merit": assign_scholarship[app_index],
-                                   "SAT_scaled": random_sample["SAT_scaled"][app_index],
-                                   "GPA_scaled": random_sample["GPA_scaled"][app_index]}
-                enroll_probabilities[app_index].setPM(logistic_regression_model, mapping_of_vars)
-
-            # Construct constraints
-            # \sum_i x_i <= BUDGET
-            scholarship_deployed = Expression()
-
-            for app_index in range(n_applications):
-                scholarship_deployed.add_term(assign_scholarship[app_index], 1)
-
-            m.add_constraint(scholarship_deployed, "less_equal", BUDGET)
-
-            # solve the model
-            m.add_gurobi_param_settings('TimeLimit', 1800)
-            m.add_gurobi_param_settings('DUALREDUCTIONS', 0)
-            m.add_gurobi_param_settings('MIPGap', 0.001)
-            m.add_gurobi_param_settings('Threads', 1)
-            m.set_output_flag(0)
-            m.solve()
-
-            """
-            write output
-            borrowed from https://www.gurobi.com/documentation/8.1/examples/workforce1_py.html
-            """
-            status = m.gurobi_model.status
-
-            if status == GRB.Status.UNBOUNDED:
-                print('The model cannot be solved because it is unbounded')
-                sys.exit(0)
-            elif status == GRB.Status.OPTIMAL:
-                output = open(filename, "a")
-                output.write("LogReg\t\t" + str(student_size) + "\t\t" + str(n_intervals) + "\t\t" + str(iter) +
-                             "\t\t" + str(m.get_time()) + "\t\t" + str(m.gurobi_model.runtime) +
-                             "\t\t" + str(m.gurobi_model.objval) + "\n")
-                output.close()
-            elif status != GRB.Status.INF_OR_UNBD and status != GRB.Status.INFEASIBLE:
-                print('Optimization was stopped with status %d' % status)
-            else:
-                # if none of the above, then do IIS
-                print('The model is infeasible; computing IIS')
-                m.gurobi_model.computeIIS()
-                m.gurobi_model.write("ip_model_inf.ilp")
-                if m.gurobi_model.IISMinimal:
-                    print('IIS is minimal\n')
-                else:
-                    print('IIS is not minimal\n')
-                print('\nThe following constraint(s) cannot be satisfied:')
-                for c in m.gurobi_model.getConstrs():
-                    if c.IISConstr:
-                        print('%s' % c.constrName)
\ No newline at end of file
+    constant_features = applicant_pool.get_features(applicant_pool.get_sample(student_size, iter))
+    if "janos" in models:
+        # The model of this cell has been built for an earlier simulation; only the applicants change.
+        m, assign_scholarship, enroll_probabilities = models["janos"]
+        enroll_probabilities.setConstantFeatures(constant_features)
+    else:
+        m, assign_scholarship, enroll_probabilities = build_model(n_applications, BUDGET, constant_features,
+                                                                  my_logistic_regression, n_intervals)
+        models["janos"] = (m, assign_scholarship, enroll_probabilities)
+    m.solve()
+
+    """
+    write output
+    borrowed from https://www.gurobi.com/documentation/8.1/examples/workforce1_py.html
+    """
+    status = m.gurobi_model.status
+
+    if status == GRB.Status.UNBOUNDED:
+        print('The model cannot be solved because it is unbounded')
+        sys.exit(0)
+    elif status == GRB.Status.OPTIMAL:
+        rows.append(["LogReg", student_size, n_intervals, iter, m.get_time(), m.gurobi_model.runtime,
+                     m.gurobi_model.objval] + m.get_profile())
+    elif status != GRB.Status.INF_OR_UNBD and status != GRB.Status.INFEASIBLE:
+        print('Optimization was stopped with status %d' % status)
+    else:
+        # if none of the above, then do IIS
+        if isinstance(m.gurobi_model, SolverResult):
+            # only Gurobi computes an IIS; the HiGHS backend leaves a SolverResult
+            print('The model is infeasible; run with JANOS_SOLVER=gurobi to compute an IIS')
+            return rows
+        print('The model is infeasible; computing IIS')
+        m.gurobi_model.computeIIS()
+        m.gurobi_model.write("ip_model_inf.ilp")
+        if m.gurobi_model.IISMinimal:
+            print('IIS is minimal\n')
+        else:
+            print('IIS is not minimal\n')
+        print('\nThe following constraint(s) cannot be satisfied:')
+        for c in m.gurobi_model.getConstrs():
+            if c.IISConstr:
+                print('%s' % c.constrName)
+    return rows
+
+
+def run_cached_simulation(job):
+    """
+    Solve one (student_size, n_intervals, iter) cell of the grid. The JANOS models built by this process for an earlier
+    simulation of the same student size and number of intervals are updated in place with the new applicants.
+    :param job: tuple of the axes of the grid and the simulation index
+    :return: list of output rows
+    """
+    return run_simulation(job, get_worker_models(job[:-1]))
+
+
+if __name__ == "__main__":
+    """
+    Prepare the output file
+    """
+    now = datetime.now()
+    date_time = now.strftime("%H-%M-%S-%Y%m%d")
+    filename = "20200501_logistic_regression_" + date_time + "." + result_format
+    columns = ["PM", "student_size", "configuration", "iteration", "janos_time", "gurobi_time", "obj_val"]
+    if profile_phases:
+        columns += get_profile_columns()
+
+    jobs = build_grid(student_sizes, interview_sizes, range(n_simulations))
+    with ResultSink(filename, columns) as sink:
+        run_grid(run_cached_simulation, jobs, n_workers, sink)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Shared runner for the experiment grids of the evaluation scripts.
+
+Every script sweeps a grid such as (model, student_size, simulation). Each cell of the grid is an independent job:
+it draws its own random sample (seeded by the simulation index) and builds and solves its own JModel. The runner
+sends the jobs to a pool of worker processes, each of which runs one single-threaded solver at a time, and merges
+the rows returned by the jobs into one table in grid order, so the output does not depend on the number of workers
+or on the order in which the jobs complete.
+
+Usage in a script:
+
+    def run_simulation(job):
+        model_id, n_students, sim_idx = job
+        ...
+        return [row_1, row_2, ...]
+
+    if __name__ == "__main__":
+        jobs = build_grid(model_ids, student_sizes, range(n_simulations))
+        with ResultSink(filename, columns) as sink:
+            run_grid(run_simulation, jobs, n_workers, sink)
+
+The job function must be defined at module level so that it can be sent to the worker processes.
+
+Jobs that only differ in the simulation index can reuse the models built for an earlier simulation, updating them
+with the new applicants. get_worker_models keeps the models of the most recent cell in every process:
+
+    def run_cached_simulation(job):
+        return run_simulation(job, get_worker_models(job[:-1]))
+"""
+
+import os
+import sys
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+
+# the cell of the grid whose models this process keeps, and the models
+worker_cell = None
+worker_models = {}
+
+
+def build_grid(*axes):
+    """
+    Return the cartesian product of the given axes as a list of job tuples, in the order of the nested loops.
+    :param axes: iterables, e.g., model ids, student sizes and simulation indices
+    :return: list of tuples
+    """
+    return list(itertools.product(*axes))
+
+
+def get_number_of_workers(n_workers=None):
+    """
+    Return the number of worker processes to use.
+    :param n_workers: None to use the JANOS_N_WORKERS environment variable or, if unset, all cores
+    :return: int
+    """
+    if n_workers is None:
+        n_workers = int(os.environ.get("JANOS_N_WORKERS", os.cpu_count() or 1))
+    if n_workers < 1:
+        print("JANOS Error: The number of workers must be at least 1.")
+        sys.exit(1)
+    return n_workers
+
+
+def init_worker():
+    """
+    Initialize a worker process.
+    The solver in every worker runs single-threaded (Gurobi 'Threads' = 1), so the pool itself provides the
+    parallelism. Limit the BLAS/OpenMP thread pools used by numpy and sklearn to one thread as well, so that the
+    workers do not oversubscribe the cores.
+    :return:
+    """
+    threadpool_limits(limits=1)
+
+
+def run_grid(run_job, jobs, n_workers=None, sink=None):
+    """
+    Run run_job on every job and merge the returned rows into one table.
+    :param run_job: module-level function that takes a job tuple and returns a list of rows
+    :param jobs: list of job tuples, e.g., from build_grid
+    :param n_workers: number of worker processes; 1 runs the jobs serially in this process
+    :param sink: None, or a result_sink.ResultSink to which the rows of every job are written as soon as the job and
+        all jobs before it have finished
+    :return: list of rows, ordered by job and then by the order in which each job returned them
+    """
+    n_workers = min(get_number_of_workers(n_workers), max(len(jobs), 1))
+
+    table = []
+    if n_workers == 1:
+        for job in jobs:
+            rows = run_job(job)
+            if sink is not None:
+                sink.write_rows(rows)
+            table.extend(rows)
+    else:
+        # executor.map yields the results in the order of the jobs, whatever order they complete in.
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker) as executor:
+            for rows in executor.map(run_job, jobs, chunksize=1):
+                if sink is not None:
+                    sink.write_rows(rows)
+                table.extend(rows)
+    return table
+
+
+def get_worker_models(cell):
+    """
+    Return the dict of models that this process built for a cell of the grid, e.g., (model_id, student_size), to be
+    filled and reused by the simulations of the cell. The models of the previous cell are dropped when the process
+    moves on to another cell.
+    :param cell: tuple of the axes of the job other than the simulation index
+    :return: dict
+    """
+    global worker_cell, worker_models
+    if cell != worker_cell:
+        worker_cell = cell
+        worker_models = {}
+    return worker_models
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Solver backends for BatchJModel.
+
+A backend takes the MatrixModel of a BatchJModel, solves it, and returns a result with the attributes that the scripts
+read from m.gurobi_model (status, objVal, objBound, runtime, SolCount, MIPGap) and the values of all variables:
+    gurobi: Gurobi (the default); the result is the Gurobi model itself,
+    highs: the open-source HiGHS MILP solver through scipy.optimize.milp; runs without a license.
+Status codes are those of Gurobi (GRB.OPTIMAL, GRB.INFEASIBLE, ...), so the scripts can compare them with GRB.Status
+whatever backend solved the model. Without gurobipy, GRB is a class with the same values, and only the HiGHS backend
+can be used.
+
+The backend is chosen with m.set_solver(name) or, for scripts that do not choose one, with the JANOS_SOLVER
+environment variable, e.g., JANOS_SOLVER=highs python evaluate_logistic_regression_20200430.py.
+The parameters set with m.add_gurobi_param_settings are passed to Gurobi as they are; the HiGHS backend uses TimeLimit,
+MIPGap and OutputFlag and ignores the others.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+try:
+    from gurobipy import GRB, GurobiError
+except ImportError:
+    class GurobiError(Exception):
+        """
+        Stands in for gurobipy.GurobiError, which is never raised without gurobipy.
+        """
+
+    class GRB:
+        """
+        The constants of gurobipy.GRB used by the batch modules, with the values of Gurobi.
+        """
+        OPTIMAL = 2
+        INFEASIBLE = 3
+        INF_OR_UNBD = 4
+        UNBOUNDED = 5
+        TIME_LIMIT = 9
+        NUMERIC = 12
+        SUBOPTIMAL = 13
+        INFINITY = 1e100
+        UNDEFINED = 1e101
+        CONTINUOUS = "C"
+        BINARY = "B"
+        INTEGER = "I"
+        LESS_EQUAL = "<"
+        EQUAL = "="
+        GREATER_EQUAL = ">"
+        MINIMIZE = 1
+        MAXIMIZE = -1
+
+
+HIGHS_STATUS = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED, 4: GRB.NUMERIC}
+
+
+class SolverResult:
+    """
+    The SolverResult class stands in for the Gurobi model of a model that was not solved by Gurobi.
+    Attribute names are case insensitive, as in gurobipy (e.g., objVal and objval).
+    """
+
+    def getAttr(self, name):
+        return self.__getattr__(name)
+
+    def __getattr__(self, name):
+        attributes = self.__dict__["attributes"]
+        if name.lower() in attributes:
+            return attributes[name.lower()]
+        raise AttributeError("SolverResult has no attribute " + name)
+
+    def __init__(self, status, obj_val, obj_bound, runtime, method, sol_count=1):
+        """
+        :param status: GRB.OPTIMAL, GRB.INFEASIBLE, ...
+        :param obj_val: objective value of the solution
+        :param obj_bound: upper bound on the optimal objective value
+        :param runtime: seconds spent solving
+        :param method: name of the backend or fast path
+        :param sol_count: number of solutions found
+        """
+        gap = 0.0
+        if obj_val != 0:
+            gap = abs(obj_bound - obj_val) / abs(obj_val)
+        self.__dict__["attributes"] = {"status": status, "objval": obj_val, "objbound": obj_bound,
+                                       "runtime": runtime, "solcount": sol_count, "mipgap": gap, "method": method}
+
+
+class GurobiBackend:
+    """
+    The GurobiBackend class solves a MatrixModel with Gurobi. The Gurobi model of the last solve is kept; if the next
+    MatrixModel has the same structure, only the changed values are passed on and the solve starts from the last
+    solution.
+    """
+
+    name = "gurobi"
+
+    def solve(self, jmodel, matrix_model):
+        """
+        Solve matrix_model with the parameters of jmodel.
+        :param jmodel: BatchJModel
+        :param matrix_model: MatrixModel
+        :return: the Gurobi model, and the values of all variables (None without a solution)
+        """
+        profiler = matrix_model.profiler
+        if self.compiled_model is not None and matrix_model.has_same_structure(self.compiled_model[0]):
+            # same structure as the last solve: update the compiled model and warm-start from its solution
+            previous_matrix_model, model, x, previous_solution = self.compiled_model
+            matrix_model.update_gurobi(model, x, previous_matrix_model)
+            if previous_solution is not None and not matrix_model.has_start:
+                x.Start = previous_solution
+        else:
+            model, x = matrix_model.to_gurobi(jmodel.model_name)
+
+        with profiler.phase("solver_load"):
+            if jmodel.write_lp_model:
+                if jmodel.get_lp_model_filename() != "":
+                    model.write(jmodel.get_lp_model_filename())
+                else:
+                    model.write("ipmodel.lp")
+            model.setParam("TimeLimit", jmodel.get_time_limit())
+            model.setParam("OutputFlag", jmodel.get_output_flag())
+            for key, value in jmodel.gurobi_param_settings.items():
+                model.setParam(key, value)
+
+        with profiler.phase("solve"):
+            model.optimize()
+
+        solution = None
+        if model.SolCount > 0:
+            solution = x.X
+        self.compiled_model = (matrix_model, model, x, solution)
+        return model, solution
+
+    def __init__(self):
+        self.compiled_model = None  # matrix model, Gurobi model, MVar and solution of the last solve
+
+
+class HighsBackend:
+    """
+    The HighsBackend class solves a MatrixModel with HiGHS through scipy.optimize.milp. MIP starts are not supported
+    and are ignored.
+    """
+
+    name = "highs"
+
+    def solve(self, jmodel, matrix_model):
+        """
+        Solve matrix_model with the parameters of jmodel.
+        :param jmodel: BatchJModel
+        :param matrix_model: MatrixModel
+        :return: a SolverResult, and the values of all variables (None without a solution)
+        """
+        with matrix_model.profiler.phase("assembly"):
+            lb, ub, obj, vtype, constraint_matrix, senses, rhs = matrix_model.get_arrays()
+            lb = np.where(lb <= -GRB.INFINITY, -np.inf, lb)
+            ub = np.where(ub >= GRB.INFINITY, np.inf, ub)
+            integrality = (vtype != GRB.CONTINUOUS).astype(int)
+            constraints = []
+            if matrix_model.n_constrs > 0:
+                constraints.append(LinearConstraint(constraint_matrix,
+                                                    np.where(senses == GRB.LESS_EQUAL, -np.inf, rhs),
+                                                    np.where(senses == GRB.GREATER_EQUAL, np.inf, rhs)))
+
+        with matrix_model.profiler.phase("solver_load"):
+            settings = {key.lower(): value for key, value in jmodel.gurobi_param_settings.items()}
+            options = {"time_limit": settings.get("timelimit", jmodel.get_time_limit()),
+                       "disp": bool(settings.get("outputflag", jmodel.get_output_flag()))}
+            if "mipgap" in settings:
+                options["mip_rel_gap"] = settings["mipgap"]
+
+        with matrix_model.profiler.phase("solve"):
+            start_time = time.perf_counter()
+            # HiGHS minimizes, and the model maximizes
+            result = milp(-obj, constraints=constraints, integrality=integrality, bounds=Bounds(lb, ub),
+                          options=options)
+            runtime = time.perf_counter() - start_time
+
+        status = HIGHS_STATUS.get(result.status, GRB.NUMERIC)
+        if result.x is None:
+            return SolverResult(status, np.nan, np.nan, runtime, self.name, sol_count=0), None
+        obj_val = -result.fun
+        obj_bound = obj_val
+        dual_bound = getattr(result, "mip_dual_bound", None)
+        if dual_bound is not None and np.isfinite(dual_bound):
+            obj_bound = max(-dual_bound, obj_val)
+        return SolverResult(status, obj_val, obj_bound, runtime, self.name), result.x
+
+
+BACKENDS = {"gurobi": GurobiBackend, "highs": HighsBackend}
+
+
+def get_backend(name=None):
+    """
+    Return a new backend.
+    :param name: 'gurobi' or 'highs'; None uses the JANOS_SOLVER environment variable or, if unset, Gurobi
+    :return: GurobiBackend or HighsBackend
+    """
+    if name is None:
+        name = os.environ.get("JANOS_SOLVER", "gurobi")
+    if name.lower() not in BACKENDS:
+        print("JANOS Error: Unknown solver " + str(name) + "; use one of " + ", ".join(BACKENDS) + " ... ")
+        sys.exit(1)
+    if name.lower() == "gurobi" and not has_gurobi():
+        print("JANOS Error: The gurobi solver needs gurobipy; install it or use JANOS_SOLVER=highs ... ")
+        sys.exit(1)
+    return BACKENDS[name.lower()]()
+
+
+def has_gurobi():
+    """
+    Return whether gurobipy can be imported.
+    :return: bool
+    """
+    try:
+        import gurobipy  # noqa: F401
+    except ImportError:
+        return False
+    return True
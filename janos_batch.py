@@ -0,0 +1,1900 @@
+# -*- coding: utf-8 -*-
+"""
+Batched (array-based) modeling on top of JANOS.
+
+JModel.add_regular_variables / add_predicted_variables create one Python object per applicant, and JModel.optimize
+encodes every predicted variable with its own loop over the features, nodes and breakpoints of the predictive model.
+BatchJModel keeps the same modeling concepts, but a block of variables is declared with NumPy arrays of bounds,
+objective coefficients and fixed feature values, and the encoding of every predictive model is generated for all
+variables in a block at once as a sparse constraint matrix, which is handed to Gurobi in one call.
+
+Usage:
+
+    m = BatchJModel()
+    assign_scholarship = m.add_regular_variable_block(n_applications, "assign_scholarship")
+    assign_scholarship.setContinuousDomain(lower_bound=0, upper_bound=2.5)
+
+    logistic_regression_model = OptimizationPredictiveModel(m, pretrained_model=my_logistic_regression,
+                                                            feature_names=["SAT_scaled", "GPA_scaled", "merit"])
+
+    enroll_probabilities = m.add_predicted_variable_block(n_applications, "enroll_probs")
+    enroll_probabilities.setObjectiveCoefficient(1)
+    enroll_probabilities.setPM(logistic_regression_model, {"merit": assign_scholarship,
+                                                           "SAT_scaled": random_sample["SAT_scaled"].to_numpy(),
+                                                           "GPA_scaled": random_sample["GPA_scaled"].to_numpy()})
+
+    m.add_block_constraint(assign_scholarship, np.ones(n_applications), "less_equal", BUDGET)
+    m.solve()
+
+Constraints over several blocks, or one constraint per applicant, are declared with sparse coefficient matrices:
+
+    at_least_half = BlockExpression(n_applications)
+    at_least_half.add_terms(enroll_probabilities, sp.identity(n_applications))
+    m.add_constraint(at_least_half, "greater_equal", 0.5)
+
+After solving, the values of the variables in a block are in block.X (a NumPy array), and m.get_solution() returns the
+values of all blocks by name. enroll_probabilities.get_approximation_report() compares the enroll probabilities in the
+solution with those the pretrained model predicts for the solution.
+"""
+
+import sys
+import time
+import numbers
+import hashlib
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPRegressor
+from janos_main import JModel, JANOS
+from janos_profiler import NullProfiler, PhaseProfiler
+from janos_fastpath import is_linear_knapsack, solve_linear_knapsack, sweep_linear_knapsack
+from janos_fastpath import is_multiple_choice_knapsack, solve_multiple_choice_knapsack
+from janos_bounds import get_neuron_bounds
+from janos_pwl import get_relu_breakpoints, compact
+from janos_backends import get_backend, GRB, GurobiError
+
+SENSES = {"less_equal": GRB.LESS_EQUAL, "equal": GRB.EQUAL, "greater_equal": GRB.GREATER_EQUAL}
+# smallest max approximation error of adaptive breakpoints; a range of probabilities of width w takes about
+# w / (2 max_error) intervals
+MIN_APPROXIMATION_ERROR = 1e-4
+DERIVED_CACHE_SIZE = 8  # number of per-sample tables (breakpoints, bounds, lookup tables) kept per pretrained model
+
+
+def concatenate(arrays, dtype=float):
+    """
+    Concatenate a list of arrays; an empty list gives an empty array.
+    """
+    if not arrays:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(arrays)
+
+
+def flat_copy(value, shape, dtype=float):
+    """
+    Return a flat copy of value broadcast to shape.
+    """
+    return np.array(np.broadcast_to(np.asarray(value, dtype=dtype), shape), dtype=dtype).ravel()
+
+
+def sigmoid(a):
+    """
+    Return the sigmoid value of every element of a.
+    :param a: array
+    :return: array
+    """
+    return 1.0 / (1.0 + np.exp(-a))
+
+
+def inverse_sigmoid(p):
+    """
+    Return the inverse sigmoid value of every element of p.
+    :param p: array of values in (0, 1)
+    :return: array
+    """
+    return np.log(p / (1.0 - p))
+
+
+def average_sigmoid(a, b):
+    """
+    Return the average sigmoid value between a and b for every pair of elements of a and b.
+    reference: https://math.stackexchange.com/questions/2365763/integrating-logistic-functions
+    """
+    width = b - a
+    same = width == 0
+    safe_width = np.where(same, 1.0, width)
+    average = (np.logaddexp(0.0, b) - np.logaddexp(0.0, a)) / safe_width
+    return np.where(same, sigmoid(a), average)
+
+
+class MatrixModel:
+    """
+    The MatrixModel class collects variables and constraints as arrays and builds the Gurobi model from them.
+    Variables are identified by their position; constraints are stored as the triplets of a sparse matrix.
+    """
+
+    def add_variables(self, shape, lb=0.0, ub=GRB.INFINITY, obj=0.0, vtype=GRB.CONTINUOUS, start=None):
+        """
+        Add variables.
+        :param shape: int or tuple, the shape of the returned index array
+        :param lb: scalar or array broadcastable to shape
+        :param ub: scalar or array broadcastable to shape
+        :param obj: scalar or array broadcastable to shape
+        :param vtype: GRB.CONTINUOUS or GRB.BINARY
+        :param start: None, or scalar or array broadcastable to shape with the values of the variables in the MIP start
+        :return: array of variable indices with the given shape
+        """
+        indices = self.n_vars + np.arange(int(np.prod(shape)), dtype=np.int64).reshape(shape)
+        self.lb.append(flat_copy(lb, indices.shape))
+        self.ub.append(flat_copy(ub, indices.shape))
+        self.obj.append(flat_copy(obj, indices.shape))
+        self.vtype.append(np.full(indices.size, vtype))
+        if start is None:
+            self.start.append(np.full(indices.size, GRB.UNDEFINED))
+        else:
+            self.start.append(flat_copy(start, indices.shape))
+            self.has_start = True
+        self.n_vars += indices.size
+        return indices
+
+    def add_constraints(self, terms, sense, rhs):
+        """
+        Add one linear constraint per element of the index arrays in terms.
+        :param terms: list of (variable indices, coefficients); all arrays are broadcast to one shape, and element i of
+            every term is a term of constraint i
+        :param sense: GRB.LESS_EQUAL, GRB.EQUAL or GRB.GREATER_EQUAL
+        :param rhs: scalar or array broadcastable to the same shape
+        :return: array of constraint indices
+        """
+        shape = np.broadcast_shapes(*[np.shape(index) for index, _ in terms],
+                                    *[np.shape(coeff) for _, coeff in terms])
+        rows = self.n_constrs + np.arange(int(np.prod(shape)), dtype=np.int64).reshape(shape)
+        for index, coeff in terms:
+            self.rows.append(rows.ravel())
+            self.cols.append(flat_copy(index, shape, dtype=np.int64))
+            self.vals.append(flat_copy(coeff, shape))
+        self.senses.append(np.full(rows.size, sense))
+        self.rhs.append(flat_copy(rhs, shape))
+        self.n_constrs += rows.size
+        return rows
+
+    def add_linear_constraint(self, index, coeff, sense, rhs):
+        """
+        Add a single linear constraint sum(coeff * x[index]) sense rhs.
+        :param index: array of variable indices
+        :param coeff: scalar or array of coefficients
+        :param sense: GRB.LESS_EQUAL, GRB.EQUAL or GRB.GREATER_EQUAL
+        :param rhs: scalar
+        :return: the constraint index
+        """
+        index = np.array(index, dtype=np.int64).ravel()
+        self.rows.append(np.full(index.size, self.n_constrs, dtype=np.int64))
+        self.cols.append(index)
+        self.vals.append(flat_copy(coeff, index.shape))
+        self.senses.append(np.full(1, sense))
+        self.rhs.append(np.full(1, rhs, dtype=float))
+        self.n_constrs += 1
+        return self.n_constrs - 1
+
+    def add_sparse_constraints(self, terms, n_rows, sense, rhs):
+        """
+        Add one linear constraint per row of the sparse coefficient matrices in terms.
+        :param terms: list of (variable indices, coefficient matrix); column j of the scipy.sparse matrix holds the
+            coefficients of variable indices[j], and every matrix has n_rows rows
+        :param n_rows: number of constraints
+        :param sense: GRB.LESS_EQUAL, GRB.EQUAL or GRB.GREATER_EQUAL
+        :param rhs: scalar or array with one element per constraint
+        :return: array of constraint indices
+        """
+        rows = self.n_constrs + np.arange(n_rows, dtype=np.int64)
+        for index, coeff in terms:
+            coeff = sp.coo_matrix(coeff)
+            self.rows.append(rows[coeff.row])
+            self.cols.append(np.asarray(index, dtype=np.int64)[coeff.col])
+            self.vals.append(coeff.data.astype(float))
+        self.senses.append(np.full(n_rows, sense))
+        self.rhs.append(flat_copy(rhs, (n_rows,)))
+        self.n_constrs += n_rows
+        return rows
+
+    def get_constraint_matrix(self):
+        """
+        Return the constraint matrix in CSR format.
+        :return: scipy.sparse.csr_matrix
+        """
+        if self.n_constrs == 0:
+            return sp.csr_matrix((0, self.n_vars))
+        vals = np.concatenate(self.vals)
+        nonzero = vals != 0
+        return sp.csr_matrix((vals[nonzero], (np.concatenate(self.rows)[nonzero], np.concatenate(self.cols)[nonzero])),
+                             shape=(self.n_constrs, self.n_vars))
+
+    def get_arrays(self):
+        """
+        Return the model as arrays; the constraint matrix is also kept in self.constraint_matrix.
+        :return: lb, ub, obj, vtype, constraint matrix (CSR), senses and rhs
+        """
+        lb = np.concatenate(self.lb)
+        ub = np.concatenate(self.ub)
+        obj = np.concatenate(self.obj)
+        vtype = np.concatenate(self.vtype)
+        self.constraint_matrix = self.get_constraint_matrix()
+        senses = concatenate(self.senses, dtype=str)
+        rhs = concatenate(self.rhs)
+        return lb, ub, obj, vtype, self.constraint_matrix, senses, rhs
+
+    def to_gurobi(self, model_name):
+        """
+        Build the Gurobi model, maximizing the objective.
+        :param model_name: str
+        :return: the Gurobi model and the MVar of all variables
+        """
+        with self.profiler.phase("assembly"):
+            lb, ub, obj, vtype, constraint_matrix, senses, rhs = self.get_arrays()
+
+        from gurobipy import Model
+
+        with self.profiler.phase("solver_load"):
+            model = Model(model_name)
+            x = model.addMVar(self.n_vars, lb=lb, ub=ub, obj=obj, vtype=vtype)
+            self.gurobi_constrs = []
+            if self.n_constrs > 0:
+                self.gurobi_constrs = model.addMConstr(constraint_matrix, x, senses, rhs).tolist()
+            model.ModelSense = GRB.MAXIMIZE
+            if self.has_start:
+                x.Start = np.concatenate(self.start)
+        return model, x
+
+    def has_same_structure(self, other):
+        """
+        Return whether other has the same variables, constraint senses and constraint terms as this model, so that
+        only bounds and coefficients differ. Encodings whose size depends on the constant features (interval or LP
+        bounds of a neural network, adaptive breakpoints, piecewise-linear encodings) usually differ in structure
+        after setConstantFeatures, and the model is compiled again.
+        :param other: MatrixModel
+        :return: bool
+        """
+        if self.n_vars != other.n_vars or self.n_constrs != other.n_constrs:
+            return False
+        for name in ["vtype", "senses", "rows", "cols"]:
+            if not np.array_equal(concatenate(getattr(self, name)), concatenate(getattr(other, name))):
+                return False
+        return True
+
+    def update_gurobi(self, model, x, previous):
+        """
+        Update the Gurobi model built from previous, which has the same structure as this model, to this model.
+        Only the bounds, objective coefficients and right-hand sides are passed on, and the rows with changed
+        coefficients are replaced in one addMConstr call; the variables and their starts stay as they are.
+        :param model: the Gurobi model built by previous.to_gurobi
+        :param x: the MVar of all variables of model
+        :param previous: MatrixModel
+        :return:
+        """
+        with self.profiler.phase("assembly"):
+            lb = np.concatenate(self.lb)
+            ub = np.concatenate(self.ub)
+            obj = np.concatenate(self.obj)
+            self.constraint_matrix = self.get_constraint_matrix()
+            senses = concatenate(self.senses, dtype=str)
+            rhs = concatenate(self.rhs)
+            changes = (self.constraint_matrix - previous.constraint_matrix).tocoo()
+            changes.eliminate_zeros()
+            changed_rows = np.unique(changes.row)
+
+        with self.profiler.phase("solver_load"):
+            x.LB = lb
+            x.UB = ub
+            x.Obj = obj
+            self.gurobi_constrs = list(previous.gurobi_constrs)
+            if self.n_constrs > 0:
+                model.setAttr("RHS", self.gurobi_constrs, rhs.tolist())
+            if changed_rows.size > 0:
+                model.remove([self.gurobi_constrs[row] for row in changed_rows])
+                constrs = model.addMConstr(self.constraint_matrix[changed_rows], x, senses[changed_rows],
+                                           rhs[changed_rows]).tolist()
+                for row, constr in zip(changed_rows, constrs):
+                    self.gurobi_constrs[row] = constr
+            if self.has_start:
+                x.Start = np.concatenate(self.start)
+
+    def __init__(self, profiler=None):
+        if profiler is None:
+            profiler = NullProfiler()
+        self.profiler = profiler
+        profiler.set_matrix_model(self)
+
+        self.n_vars = 0
+        self.lb = []
+        self.ub = []
+        self.obj = []
+        self.vtype = []
+        self.start = []
+        self.has_start = False  # whether any variable has a value in the MIP start
+
+        self.n_constrs = 0
+        self.rows = []
+        self.cols = []
+        self.vals = []
+        self.senses = []
+        self.rhs = []
+        self.constraint_matrix = None  # CSR matrix; assigned by get_arrays and update_gurobi
+        self.gurobi_constrs = None  # Gurobi constraint of every row; assigned by to_gurobi and update_gurobi
+
+
+class PMFormulation:
+    """
+    The PMFormulation class holds what the encodings extract from a pretrained model: the coefficients of a linear or
+    logistic regression model, or the rounded weights and biases of a neural network. It also keeps the most recently
+    derived tables (breakpoints, bounds of hidden nodes, lookup tables), which depend only on the model and on the
+    arrays they are computed from, so models built for the same applicants (e.g., JANOS_discrete and JANOS_continuous)
+    share them. One formulation is kept per pretrained model (see get_formulation).
+    """
+
+    def get_derived(self, name, arguments, compute, per_model=False):
+        """
+        Return a derived table, computing it only if it is not cached for the same arguments. Tables of a sample of
+        applicants are kept in a cache of the DERIVED_CACHE_SIZE most recently used ones; tables of all applicants
+        (per_model) are kept as long as the formulation, so that the tables of the samples never evict them.
+        :param name: str, the kind of table
+        :param arguments: list of the arrays and values the table is computed from
+        :param compute: function without arguments that computes the table
+        :param per_model: bool, whether the table is computed once per pretrained model
+        :return: the table; its arrays are read-only, as they are shared
+        """
+        hasher = hashlib.sha1(name.encode())
+        for argument in arguments:
+            if isinstance(argument, np.ndarray):
+                hasher.update(repr((argument.shape, argument.dtype.str)).encode())
+                hasher.update(np.ascontiguousarray(argument).tobytes())
+            else:
+                hasher.update(repr(argument).encode())
+        key = hasher.hexdigest()
+        if per_model:
+            if key not in self.model_tables:
+                table = compute()
+                set_read_only(table)
+                self.model_tables[key] = table
+            return self.model_tables[key]
+        if key in self.derived:
+            self.derived.move_to_end(key)
+            return self.derived[key]
+
+        table = compute()
+        set_read_only(table)
+        self.derived[key] = table
+        if len(self.derived) > DERIVED_CACHE_SIZE:
+            self.derived.popitem(last=False)
+        return table
+
+    def is_current(self, pretrained_model):
+        """
+        Return whether the formulation still matches the pretrained model, which is not the case after refitting it.
+        :param pretrained_model: sklearn model
+        :return: bool
+        """
+        parameters = self.get_parameters(pretrained_model)
+        return len(parameters) == len(self.parameters) and \
+            all(parameter is known for parameter, known in zip(parameters, self.parameters))
+
+    @staticmethod
+    def get_parameters(pretrained_model):
+        if isinstance(pretrained_model, MLPRegressor):
+            return list(pretrained_model.coefs_) + list(pretrained_model.intercepts_)
+        return [pretrained_model.coef_, pretrained_model.intercept_]
+
+    def __init__(self, pretrained_model):
+        """
+        Extract the formulation of a pretrained model.
+        :param pretrained_model: LinearRegression, LogisticRegression or MLPRegressor
+        """
+        self.parameters = self.get_parameters(pretrained_model)
+        self.coef = None
+        self.intercept = None
+        self.weights = None
+        self.biases = None
+        if isinstance(pretrained_model, MLPRegressor):
+            self.weights = [np.around(w, decimals=6) for w in pretrained_model.coefs_]
+            self.biases = [np.around(b, decimals=6) for b in pretrained_model.intercepts_]
+        else:
+            self.coef = np.ravel(pretrained_model.coef_).astype(float)
+            self.intercept = float(np.ravel(pretrained_model.intercept_)[0])
+        self.derived = OrderedDict()  # tables of samples, least recently used first
+        self.model_tables = {}  # tables of all applicants, never evicted
+
+
+FORMULATIONS = weakref.WeakKeyDictionary()
+
+
+def set_read_only(table):
+    """
+    Make the arrays in a table, which may be nested in tuples and lists, read-only.
+    """
+    if isinstance(table, np.ndarray):
+        table.setflags(write=False)
+    elif isinstance(table, (tuple, list)):
+        for item in table:
+            set_read_only(item)
+
+
+def predict(pretrained_model, features, feature_names):
+    """
+    Evaluate a pretrained model on all rows of features in one call: the probability of the positive class for a
+    logistic regression model, the prediction otherwise.
+    :param pretrained_model: LinearRegression, LogisticRegression or MLPRegressor
+    :param features: array of shape (n, n_features)
+    :param feature_names: names of the columns of features
+    :return: array of shape (n,)
+    """
+    if hasattr(pretrained_model, "feature_names_in_"):
+        features = pd.DataFrame(features, columns=feature_names)
+    if isinstance(pretrained_model, LogisticRegression):
+        return pretrained_model.predict_proba(features)[:, 1]
+    return np.ravel(pretrained_model.predict(features))
+
+
+def get_formulation(pretrained_model):
+    """
+    Return the formulation of a pretrained model, extracting it only the first time (or after the model was refit).
+    :param pretrained_model: LinearRegression, LogisticRegression or MLPRegressor
+    :return: PMFormulation
+    """
+    formulation = FORMULATIONS.get(pretrained_model)
+    if formulation is None or not formulation.is_current(pretrained_model):
+        formulation = PMFormulation(pretrained_model)
+        FORMULATIONS[pretrained_model] = formulation
+    return formulation
+
+
+class RegularVariableBlock:
+    """
+    The RegularVariableBlock class represents a one-dimensional block of regular variables that share a name.
+    Bounds and objective coefficients are NumPy arrays with one element per variable.
+    """
+
+    def setDiscreteDomain(self, new_domain):
+        """
+        Set the discrete domain shared by all variables in the block.
+        :param new_domain: list or array of numbers
+        :return:
+        """
+        new_domain = np.sort(np.asarray(new_domain, dtype=float).ravel())
+        if new_domain.size < 1:
+            print("JANOS Error: Setting a domain with dimension less than 1 ... ")
+            sys.exit(1)
+        self.discrete_domain = new_domain
+        self.lower_bound = np.full(self.n, new_domain[0])
+        self.upper_bound = np.full(self.n, new_domain[-1])
+        self.variable_type = "discrete"
+
+    def setContinuousDomain(self, lower_bound=None, upper_bound=None):
+        """
+        Set the continuous domain of the variables in the block.
+        :param lower_bound: number or array with one element per variable
+        :param upper_bound: number or array with one element per variable
+        :return:
+        """
+        if lower_bound is None:
+            lower_bound = JANOS.MIN_DOUBLE_VAL
+        if upper_bound is None:
+            upper_bound = JANOS.MAX_DOUBLE_VAL
+        self.lower_bound = self.to_block_array(lower_bound, "lower_bound")
+        self.upper_bound = self.to_block_array(upper_bound, "upper_bound")
+        if np.any(self.lower_bound > self.upper_bound):
+            print("JANOS Error: Setting a lower bound which is higher than the upper bound ... ")
+            sys.exit(1)
+        self.discrete_domain = None
+        self.variable_type = "continuous"
+
+    def setObjectiveCoefficient(self, new_coeff):
+        """
+        Set the objective coefficients of the variables in the block.
+        :param new_coeff: number or array with one element per variable
+        :return:
+        """
+        self.objective_coefficient = self.to_block_array(new_coeff, "objective coefficient")
+
+    def to_block_array(self, value, description):
+        """
+        Broadcast a number or an array to one float per variable in the block.
+        """
+        value = np.asarray(value, dtype=float)
+        if value.ndim > 1 or (value.ndim == 1 and value.size != self.n):
+            print("JANOS Error: The " + description + " of " + self.name + " must be a number or have one value per "
+                  "variable ... ")
+            sys.exit(1)
+        return np.broadcast_to(value, (self.n,)).copy()
+
+    def __len__(self):
+        return self.n
+
+    def __init__(self, variable_set_name, n, parent_dimodel):
+        """
+        Initiate a block of n regular variables.
+        :param variable_set_name:
+        :param n:
+        :param parent_dimodel:
+        """
+        self.name = variable_set_name
+        self.n = n
+        self.parent_dimodel = parent_dimodel
+        self.discrete_domain = None
+        self.lower_bound = np.full(n, JANOS.MIN_DOUBLE_VAL)
+        self.upper_bound = np.full(n, JANOS.MAX_DOUBLE_VAL)
+        self.objective_coefficient = np.zeros(n)
+        self.variable_type = "continuous"
+        self.start = None  # values in the MIP start; see BatchJModel.set_initial_solution
+        self.X = None  # values in the solution
+
+        self.index = None  # positions of the variables in the MatrixModel; assigned when the model is built
+        self.domain_index = None  # positions of the binaries that select a value of a discrete domain, shape (n, k)
+
+
+class PredictedVariableBlock:
+    """
+    The PredictedVariableBlock class represents a one-dimensional block of predicted variables that share a name and
+    a predictive model.
+    """
+
+    def setPM(self, opm, variable_mapping):
+        """
+        Associate the block with a predictive model.
+        :param opm: OptimizationPredictiveModel
+        :param variable_mapping: dict from each feature name of opm to a RegularVariableBlock of the same length, a
+            number, or an array with one value per predicted variable
+        :return:
+        """
+        if not isinstance(variable_mapping, dict):
+            print("JANOS Error: Not a dictionary in the definition of the variable ... ")
+            sys.exit(1)
+        for feature_name in opm.feature_names:
+            if feature_name not in variable_mapping:
+                print("JANOS Error: Feature " + str(feature_name) + " is not mapped for " + self.name + " ... ")
+                sys.exit(1)
+            self.check_feature_value(feature_name, variable_mapping[feature_name])
+
+        self.opm = opm
+        self.variable_mapping = variable_mapping
+
+    def setConstantFeatures(self, feature_values):
+        """
+        Replace the values of features that are mapped to constants, e.g., for a new sample of applicants. The
+        structure of the model does not change, so solving the model again updates the compiled model in place.
+        :param feature_values: dict from feature name to a number or an array with one value per predicted variable
+        :return:
+        """
+        if self.opm is None:
+            print("JANOS Error: No predictive model is set for " + self.name + " ... ")
+            sys.exit(1)
+        variable_mapping = dict(self.variable_mapping)
+        for feature_name, feature_value in feature_values.items():
+            if feature_name not in variable_mapping or isinstance(variable_mapping[feature_name],
+                                                                  RegularVariableBlock):
+                print("JANOS Error: Feature " + str(feature_name) + " is not mapped to a constant for " + self.name +
+                      " ... ")
+                sys.exit(1)
+            self.check_feature_value(feature_name, feature_value)
+            variable_mapping[feature_name] = feature_value
+        self.variable_mapping = variable_mapping
+
+    def check_feature_value(self, feature_name, feature_value):
+        if isinstance(feature_value, RegularVariableBlock):
+            if feature_value.n != self.n:
+                print("JANOS Error: Mapping " + self.name + " to a block of regular variables of another length"
+                                                            " ... ")
+                sys.exit(1)
+        elif np.ndim(feature_value) > 1 or (np.ndim(feature_value) == 1 and np.size(feature_value) != self.n):
+            print("JANOS Error: The values of feature " + str(feature_name) + " must be a number or have one "
+                                                                              "value per variable ... ")
+            sys.exit(1)
+
+    def setObjectiveCoefficient(self, new_coeff):
+        """
+        Set the objective coefficients of the variables in the block.
+        :param new_coeff: number or array with one element per variable
+        :return:
+        """
+        new_coeff = np.asarray(new_coeff, dtype=float)
+        if new_coeff.ndim > 1 or (new_coeff.ndim == 1 and new_coeff.size != self.n):
+            print("JANOS Error: The objective coefficient of " + self.name + " must be a number or have one value per "
+                                                                             "variable ... ")
+            sys.exit(1)
+        self.objective_coefficient = np.broadcast_to(new_coeff, (self.n,)).copy()
+
+    def setMaxApproximationError(self, max_error):
+        """
+        Place the breakpoints of a logistic regression model for every variable adaptively, so that the piecewise-
+        constant approximation of the predicted probability is within max_error everywhere in the range of logits
+        that the variable can reach, instead of using the n_breakpoints of the predictive model.
+        The number of intervals of a variable is about the width of its range of probabilities divided by 2 max_error,
+        whereas the uniform breakpoints give every variable n_breakpoints - 1 intervals with an error of about the
+        width divided by 2 (n_breakpoints - 1). Adaptive breakpoints are cheaper for the same error only because
+        variables with a narrow range get fewer intervals; a max_error well below that of the uniform breakpoints
+        takes many more.
+        :param max_error: number or array with one value per variable, at least MIN_APPROXIMATION_ERROR; None returns
+            to the breakpoints of the predictive model
+        :return:
+        """
+        if max_error is not None:
+            max_error = np.asarray(max_error, dtype=float)
+            if max_error.ndim > 1 or (max_error.ndim == 1 and max_error.size != self.n) or \
+                    np.any(~(max_error >= MIN_APPROXIMATION_ERROR)):
+                print("JANOS Error: The max approximation error of " + self.name + " must be at least " +
+                      str(MIN_APPROXIMATION_ERROR) + " or have one value per variable ... ")
+                sys.exit(1)
+            max_error = np.broadcast_to(max_error, (self.n,)).copy()
+        self.max_approximation_error = max_error
+        self.refined_breakpoints = None
+
+    def setBoundTightening(self, method):
+        """
+        Choose how the bounds of the hidden nodes of a neural network are computed for every variable (see
+        janos_bounds): 'interval' (the default), 'lp', or None for the big-M of JModel.optimize.
+        :param method: 'interval', 'lp' or None
+        :return:
+        """
+        if method not in [None, "interval", "lp"]:
+            print("JANOS Error: Bound tightening must be None, 'interval' or 'lp' ... ")
+            sys.exit(1)
+        self.bound_tightening = method
+
+    def setLookupTable(self, use_lookup_table=True):
+        """
+        Encode the predictive model by a lookup table instead of its symbolic encoding. The block must have one
+        feature mapped to a block of regular variables with a discrete domain: the predictive model is evaluated for
+        every (variable, domain value) pair in one batched call, and every predicted variable takes the value of the
+        domain value that is selected, which is exact for any predictive model.
+        :param use_lookup_table: bool
+        :return:
+        """
+        self.lookup_table = use_lookup_table
+
+    def setPiecewiseLinear(self, use_piecewise_linear=True):
+        """
+        Encode a neural network by the exact piecewise-linear function of its only regular feature for every variable
+        (see janos_pwl) instead of layer by layer: one binary per breakpoint of the variable instead of one per
+        hidden node that can switch, and no big-M.
+        :param use_piecewise_linear: bool
+        :return:
+        """
+        self.piecewise_linear = use_piecewise_linear
+
+    def setLazyRefinement(self, tolerance, initial_error=0.1, max_rounds=10):
+        """
+        Refine the breakpoints of a logistic regression model lazily: the model is first solved with adaptive
+        breakpoints for initial_error; then, as long as the approximated probability of some variables differs from
+        the probability predicted for their solution by more than tolerance, the interval that contains the logit of
+        the solution of only these variables is split by adaptive breakpoints for half their previous error (down to
+        tolerance), and the model is solved again, starting from the previous solution. The other intervals, and the
+        other variables, keep their coarse breakpoints.
+        :param tolerance: number, at least MIN_APPROXIMATION_ERROR, the largest accepted error of a predicted
+            probability in the solution
+        :param initial_error: max approximation error of the first solve
+        :param max_rounds: largest number of refinements
+        :return:
+        """
+        if not isinstance(tolerance, numbers.Number) or not tolerance >= MIN_APPROXIMATION_ERROR:
+            print("JANOS Error: The refinement tolerance of " + self.name + " must be at least " +
+                  str(MIN_APPROXIMATION_ERROR) + " ... ")
+            sys.exit(1)
+        self.refinement_tolerance = tolerance
+        self.initial_error = max(initial_error, tolerance)
+        self.max_refinement_rounds = max_rounds
+        self.start_refinement()
+
+    def start_refinement(self):
+        """
+        Return to the initial error of lazy refinement; called at the start of every solve.
+        :return:
+        """
+        if self.refinement_tolerance is not None:
+            self.setMaxApproximationError(self.initial_error)
+            self.refinement_rounds = 0
+
+    def refine(self):
+        """
+        Split the interval that contains the logit of the solution of the variables whose approximated probability
+        differs from the predicted probability by more than the refinement tolerance, by adaptive breakpoints for half
+        the approximation error of the interval (down to the tolerance).
+        :return: number of refined variables
+        """
+        if self.refinement_tolerance is None or self.lookup_table or self.X is None or self.breakpoints is None or \
+                self.refinement_rounds >= self.max_refinement_rounds:
+            return 0
+        formulation = get_formulation(self.opm.optimization_pm)
+        logit = formulation.intercept + self.get_input_values("X") @ formulation.coef
+        refined = np.flatnonzero(np.abs(sigmoid(logit) - self.X) > self.refinement_tolerance)
+        breakpoints = self.breakpoints[refined]
+        last = self.n_intervals[refined]
+        # the interval of the solution contains its logit (up to the feasibility tolerance, e.g., at a breakpoint
+        # shared by two intervals) and has its approximated probability
+        starts = breakpoints[:, :-1]
+        ends = breakpoints[:, 1:]
+        contains = (starts - 1e-6 <= logit[refined][:, None]) & (logit[refined][:, None] <= ends + 1e-6) & \
+                   (np.arange(starts.shape[1])[None, :] < last[:, None])
+        mismatch = np.abs(average_sigmoid(starts, ends) - self.X[refined][:, None])
+        interval = np.where(contains, mismatch, np.inf).argmin(axis=1)
+        start = breakpoints[np.arange(refined.size), interval]
+        end = breakpoints[np.arange(refined.size), interval + 1]
+        error = get_interval_error(start, end)
+        splittable = error > self.refinement_tolerance
+        refined, breakpoints, last, start, end = [array[splittable] for array in
+                                                  [refined, breakpoints, last, start, end]]
+        if refined.size == 0:
+            return 0
+        max_error = np.maximum(error[splittable] / 2, self.refinement_tolerance)
+        first_constant, second_constant = get_adaptive_breakpoints(start, end, max_error)[:2]
+        upper = breakpoints[np.arange(refined.size), last]
+        points = np.concatenate((breakpoints, first_constant, second_constant[:, -1:]), axis=1)
+        # merge the new breakpoints into the old ones and pad the rows by their upper end
+        points = np.sort(np.minimum(points, upper[:, None]), axis=1)
+        keep = np.concatenate((np.ones((refined.size, 1), dtype=bool), np.diff(points, axis=1) > 0), axis=1)
+        points = compact(points, None, keep, upper)[0]
+
+        width = max(self.breakpoints.shape[1], points.shape[1])
+        refined_breakpoints = np.repeat(self.breakpoints[np.arange(self.n), self.n_intervals][:, None], width, axis=1)
+        refined_breakpoints[:, :self.breakpoints.shape[1]] = self.breakpoints
+        refined_breakpoints[refined] = np.pad(points, ((0, 0), (0, width - points.shape[1])), mode="edge")
+        self.refined_breakpoints = refined_breakpoints
+        self.refinement_rounds += 1
+        return int(refined.size)
+
+    def get_inputs(self):
+        """
+        Split the features of the predictive model into decision variables and constants.
+        :return: list of (feature index, RegularVariableBlock) and an array of shape (n, n_features) whose columns hold
+            the constant features (zero in the columns of the decision variables)
+        """
+        feature_names = list(self.opm.feature_names)
+        variable_inputs = []
+        constants = np.zeros((self.n, len(feature_names)))
+        for feature_index, feature_name in enumerate(feature_names):
+            feature_value = self.variable_mapping[feature_name]
+            if isinstance(feature_value, RegularVariableBlock):
+                variable_inputs.append((feature_index, feature_value))
+            else:
+                constants[:, feature_index] = np.asarray(feature_value, dtype=float)
+        return variable_inputs, constants
+
+    def get_lookup_table(self):
+        """
+        Evaluate the predictive model for every variable and every value of the discrete domain of its only regular
+        feature, in one call of predict (predict_proba for a logistic regression model).
+        :return: the RegularVariableBlock of the feature, and an array (n, k) with the prediction for every domain value
+        """
+        variable_inputs, constants = self.get_inputs()
+        if len(variable_inputs) != 1 or variable_inputs[0][1].variable_type != "discrete":
+            print("JANOS Error: A lookup table needs exactly one feature mapped to a block of regular variables with a "
+                  "discrete domain ... ")
+            sys.exit(1)
+        feature_index, regular_block = variable_inputs[0]
+        domain = regular_block.discrete_domain
+        pretrained_model = self.opm.optimization_pm
+        feature_names = list(self.opm.feature_names)
+
+        def compute():
+            features = np.repeat(constants, domain.size, axis=0)
+            features[:, feature_index] = np.tile(domain, self.n)
+            return predict(pretrained_model, features, feature_names).reshape(self.n, domain.size)
+
+        values = get_formulation(pretrained_model).get_derived("lookup_table", [constants, domain, feature_index,
+                                                                                feature_names], compute)
+        return regular_block, values
+
+    def get_piecewise_linear(self):
+        """
+        Compute the breakpoints of the neural network of the block as a function of its only regular feature, over the
+        domain of every variable.
+        :return: the RegularVariableBlock of the feature, the breakpoints and the values of the network at them, arrays
+            (n, k) with increasing rows padded by the upper bound, and the number of breakpoints of every variable
+        """
+        variable_inputs, constants = self.get_inputs()
+        if len(variable_inputs) != 1 or not isinstance(self.opm.optimization_pm, MLPRegressor):
+            print("JANOS Error: A piecewise-linear encoding needs a neural network with exactly one feature mapped to a "
+                  "block of regular variables ... ")
+            sys.exit(1)
+        if self.opm.optimization_pm.activation != "relu":
+            print("JANOS Error: Only neural networks with ReLU activation are supported ... ")
+            sys.exit(1)
+        feature_index, regular_block = variable_inputs[0]
+        if np.any(regular_block.upper_bound - regular_block.lower_bound > 1e6):
+            print("JANOS Error: A piecewise-linear encoding needs bounded domains; set the bounds of " +
+                  regular_block.name + " ... ")
+            sys.exit(1)
+        formulation = get_formulation(self.opm.optimization_pm)
+        lower_bound = regular_block.lower_bound
+        upper_bound = regular_block.upper_bound
+        breakpoints, values, n_breakpoints = formulation.get_derived(
+            "piecewise_linear", [constants, feature_index, lower_bound, upper_bound],
+            lambda: get_relu_breakpoints(formulation.weights, formulation.biases, constants, feature_index,
+                                         lower_bound, upper_bound))
+        return regular_block, breakpoints, values, n_breakpoints
+
+    def get_input_values(self, attribute):
+        """
+        Return the values of the features in the MIP start or in the solution.
+        :param attribute: 'start' or 'X', the attribute of the regular variable blocks to use
+        :return: array of shape (n, n_features), or None if a regular variable block among the features has no values
+        """
+        variable_inputs, constants = self.get_inputs()
+        for feature_index, regular_block in variable_inputs:
+            values = getattr(regular_block, attribute)
+            if values is None:
+                return None
+            constants[:, feature_index] = values
+        return constants
+
+    def get_approximation_report(self):
+        """
+        Compare the values of the predicted variables in the solution with what the pretrained model predicts for the
+        solution, evaluated for all variables in one call of predict (predict_proba for a logistic regression model).
+        :return: dict with the arrays 'predicted' (by the pretrained model), 'approximated' (the solution) and 'error'
+            (approximated - predicted), and the numbers 'rmse' and 'max_error' (largest absolute error)
+        """
+        input_values = None
+        if self.opm is not None and self.X is not None:
+            input_values = self.get_input_values("X")
+        if input_values is None:
+            print("JANOS Error: " + self.name + " has no solution to report on ... ")
+            sys.exit(1)
+        predicted = predict(self.opm.optimization_pm, input_values, list(self.opm.feature_names))
+        error = self.X - predicted
+        return {"predicted": predicted, "approximated": self.X.copy(), "error": error,
+                "rmse": float(np.sqrt(np.mean(error ** 2))), "max_error": float(np.max(np.abs(error)))}
+
+    def __len__(self):
+        return self.n
+
+    def __init__(self, parentDImodel, variable_set_name, n):
+        """
+        Initiate a block of n predicted variables.
+        :param parentDImodel:
+        :param variable_set_name:
+        :param n:
+        """
+        self.name = variable_set_name
+        self.n = n
+        self.parentDImodel = parentDImodel
+
+        self.opm = None
+        self.variable_mapping = None
+        self.objective_coefficient = np.zeros(n)
+        self.max_approximation_error = None  # array with one value per variable; see setMaxApproximationError
+        self.bound_tightening = "interval"  # see setBoundTightening
+        self.refinement_tolerance = None  # see setLazyRefinement
+        self.initial_error = None
+        self.max_refinement_rounds = 0
+        self.refinement_rounds = 0
+        self.n_intervals = None  # number of intervals of every variable in the encoding of a logistic regression model
+        self.breakpoints = None  # logits at the ends of the intervals of the encoding, padded by the upper end
+        self.refined_breakpoints = None  # breakpoints of the next encoding after lazy refinement; see refine
+        self.n_breakpoints = None  # number of breakpoints of every variable in a piecewise-linear encoding
+        self.lookup_table = False  # see setLookupTable
+        self.piecewise_linear = False  # see setPiecewiseLinear
+        self.X = None  # values in the solution
+
+        self.index = None  # positions of the variables in the MatrixModel; assigned when the model is built
+
+
+class BlockConstraint:
+    """
+    The BlockConstraint class represents the constraint sum_i coefficients[i] * block[i] sense rhs.
+    """
+
+    def setRHS(self, rhs):
+        """
+        Set the right-hand side; solving the model again updates the compiled model in place.
+        :param rhs: number
+        :return:
+        """
+        if not isinstance(rhs, numbers.Number):
+            print("JANOS Error: The right-hand side of a block constraint must be a value ... ")
+            sys.exit(1)
+        self.rhs = rhs
+
+    def __init__(self, block, coefficients, sense, rhs):
+        self.block = block
+        self.coefficients = coefficients
+        self.sense = sense
+        self.rhs = rhs
+
+
+class BlockExpression:
+    """
+    The BlockExpression class represents one or more linear expressions over blocks of regular and predicted variables.
+    The coefficients of every block are a sparse matrix with one row per expression and one column per variable in the
+    block, so that, e.g., the budget sum over all applicants is one array instead of one term per applicant.
+    """
+
+    def add_terms(self, block, coefficients):
+        """
+        Add the terms coefficients * block; the coefficients of a block that is already in the expression are added up.
+        :param block: RegularVariableBlock or PredictedVariableBlock
+        :param coefficients: number or array with one element per variable in the block (expressions with one row), or
+            a 2-D array or scipy.sparse matrix of shape (number of rows, len(block))
+        :return:
+        """
+        if not isinstance(block, (RegularVariableBlock, PredictedVariableBlock)):
+            print("JANOS Error: Terms of an expression must be added for a block of variables ... ")
+            sys.exit(1)
+        if not sp.issparse(coefficients) and np.ndim(coefficients) < 2:
+            if self.n_rows != 1:
+                print("JANOS Error: The coefficients of an expression with several rows must be a matrix ... ")
+                sys.exit(1)
+            coefficients = np.broadcast_to(np.asarray(coefficients, dtype=float), (1, len(block)))
+        coefficients = sp.csr_matrix(coefficients, dtype=float)
+        if coefficients.shape != (self.n_rows, len(block)):
+            print("JANOS Error: The coefficients of " + block.name + " must have shape (" + str(self.n_rows) + ", " +
+                  str(len(block)) + ") ... ")
+            sys.exit(1)
+        if block in self.terms:
+            coefficients = self.terms[block] + coefficients
+        self.terms[block] = coefficients
+
+    def copy(self):
+        new_expression = BlockExpression(self.n_rows)
+        new_expression.terms = dict(self.terms)
+        return new_expression
+
+    def __len__(self):
+        return self.n_rows
+
+    def __init__(self, n_rows=1):
+        """
+        Initiate n_rows empty expressions.
+        :param n_rows: int
+        """
+        if n_rows < 1:
+            print("JANOS Error: An expression must have at least one row ... ")
+            sys.exit(1)
+        self.n_rows = n_rows
+        self.terms = {}  # block -> scipy.sparse.csr_matrix of shape (n_rows, len(block))
+
+
+class ExpressionConstraint:
+    """
+    The ExpressionConstraint class represents the constraints expression[r] sense rhs[r], one per row of a
+    BlockExpression.
+    """
+
+    def setRHS(self, rhs):
+        """
+        Set the right-hand sides; solving the model again updates the compiled model in place.
+        :param rhs: number or array with one element per row of the expression
+        :return:
+        """
+        rhs = np.asarray(rhs, dtype=float)
+        if rhs.ndim > 1 or (rhs.ndim == 1 and rhs.size != len(self.expression)):
+            print("JANOS Error: The right-hand side of a constraint must be a value or have one value per row of its "
+                  "expression ... ")
+            sys.exit(1)
+        self.rhs = np.broadcast_to(rhs, (len(self.expression),)).copy()
+
+    def __init__(self, expression, sense, rhs):
+        self.expression = expression
+        self.sense = sense
+        self.setRHS(rhs)
+
+
+def encode_regular_block(matrix_model, block):
+    """
+    Add the variables of a block of regular variables; a discrete domain is encoded with one binary per value.
+    """
+    if block.variable_type == "discrete":
+        domain = block.discrete_domain
+        start = None
+        w_start = None
+        if block.start is not None:
+            # each start value selects the closest value of the domain
+            closest = np.abs(block.start[:, None] - domain[None, :]).argmin(axis=1)
+            start = domain[closest]
+            w_start = np.eye(domain.size)[closest]
+        block.index = matrix_model.add_variables(block.n, lb=-GRB.INFINITY, ub=GRB.INFINITY,
+                                                 obj=block.objective_coefficient, start=start)
+        w = matrix_model.add_variables((block.n, domain.size), lb=0.0, ub=1.0, vtype=GRB.BINARY, start=w_start)
+        block.domain_index = w
+        # x_i == sum_k domain_k * w_ik and sum_k w_ik == 1
+        matrix_model.add_constraints([(block.index, 1.0)] + [(w[:, k], -domain[k]) for k in range(domain.size)],
+                                     GRB.EQUAL, 0.0)
+        matrix_model.add_constraints([(w[:, k], 1.0) for k in range(domain.size)], GRB.EQUAL, 1.0)
+    else:
+        block.index = matrix_model.add_variables(block.n, lb=block.lower_bound, ub=block.upper_bound,
+                                                 obj=block.objective_coefficient, start=block.start)
+        block.domain_index = None
+
+
+def encode_linear_regression(matrix_model, block):
+    """
+    y_i == intercept + sum_f coef_f * feature_if
+    """
+    formulation = get_formulation(block.opm.optimization_pm)
+    coef = formulation.coef
+    intercept = formulation.intercept
+    variable_inputs, constants = block.get_inputs()
+    input_starts = block.get_input_values("start")
+    start = None
+    if input_starts is not None:
+        start = intercept + input_starts @ coef
+
+    block.index = matrix_model.add_variables(block.n, lb=-GRB.INFINITY, ub=GRB.INFINITY,
+                                             obj=block.objective_coefficient, start=start)
+    terms = [(block.index, 1.0)] + [(regular_block.index, -coef[feature_index])
+                                    for feature_index, regular_block in variable_inputs]
+    matrix_model.add_constraints(terms, GRB.EQUAL, intercept + constants @ coef)
+
+
+def encode_lookup_table(matrix_model, block):
+    """
+    y_i == sum_k value_ik * w_ik, where w_ik selects value k of the discrete domain of the regular variable i
+    """
+    regular_block, values = block.get_lookup_table()
+    start = None
+    if regular_block.start is not None:
+        closest = np.abs(regular_block.start[:, None] - regular_block.discrete_domain[None, :]).argmin(axis=1)
+        start = values[np.arange(block.n), closest]
+
+    block.index = matrix_model.add_variables(block.n, lb=-GRB.INFINITY, ub=GRB.INFINITY,
+                                             obj=block.objective_coefficient, start=start)
+    matrix_model.add_constraints([(block.index, 1.0)] + [(regular_block.domain_index[:, k], -values[:, k])
+                                                         for k in range(values.shape[1])], GRB.EQUAL, 0.0)
+
+
+def encode_piecewise_linear(matrix_model, block):
+    """
+    Incremental formulation of the piecewise-linear function of the regular feature x_i with breakpoints
+    p_i0 < ... < p_im and values v_i0, ..., v_im:
+        x_i == p_i0 + sum_k (p_ik+1 - p_ik) d_ik,  y_i == v_i0 + sum_k (v_ik+1 - v_ik) d_ik,
+        0 <= d_ik <= 1,  d_ik+1 <= z_ik <= d_ik with z_ik binary,
+    so the segments fill up from left to right. The formulation needs m - 1 binaries per variable, none for a linear
+    response. Variables with the same number of breakpoints are encoded together.
+    """
+    regular_block, breakpoints, values, n_breakpoints = block.get_piecewise_linear()
+    n_breakpoints = np.maximum(n_breakpoints, 2)
+    block.n_breakpoints = n_breakpoints
+
+    block.index = np.zeros(block.n, dtype=np.int64)
+    for group_size in np.unique(n_breakpoints):
+        rows = np.flatnonzero(n_breakpoints == group_size)
+        points = breakpoints[rows, :group_size]
+        width = np.diff(points, axis=1)
+        rise = np.diff(values[rows, :group_size], axis=1)
+
+        start = None
+        d_start = None
+        z_start = None
+        if regular_block.start is not None:
+            x_start = np.clip(regular_block.start[rows], points[:, 0], points[:, -1])
+            d_start = np.clip((x_start[:, None] - points[:, :-1]) / np.where(width > 0, width, 1.0), 0.0, 1.0)
+            z_start = (d_start[:, :-1] >= 1).astype(float)
+            start = values[rows, 0] + (d_start * rise).sum(axis=1)
+
+        index = matrix_model.add_variables(rows.size, lb=-GRB.INFINITY, ub=GRB.INFINITY,
+                                           obj=block.objective_coefficient[rows], start=start)
+        d = matrix_model.add_variables((rows.size, group_size - 1), lb=0.0, ub=1.0, start=d_start)
+        z = matrix_model.add_variables((rows.size, group_size - 2), lb=0.0, ub=1.0, vtype=GRB.BINARY, start=z_start)
+        matrix_model.add_constraints([(regular_block.index[rows], 1.0)] +
+                                     [(d[:, k], -width[:, k]) for k in range(group_size - 1)], GRB.EQUAL, points[:, 0])
+        matrix_model.add_constraints([(index, 1.0)] + [(d[:, k], -rise[:, k]) for k in range(group_size - 1)],
+                                     GRB.EQUAL, values[rows, 0])
+        matrix_model.add_constraints([(d[:, 1:], 1.0), (z, -1.0)], GRB.LESS_EQUAL, 0.0)
+        matrix_model.add_constraints([(z, 1.0), (d[:, :-1], -1.0)], GRB.LESS_EQUAL, 0.0)
+        block.index[rows] = index
+
+
+def get_uniform_breakpoints(a, b, n_breakpoints):
+    """
+    Split the range of probabilities [sigmoid(a), sigmoid(b)] of every variable into n_breakpoints - 1 intervals of
+    equal width, as in JModel.optimize.
+    :param a: array, lower bound of the logit of every variable
+    :param b: array, upper bound of the logit of every variable
+    :param n_breakpoints: int
+    :return: logits at the start and end of every interval and the sigmoid value of every interval, each of shape
+        (n, n_breakpoints - 1), and the lowest and highest probability of every variable
+    """
+    eps = JANOS.EPSILON
+
+    # breakpoints, shape (n, n_breakpoints)
+    breakpoints_for_probs = np.linspace(sigmoid(a), sigmoid(b), n_breakpoints, axis=1)
+    breakpoints_for_probs = np.clip(breakpoints_for_probs, eps, 1 - eps)
+    breakpoints_for_lin_expr = inverse_sigmoid(breakpoints_for_probs)
+
+    # intervals, shape (n, n_breakpoints - 1)
+    lb_prob = breakpoints_for_probs[:, :-1]
+    ub_prob = breakpoints_for_probs[:, 1:]
+    lb_saturated = lb_prob <= eps
+    ub_saturated = ub_prob >= 1 - eps
+    first_constant = np.where(lb_saturated, a[:, None], breakpoints_for_lin_expr[:, :-1])
+    second_constant = np.where(ub_saturated, b[:, None], breakpoints_for_lin_expr[:, 1:])
+    prob_val = np.where(lb_saturated & ub_saturated, 0.5,
+                        np.where(ub_saturated, 1 - eps,
+                                 np.where(lb_saturated, eps,
+                                          average_sigmoid(breakpoints_for_lin_expr[:, :-1],
+                                                          breakpoints_for_lin_expr[:, 1:]))))
+
+    min_prob = breakpoints_for_probs.min(axis=1)
+    max_prob = breakpoints_for_probs.max(axis=1)
+    return first_constant, second_constant, prob_val, min_prob, max_prob
+
+
+def get_interval_error(first_constant, second_constant):
+    """
+    Return the largest difference between the sigmoid and its average value over the interval of logits
+    [first_constant, second_constant], for every pair of elements.
+    """
+    average = average_sigmoid(first_constant, second_constant)
+    return np.maximum(average - sigmoid(first_constant), sigmoid(second_constant) - average)
+
+
+def get_adaptive_breakpoints(a, b, max_error):
+    """
+    Split the range of logits [a, b] of every variable into intervals from left to right, each as wide as possible
+    while its average sigmoid value is within max_error of the sigmoid everywhere in it. The intervals are narrow where
+    the sigmoid is steep and wide where it is flat, and a variable whose reachable range of probabilities is small
+    gets few intervals. The number of intervals is about the width of the range of probabilities divided by
+    2 max_error.
+    :param a: array, lower bound of the logit of every variable
+    :param b: array, upper bound of the logit of every variable
+    :param max_error: float or array, target max approximation error of the probability, at least
+        MIN_APPROXIMATION_ERROR
+    :return: logits at the start and end of every interval and the sigmoid value of every interval, each of shape
+        (n, largest number of intervals) with unused intervals at the end of a row, the number of intervals of every
+        variable, and the lowest and highest probability of every variable
+    """
+    if np.any(~(np.asarray(max_error) >= MIN_APPROXIMATION_ERROR)):
+        raise ValueError("max_error must be at least " + str(MIN_APPROXIMATION_ERROR))
+    breakpoints = [a.copy()]
+    current = a.copy()
+    while np.any(current < b):
+        # bisect for the end of the widest interval that starts at current
+        low = current.copy()
+        high = b.copy()
+        for _ in range(60):
+            middle = (low + high) / 2
+            feasible = get_interval_error(current, middle) <= max_error
+            low = np.where(feasible, middle, low)
+            high = np.where(feasible, high, middle)
+        end = np.where(get_interval_error(current, b) <= max_error, b, low)
+        if np.any((current < b) & (end <= current)):
+            raise ValueError("The adaptive breakpoints make no progress; increase max_error")
+        current = np.where(current < b, end, current)
+        breakpoints.append(current)
+    return get_breakpoint_intervals(np.stack(breakpoints, axis=1), a, b)
+
+
+def get_breakpoint_intervals(breakpoints, a, b):
+    """
+    Return the intervals between breakpoints of the logit.
+    :param breakpoints: array (n, k), increasing logits from a to b in every row, padded at the end by repeating b
+    :param a: array, lower bound of the logit of every variable
+    :param b: array, upper bound of the logit of every variable
+    :return: logits at the start and end of every interval and the sigmoid value of every interval, each of shape
+        (n, largest number of intervals) with unused intervals at the end of a row, the number of intervals of every
+        variable, and the lowest and highest probability of every variable
+    """
+    if breakpoints.shape[1] == 1:
+        breakpoints = np.concatenate((breakpoints, breakpoints), axis=1)
+    first_constant = breakpoints[:, :-1]
+    second_constant = breakpoints[:, 1:]
+    n_intervals = np.maximum((second_constant > first_constant).sum(axis=1), 1)
+    prob_val = average_sigmoid(first_constant, second_constant)
+    return first_constant, second_constant, prob_val, n_intervals, sigmoid(a), sigmoid(b)
+
+
+def encode_logistic_regression(matrix_model, block):
+    """
+    Piecewise-constant approximation of the sigmoid of the logit, as in JModel.optimize: the range of logits that each
+    variable can reach is split into intervals, one binary per interval selects the interval that contains the logit,
+    and the predicted variable takes the average sigmoid value over it. The intervals are n_breakpoints - 1 intervals
+    of equal width in probability or, if the block has a max approximation error, placed by get_adaptive_breakpoints.
+    Variables with the same number of intervals are encoded together.
+    """
+    formulation = get_formulation(block.opm.optimization_pm)
+    coef = formulation.coef
+    intercept = formulation.intercept
+    variable_inputs, constants = block.get_inputs()
+
+    with matrix_model.profiler.phase("breakpoints"):
+        # range [a, b] of the logit of every variable
+        constant_logit = intercept + constants @ coef
+        a = constant_logit.copy()
+        b = constant_logit.copy()
+        for feature_index, regular_block in variable_inputs:
+            low = coef[feature_index] * regular_block.lower_bound
+            high = coef[feature_index] * regular_block.upper_bound
+            a += np.minimum(low, high)
+            b += np.maximum(low, high)
+
+        if block.max_approximation_error is None:
+            first_constant, second_constant, prob_val, min_prob, max_prob = formulation.get_derived(
+                "uniform_breakpoints", [a, b, block.opm.n_breakpoints],
+                lambda: get_uniform_breakpoints(a, b, block.opm.n_breakpoints))
+            n_intervals = np.full(block.n, block.opm.n_breakpoints - 1)
+        elif block.refined_breakpoints is not None:
+            first_constant, second_constant, prob_val, n_intervals, min_prob, max_prob = get_breakpoint_intervals(
+                block.refined_breakpoints, a, b)
+        else:
+            max_error = block.max_approximation_error.copy()
+            first_constant, second_constant, prob_val, n_intervals, min_prob, max_prob = formulation.get_derived(
+                "adaptive_breakpoints", [a, b, max_error], lambda: get_adaptive_breakpoints(a, b, max_error))
+    block.n_intervals = n_intervals
+    block.breakpoints = np.concatenate((first_constant, second_constant[:, -1:]), axis=1)
+
+    logit_start = None
+    input_starts = block.get_input_values("start")
+    if input_starts is not None:
+        logit_start = intercept + input_starts @ coef
+
+    block.index = np.zeros(block.n, dtype=np.int64)
+    for group_size in np.unique(n_intervals):
+        rows = np.flatnonzero(n_intervals == group_size)
+        group_start = None
+        if logit_start is not None:
+            group_start = logit_start[rows]
+        block.index[rows] = encode_logistic_intervals(
+            matrix_model, [(coef[feature_index], regular_block.index[rows])
+                           for feature_index, regular_block in variable_inputs],
+            constant_logit[rows], a[rows], b[rows], first_constant[rows, :group_size],
+            second_constant[rows, :group_size], prob_val[rows, :group_size], min_prob[rows], max_prob[rows],
+            block.objective_coefficient[rows], group_start)
+
+
+def encode_logistic_intervals(matrix_model, logit_terms, constant_logit, a, b, first_constant, second_constant,
+                              prob_val, min_prob, max_prob, obj, logit_start):
+    """
+    Add predicted variables whose values are selected from prob_val by the interval that contains their logit.
+    :param logit_terms: list of (coefficient, indices of the regular variables) of the logit
+    :param constant_logit: array (n,), constant part of the logit
+    :param a: array (n,), lower bound of the logit
+    :param b: array (n,), upper bound of the logit
+    :param first_constant: array (n, n_intervals), logit at the start of every interval
+    :param second_constant: array (n, n_intervals), logit at the end of every interval
+    :param prob_val: array (n, n_intervals), value of the predicted variable in every interval
+    :param min_prob: array (n,), lowest probability
+    :param max_prob: array (n,), highest probability
+    :param obj: array (n,), objective coefficients
+    :param logit_start: None, or array (n,) with the logit of the MIP start
+    :return: array of the indices of the predicted variables
+    """
+    eps = JANOS.EPSILON
+    n, n_intervals = prob_val.shape
+
+    start = None
+    z_start = None
+    if logit_start is not None:
+        # the start selects the interval that contains its logit
+        interval = (second_constant[:, :-1] < logit_start[:, None]).sum(axis=1)
+        z_start = np.eye(n_intervals)[interval]
+        start = prob_val[np.arange(n), interval]
+
+    index = matrix_model.add_variables(n, lb=np.maximum(min_prob, 0.0), ub=np.minimum(max_prob, 1.0), obj=obj,
+                                       start=start)
+    z = matrix_model.add_variables((n, n_intervals), lb=0.0, ub=1.0, vtype=GRB.BINARY, start=z_start)
+
+    # pick exactly one interval
+    matrix_model.add_constraints([(z[:, k], 1.0) for k in range(n_intervals)], GRB.EQUAL, 1.0)
+
+    # link the logit with the binaries
+    logit_terms = [(index[:, None], coefficient) for coefficient, index in logit_terms]
+    matrix_model.add_constraints(logit_terms + [(z, -(first_constant - a[:, None]))], GRB.GREATER_EQUAL,
+                                 a[:, None] - constant_logit[:, None])
+    matrix_model.add_constraints(logit_terms + [(z, -(second_constant - b[:, None]))], GRB.LESS_EQUAL,
+                                 b[:, None] - constant_logit[:, None])
+
+    # link the binaries with the predicted probabilities
+    y = index[:, None]
+    matrix_model.add_constraints([(y, 1.0), (z, -(prob_val - min_prob[:, None] - eps))], GRB.GREATER_EQUAL,
+                                 min_prob[:, None])
+    matrix_model.add_constraints([(y, 1.0), (z, -(prob_val - max_prob[:, None] + eps))], GRB.LESS_EQUAL,
+                                 max_prob[:, None])
+    return index
+
+
+def encode_neural_network(matrix_model, block, solver="gurobi"):
+    """
+    Encoding of a ReLU network with one row of nodes per predicted variable. Without bound tightening, every hidden
+    node is encoded with the big-M of JModel.optimize; otherwise see encode_bounded_relu.
+    The constant features are folded into the bias of the first hidden layer, constants @ W + b, computed for all
+    variables at once, so the first layer only has terms for the regular variables and the network has no input nodes.
+    LP bounds are solved by solver, the name of the backend of the model.
+    """
+    pretrained_model = block.opm.optimization_pm
+    if pretrained_model.activation != "relu":
+        print("JANOS Error: Only neural networks with ReLU activation are supported ... ")
+        sys.exit(1)
+    formulation = get_formulation(pretrained_model)
+    weights = formulation.weights
+    biases = formulation.biases
+    variable_inputs, constants = block.get_inputs()
+    big_m = JANOS.BIG_M
+    eps = JANOS.EPSILON
+
+    if block.bound_tightening is not None:
+        # bounds of the inputs: constants are fixed, decision variables range over their domain
+        input_lb = constants.copy()
+        input_ub = constants.copy()
+        for feature_index, regular_block in variable_inputs:
+            input_lb[:, feature_index] = regular_block.lower_bound
+            input_ub[:, feature_index] = regular_block.upper_bound
+        with matrix_model.profiler.phase("bound_tightening"):
+            neuron_bounds = formulation.get_derived(
+                "neuron_bounds", [input_lb, input_ub, block.bound_tightening],
+                lambda: get_neuron_bounds(weights, biases, input_lb, input_ub, block.bound_tightening, solver))
+
+    # values of the nodes in the MIP start, propagated layer by layer
+    post_start = block.get_input_values("start")
+
+    # hidden layers
+    post = None
+    for layer in range(len(weights) - 1):
+        w = weights[layer]
+        layer_size = w.shape[1]
+        # pre == W^T post_prev + b; the first layer takes the regular variables and the folded constants
+        if layer == 0:
+            terms = [(regular_block.index[:, None], -w[feature_index])
+                     for feature_index, regular_block in variable_inputs]
+            bias = constants @ w + biases[layer]
+        else:
+            terms = [(post[:, i][:, None], -w[i]) for i in range(w.shape[0])]
+            bias = biases[layer]
+        pre_start = None
+        if post_start is not None:
+            pre_start = post_start @ w + biases[layer]
+            post_start = np.maximum(pre_start, 0.0)
+
+        if block.bound_tightening is not None:
+            post = encode_bounded_relu(matrix_model, terms, bias, pre_start, *neuron_bounds[layer])
+            continue
+
+        act_start = None
+        if pre_start is not None:
+            act_start = (pre_start > 0).astype(float)
+        pre = matrix_model.add_variables((block.n, layer_size), lb=-GRB.INFINITY, ub=GRB.INFINITY, start=pre_start)
+        act = matrix_model.add_variables((block.n, layer_size), lb=0.0, ub=1.0, vtype=GRB.BINARY, start=act_start)
+        matrix_model.add_constraints([(pre, 1.0)] + terms, GRB.EQUAL, bias)
+        post = matrix_model.add_variables((block.n, layer_size), lb=0.0, ub=GRB.INFINITY, start=post_start)
+        matrix_model.add_constraints([(post, 1.0), (act, -big_m)], GRB.LESS_EQUAL, eps)
+        matrix_model.add_constraints([(pre, 1.0), (act, -big_m)], GRB.LESS_EQUAL, 0.0)
+        matrix_model.add_constraints([(pre, 1.0), (act, -big_m)], GRB.GREATER_EQUAL, -big_m + eps)
+        matrix_model.add_constraints([(post, 1.0), (pre, -1.0), (act, big_m)], GRB.LESS_EQUAL, big_m + eps)
+        matrix_model.add_constraints([(post, 1.0), (pre, -1.0), (act, -big_m)], GRB.GREATER_EQUAL, -big_m - eps)
+
+    # output layer
+    w = weights[-1]
+    start = None
+    if post_start is not None:
+        start = post_start @ w[:, 0] + biases[-1][0]
+    block.index = matrix_model.add_variables(block.n, lb=-GRB.INFINITY, ub=GRB.INFINITY,
+                                             obj=block.objective_coefficient, start=start)
+    matrix_model.add_constraints([(block.index, 1.0)] + [(post[:, i], -w[i, 0]) for i in range(w.shape[0])],
+                                 GRB.EQUAL, biases[-1][0])
+
+
+def encode_bounded_relu(matrix_model, terms, bias, pre_start, lb, ub):
+    """
+    Add a hidden layer whose pre-activations have the bounds [lb, ub]. A node with lb >= 0 is always active
+    (post == pre) and a node with ub <= 0 always inactive (post == 0); only the other nodes get a binary act:
+        post >= pre, post <= ub * act, post <= pre - lb * (1 - act).
+    :param terms: list of (indices, -weights) of the inputs of the layer, so that pre + sum(terms) == bias
+    :param bias: array broadcastable to (n, n_nodes)
+    :param pre_start: None, or array (n, n_nodes) with the pre-activations in the MIP start
+    :param lb: array (n, n_nodes)
+    :param ub: array (n, n_nodes)
+    :return: indices of the outputs of the layer
+    """
+    post_start = None
+    act_start = None
+    unstable = (lb < 0) & (ub > 0)
+    if pre_start is not None:
+        act_start = (pre_start[unstable] > 0).astype(float)
+        post_start = np.maximum(pre_start, 0.0)
+
+    pre = matrix_model.add_variables(lb.shape, lb=lb, ub=ub, start=pre_start)
+    matrix_model.add_constraints([(pre, 1.0)] + terms, GRB.EQUAL, bias)
+    post = matrix_model.add_variables(lb.shape, lb=0.0, ub=np.maximum(ub, 0.0), start=post_start)
+
+    active = lb >= 0
+    matrix_model.add_constraints([(post[active], 1.0), (pre[active], -1.0)], GRB.EQUAL, 0.0)
+
+    act = matrix_model.add_variables(int(unstable.sum()), lb=0.0, ub=1.0, vtype=GRB.BINARY, start=act_start)
+    matrix_model.add_constraints([(post[unstable], 1.0), (pre[unstable], -1.0)], GRB.GREATER_EQUAL, 0.0)
+    matrix_model.add_constraints([(post[unstable], 1.0), (act, -ub[unstable])], GRB.LESS_EQUAL, 0.0)
+    matrix_model.add_constraints([(post[unstable], 1.0), (pre[unstable], -1.0), (act, -lb[unstable])],
+                                 GRB.LESS_EQUAL, -lb[unstable])
+    return post
+
+
+class BatchJModel(JModel):
+    """
+    The BatchJModel class is a JModel whose variables are declared in blocks backed by NumPy arrays.
+    """
+
+    def add_regular_variable_block(self, n, name):
+        """
+        Add a block of n regular variables.
+        :param n: int
+        :param name: str
+        :return: RegularVariableBlock
+        """
+        self.check_new_block(n, name)
+        new_block = RegularVariableBlock(name, n, self)
+        self.regular_variable_blocks.append(new_block)
+        self.names_assigned_to_variables.append(name)
+        return new_block
+
+    def add_predicted_variable_block(self, n, name):
+        """
+        Add a block of n predicted variables.
+        :param n: int
+        :param name: str
+        :return: PredictedVariableBlock
+        """
+        self.check_new_block(n, name)
+        new_block = PredictedVariableBlock(self, name, n)
+        self.predicted_variable_blocks.append(new_block)
+        self.names_assigned_to_variables.append(name)
+        return new_block
+
+    def add_block_constraint(self, block, coefficients, sense, rhs):
+        """
+        Add the constraint sum_i coefficients[i] * block[i] sense rhs.
+        :param block: RegularVariableBlock
+        :param coefficients: number or array with one element per variable in the block
+        :param sense: 'less_equal', 'equal', 'greater_equal'
+        :param rhs: number
+        :return: BlockConstraint
+        """
+        if not isinstance(block, RegularVariableBlock):
+            print("JANOS Error: First argument in add block constraint must be a block of regular variables ... ")
+            sys.exit(1)
+        if sense not in SENSES:
+            print("JANOS Error: Third argument in add block constraint must be less_equal, equal, or greater_equal ... ")
+            sys.exit(1)
+        if not isinstance(rhs, numbers.Number):
+            print("JANOS Error: Fourth argument in add block constraint must be a value ... ")
+            sys.exit(1)
+        new_constraint = BlockConstraint(block, block.to_block_array(coefficients, "coefficients"), sense, rhs)
+        self.block_constraints.append(new_constraint)
+        return new_constraint
+
+    def add_constraint(self, con_expr, sense, rhs):
+        """
+        Add the constraints con_expr[r] sense rhs[r], one per row of the expression.
+        :param con_expr: BlockExpression over blocks of this model
+        :param sense: 'less_equal', 'equal', 'greater_equal'
+        :param rhs: number or array with one element per row of the expression
+        :return: ExpressionConstraint
+        """
+        if not isinstance(con_expr, BlockExpression):
+            print("JANOS Error: First argument in add constraint must be a block expression ... ")
+            sys.exit(1)
+        if sense not in SENSES:
+            print("JANOS Error: Second argument in add constraint must be less_equal, equal, or greater_equal ... ")
+            sys.exit(1)
+        for block in con_expr.terms:
+            if block not in self.regular_variable_blocks + self.predicted_variable_blocks:
+                print("JANOS Error: The expression has terms of " + block.name + ", which is not a block of this "
+                      "model ... ")
+                sys.exit(1)
+        # later changes to con_expr do not change the constraint
+        new_constraint = ExpressionConstraint(con_expr.copy(), sense, rhs)
+        self.expression_constraints.append(new_constraint)
+        return new_constraint
+
+    def remove_block(self, block):
+        """
+        Remove a block of regular or predicted variables, e.g., a group of applicants who withdrew, together with the
+        block constraints on it and its terms in the expression constraints. A block of regular variables can only be
+        removed once no predicted variable block maps a feature to it.
+        :param block: RegularVariableBlock or PredictedVariableBlock of this model
+        :return:
+        """
+        if block not in self.regular_variable_blocks + self.predicted_variable_blocks:
+            print("JANOS Error: Removing a block that is not in this model ... ")
+            sys.exit(1)
+        if isinstance(block, RegularVariableBlock):
+            for predicted_block in self.predicted_variable_blocks:
+                if predicted_block.opm is not None and any(
+                        feature_value is block for feature_value in predicted_block.variable_mapping.values()):
+                    print("JANOS Error: " + block.name + " is a feature of " + predicted_block.name + "; remove that "
+                          "block first ... ")
+                    sys.exit(1)
+            self.regular_variable_blocks.remove(block)
+        else:
+            self.predicted_variable_blocks.remove(block)
+        self.names_assigned_to_variables.remove(block.name)
+        self.block_constraints = [block_constraint for block_constraint in self.block_constraints
+                                  if block_constraint.block is not block]
+        expression_constraints = []
+        for constraint in self.expression_constraints:
+            constraint.expression.terms.pop(block, None)
+            if constraint.expression.terms:
+                expression_constraints.append(constraint)
+        self.expression_constraints = expression_constraints
+
+    def remove_constraint(self, constraint):
+        """
+        Remove a constraint, e.g., a budget that is to be replaced by one over more blocks.
+        :param constraint: BlockConstraint or ExpressionConstraint of this model
+        :return:
+        """
+        if constraint in self.block_constraints:
+            self.block_constraints.remove(constraint)
+        elif constraint in self.expression_constraints:
+            self.expression_constraints.remove(constraint)
+        else:
+            print("JANOS Error: Removing a constraint that is not in this model ... ")
+            sys.exit(1)
+
+    def set_initial_solution(self, block, values):
+        """
+        Set the values of a block of regular variables in the MIP start, e.g., the solution of a heuristic. The values
+        are propagated through the encodings of the predictive models, so that the solver starts from the complete
+        solution they define. The start of a later solve replaces the previous solution as the starting point.
+        :param block: RegularVariableBlock
+        :param values: number or array with one value per variable in the block; None removes the start
+        :return:
+        """
+        if not isinstance(block, RegularVariableBlock):
+            print("JANOS Error: First argument in set initial solution must be a block of regular variables ... ")
+            sys.exit(1)
+        if values is None:
+            block.start = None
+        else:
+            block.start = block.to_block_array(values, "initial solution")
+
+    def check_new_block(self, n, name):
+        if name in self.names_assigned_to_variables:
+            print("JANOS Error: Cannot add two variables with the same name ... ")
+            sys.exit(1)
+        if not isinstance(n, numbers.Integral) or n < 1:
+            print("JANOS Error: The size of a block must be a positive integer ... ")
+            sys.exit(1)
+        if not isinstance(name, str):
+            print("JANOS Error: Variable name not a string ... ")
+            sys.exit(1)
+
+    def get_regular_variable_blocks(self):
+        return self.regular_variable_blocks
+
+    def get_predicted_variable_blocks(self):
+        return self.predicted_variable_blocks
+
+    def get_solution(self):
+        """
+        Return the values of all regular and predicted variables in the solution.
+        :return: dict from block name to an array with the value of every variable in the block
+        """
+        blocks = self.regular_variable_blocks + self.predicted_variable_blocks
+        if not blocks or any(block.X is None for block in blocks):
+            print("JANOS Error: The model has no solution ... ")
+            sys.exit(1)
+        return {block.name: block.X.copy() for block in blocks}
+
+    def set_fast_paths(self, use_fast_paths):
+        """
+        Enable or disable the fast paths of janos_fastpath, which solve special structures (e.g., a linear regression
+        model under a single budget constraint, or lookup tables of a discrete domain under a single budget constraint)
+        without building a MIP. They are enabled by default.
+        :param use_fast_paths: bool
+        :return:
+        """
+        self.use_fast_paths = use_fast_paths
+
+    def set_decomposition(self, decomposition):
+        """
+        Solve the model by decomposition instead of as one MIP, e.g., by pricing its budget with
+        janos_decomposition.LagrangianDecomposition.
+        :param decomposition: an object with is_decomposable(m) and solve(m), or None to solve the model as a MIP
+        :return:
+        """
+        self.decomposition = decomposition
+
+    def set_solver(self, name):
+        """
+        Choose the solver backend (see janos_backends): 'gurobi' or 'highs'. The default is the JANOS_SOLVER
+        environment variable or, if it is unset, Gurobi. Whatever the backend, the result is in self.gurobi_model,
+        with the attributes status, objVal, objBound, runtime, SolCount and MIPGap.
+        :param name: str
+        :return:
+        """
+        self.backend = get_backend(name)
+
+    def solve_by_fast_path(self):
+        """
+        Solve the model by a fast path if its structure allows one.
+        :return: whether the model was solved
+        """
+        if not self.use_fast_paths:
+            return False
+        if is_linear_knapsack(self):
+            fast_path = solve_linear_knapsack
+        elif is_multiple_choice_knapsack(self):
+            fast_path = solve_multiple_choice_knapsack
+        else:
+            return False
+        with self.profiler.phase("solve"):
+            result = fast_path(self)
+        if result is None:
+            return False
+        self.gurobi_model = result
+        return True
+
+    def solve_by_decomposition(self):
+        """
+        Solve the model by the decomposition set with set_decomposition, if any.
+        :return: whether the model was solved
+        """
+        if self.decomposition is None:
+            return False
+        if not self.decomposition.is_decomposable(self):
+            print("JANOS Error: The model does not have the structure the decomposition needs ... ")
+            sys.exit(1)
+        with self.profiler.phase("solve"):
+            result = self.decomposition.solve(self)
+        if result is None:
+            return False
+        self.gurobi_model = result
+        return True
+
+    def build_matrix_model(self):
+        """
+        Encode all blocks and constraints into a MatrixModel.
+        :return: MatrixModel
+        """
+        matrix_model = MatrixModel(self.profiler)
+
+        with self.profiler.phase("variables"):
+            for block in self.regular_variable_blocks:
+                encode_regular_block(matrix_model, block)
+
+        with self.profiler.phase("constraints"):
+            for block_constraint in self.block_constraints:
+                matrix_model.add_linear_constraint(block_constraint.block.index, block_constraint.coefficients,
+                                                   SENSES[block_constraint.sense], block_constraint.rhs)
+
+        with self.profiler.phase("pm_encoding"):
+            for block in self.predicted_variable_blocks:
+                if block.opm is None:
+                    print("JANOS Error: No predictive model is set for " + block.name + " ... ")
+                    sys.exit(1)
+                if block.max_approximation_error is not None and \
+                        not isinstance(block.opm.optimization_pm, LogisticRegression):
+                    print("JANOS Error: Adaptive breakpoints are only available for LogisticRegression models ... ")
+                    sys.exit(1)
+                if block.lookup_table:
+                    encode_lookup_table(matrix_model, block)
+                elif block.piecewise_linear:
+                    encode_piecewise_linear(matrix_model, block)
+                elif isinstance(block.opm.optimization_pm, MLPRegressor):
+                    encode_neural_network(matrix_model, block, self.backend.name)
+                elif isinstance(block.opm.optimization_pm, LinearRegression):
+                    encode_linear_regression(matrix_model, block)
+                elif isinstance(block.opm.optimization_pm, LogisticRegression):
+                    encode_logistic_regression(matrix_model, block)
+                else:
+                    print("JANOS Error: Predictive models must be one of : 'LinearRegression', 'LogisticRegression', "
+                          "or 'MLPRegressor'.")
+                    sys.exit(1)
+
+        with self.profiler.phase("constraints"):
+            # after the encodings, which assign the positions of the predicted variables
+            for constraint in self.expression_constraints:
+                terms = [(block.index, coefficients) for block, coefficients in constraint.expression.terms.items()]
+                matrix_model.add_sparse_constraints(terms, len(constraint.expression), SENSES[constraint.sense],
+                                                    constraint.rhs)
+
+        return matrix_model
+
+    def optimize(self):
+        """
+        It constructs and solves the optimization model.
+        :return: no return
+        """
+        # everything until now was declaring the model
+        self.profiler.end()
+        try:
+            if self.solve_by_fast_path() or self.solve_by_decomposition():
+                return
+
+            for block in self.predicted_variable_blocks:
+                block.start_refinement()
+            # a model that was solved before starts from its last solution
+            self.solve_matrix_model(start_from_solution=self.gurobi_model is not None, keep_starts=True)
+            while self.gurobi_model.SolCount > 0 and self.refine_predicted_variable_blocks():
+                self.solve_matrix_model(start_from_solution=True)
+
+        except GurobiError as e:
+            print('Gurobi error ' + str(e.errno) + ": " + str(e.message))
+        finally:
+            self.profiler.stop()
+
+    def get_warm_starts(self):
+        """
+        Return the values of the blocks of regular variables in the last solution as a MIP start for the current model.
+        The values are clipped to the current bounds. Every less_equal row of a block or expression constraint over
+        regular variables only, with nonnegative coefficients (e.g., a budget over several applicant blocks), that is
+        now violated (e.g., after lowering the budget) moves its variables towards their lower bounds until it holds.
+        Values of discrete domains are then rounded down to the next value of the domain, which keeps these rows
+        satisfied.
+        :return: dict from every RegularVariableBlock with a solution to its start
+        """
+        starts = {block: np.clip(block.X, block.lower_bound, block.upper_bound)
+                  for block in self.regular_variable_blocks if block.X is not None}
+
+        rows = [({block_constraint.block: sp.csr_matrix(block_constraint.coefficients[None, :])},
+                 np.full(1, float(block_constraint.rhs)))
+                for block_constraint in self.block_constraints if block_constraint.sense == "less_equal"]
+        rows += [(constraint.expression.terms, constraint.rhs) for constraint in self.expression_constraints
+                 if constraint.sense == "less_equal"]
+        for terms, rhs in rows:
+            if not all(block in starts for block in terms):
+                continue
+            lhs = sum(coefficients @ starts[block] for block, coefficients in terms.items())
+            base = sum(coefficients @ block.lower_bound for block, coefficients in terms.items())
+            nonnegative = np.ones(rhs.size, dtype=bool)
+            for coefficients in terms.values():
+                nonnegative &= np.asarray(coefficients.min(axis=1).todense()).ravel() >= 0
+            violated = np.flatnonzero(nonnegative & (lhs > rhs) & (lhs > base))
+            share = np.clip((rhs - base) / np.where(lhs > base, lhs - base, 1.0), 0.0, 1.0)
+            for block, coefficients in terms.items():
+                # every variable of a violated row moves by the share of the most violated of its rows
+                factor = np.ones(block.n)
+                entries = coefficients[violated].tocoo()
+                np.minimum.at(factor, entries.col, share[violated][entries.row])
+                starts[block] = block.lower_bound + factor * (starts[block] - block.lower_bound)
+
+        for block, start in starts.items():
+            if block.variable_type == "discrete":
+                domain = block.discrete_domain
+                below = np.searchsorted(domain, start + 1e-9, side="right") - 1
+                starts[block] = domain[np.maximum(below, 0)]
+        return starts
+
+    def solve_matrix_model(self, start_from_solution=False, keep_starts=False):
+        """
+        Encode the model, pass it to the solver backend and solve it; the values of the variables are stored in the
+        blocks.
+        :param start_from_solution: use the values of the regular variables in the last solution as the MIP start
+            (see get_warm_starts), e.g., after refining the encoding or changing the model
+        :param keep_starts: with start_from_solution, keep the start of the blocks that have one
+            (set_initial_solution)
+        :return: no return
+        """
+        user_starts = [block.start for block in self.regular_variable_blocks]
+        if start_from_solution:
+            warm_starts = self.get_warm_starts()
+            for block in self.regular_variable_blocks:
+                if block.start is None or not keep_starts:
+                    block.start = warm_starts.get(block)
+        try:
+            matrix_model = self.build_matrix_model()
+        finally:
+            for block, start in zip(self.regular_variable_blocks, user_starts):
+                block.start = start
+
+        model, solution = self.backend.solve(self, matrix_model)
+        self.gurobi_model = model
+        if solution is not None:
+            for block in self.regular_variable_blocks + self.predicted_variable_blocks:
+                block.X = solution[block.index]
+
+    def refine_predicted_variable_blocks(self):
+        """
+        Refine the encoding of the blocks with lazy refinement (PredictedVariableBlock.setLazyRefinement).
+        :return: whether any block was refined
+        """
+        n_refined = 0
+        for block in self.predicted_variable_blocks:
+            n_refined += block.refine()
+        return n_refined > 0
+
+    def solve(self):
+        """
+        Solve the model. Solving it again after changing constant features (PredictedVariableBlock.setConstantFeatures),
+        bounds, objective coefficients or right-hand sides reuses the compiled Gurobi model: only the changed values are
+        passed to Gurobi, which starts from the previous solution. After adding or removing blocks (remove_block), the
+        model is compiled again, and the solve starts from the previous solution of the blocks that are still in the
+        model (see get_warm_starts). get_time() and get_profile() then cover the last solve only.
+        :return: no return
+        """
+        if self.gurobi_model is not None:
+            self.start_time = time.time()
+            self.profiler = self.create_profiler()
+        super().solve()
+
+    def sweep_budget(self, budget, budgets):
+        """
+        Solve the model for every right-hand side of a budget constraint, e.g., to trace enrollment against budget.
+        If the model is a continuous knapsack (see janos_fastpath), the solutions of all budgets follow from one sort of
+        the applicants (the parametric solution of the LP in the budget). Otherwise the budgets are solved in order,
+        starting at the budget whose solutions are feasible for the next (the smallest for a less_equal budget), and
+        every solve updates the compiled model and starts from the solution of the previous budget (see solve).
+        The right-hand side of the budget is restored afterwards; block.X holds the solution of the last budget solved, the
+        largest for a less_equal budget.
+        :param budget: BlockConstraint or ExpressionConstraint with one row, of this model
+        :param budgets: list or array of right-hand sides
+        :return: dict with the arrays 'budget', 'obj_val', 'obj_bound', 'status' and 'runtime' (seconds per budget), in
+            the order of budgets, and 'solution', a dict from block name to an array (number of budgets, n) with the
+            values of the block in every solution (NaN where a budget has no solution)
+        """
+        if budget not in self.block_constraints + [constraint for constraint in self.expression_constraints
+                                                   if len(constraint.expression) == 1]:
+            print("JANOS Error: The budget of a sweep must be a constraint of this model with one row ... ")
+            sys.exit(1)
+        budgets = np.asarray(budgets, dtype=float).ravel()
+        blocks = self.regular_variable_blocks + self.predicted_variable_blocks
+        frontier = {"budget": budgets.copy(), "obj_val": np.full(budgets.size, np.nan),
+                    "obj_bound": np.full(budgets.size, np.nan), "status": np.zeros(budgets.size, dtype=int),
+                    "runtime": np.zeros(budgets.size),
+                    "solution": {block.name: np.full((budgets.size, block.n), np.nan) for block in blocks}}
+
+        if self.use_fast_paths and self.decomposition is None and is_linear_knapsack(self) and \
+                budget in self.block_constraints:
+            start_time = time.perf_counter()
+            sweep = sweep_linear_knapsack(self, budgets)
+            if sweep is not None:
+                obj_vals, values = sweep
+                frontier["obj_val"] = obj_vals
+                frontier["obj_bound"] = obj_vals.copy()
+                frontier["status"][:] = GRB.OPTIMAL
+                frontier["runtime"][:] = (time.perf_counter() - start_time) / max(budgets.size, 1)
+                for block in blocks:
+                    frontier["solution"][block.name] = values[block]
+                    block.X = values[block][np.argmax(budgets)]
+                return frontier
+
+        rhs = budget.rhs
+        order = np.argsort(budgets, kind="stable")
+        if budget.sense == "greater_equal":
+            order = order[::-1]
+        try:
+            for position in order:
+                budget.setRHS(float(budgets[position]))
+                self.solve()
+                if self.gurobi_model is None:
+                    continue
+                frontier["status"][position] = self.gurobi_model.status
+                frontier["runtime"][position] = self.get_time()
+                if self.gurobi_model.SolCount > 0:
+                    frontier["obj_val"][position] = self.gurobi_model.objVal
+                    frontier["obj_bound"][position] = self.gurobi_model.objBound
+                    for block in blocks:
+                        frontier["solution"][block.name][position] = block.X
+        finally:
+            budget.setRHS(rhs)
+        return frontier
+
+    def create_profiler(self):
+        if self.profile:
+            return PhaseProfiler()
+        return NullProfiler()
+
+    def get_profile(self):
+        """
+        Return the per-phase metrics recorded by the profiler (see janos_profiler), in the order of
+        janos_profiler.get_profile_columns(); empty if profiling is disabled.
+        :return: list
+        """
+        return self.profiler.get_values()
+
+    def __init__(self, opt_model_name=None, profile=False):
+        """
+        Create a JANOS model whose variables are declared in blocks.
+        :param opt_model_name:
+        :param profile: record the time, memory and model size of every phase of building and solving the model
+        """
+        super().__init__(opt_model_name)
+        self.regular_variable_blocks = []
+        self.predicted_variable_blocks = []
+        self.block_constraints = []
+        self.expression_constraints = []
+        self.use_fast_paths = True
+        self.decomposition = None  # see set_decomposition
+        self.backend = get_backend()
+
+        self.profile = profile
+        self.profiler = self.create_profiler()
+        self.profiler.begin("declare")
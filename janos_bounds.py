@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Bounds on the pre-activations of the hidden nodes of a ReLU network, for every predicted variable.
+
+JModel.optimize encodes every hidden node with the same big-M (JANOS.BIG_M). With bounds [L, U] on the pre-activation
+of a node for a given applicant, the node is encoded with M = U and -L instead, and nodes whose bounds do not contain
+zero are fixed: a node with L >= 0 is always active (post == pre) and a node with U <= 0 is always inactive
+(post == 0), so neither needs a binary.
+
+Bounds are computed layer by layer from the bounds of the inputs (constants are fixed, decision variables range over
+their domain) by
+    interval arithmetic: the bounds of W^T x + b over the box of bounds of x, or
+    LP: the smallest and largest value of each pre-activation over the LP relaxation of the preceding layers, in which
+        every node that is not fixed is relaxed to its triangle post >= 0, post >= pre, post <= U (pre - L) / (U - L).
+        The predicted variables are independent, so one LP per node and direction gives the bounds of all of them.
+        The LPs are solved by Gurobi or, with the highs solver, by HiGHS through scipy.optimize.linprog.
+"""
+
+import sys
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+# LP bounds are loosened by this amount, so that the tolerances of the LP solver never cut off a feasible solution
+LP_BOUND_TOLERANCE = 1e-6
+
+
+def get_interval_bounds(w, b, input_lb, input_ub):
+    """
+    Return the bounds of input @ w + b over the box [input_lb, input_ub].
+    :param w: array (n_inputs, n_nodes)
+    :param b: array (n_nodes,)
+    :param input_lb: array (n, n_inputs)
+    :param input_ub: array (n, n_inputs)
+    :return: arrays (n, n_nodes) of lower and upper bounds
+    """
+    w_positive = np.maximum(w, 0.0)
+    w_negative = np.minimum(w, 0.0)
+    lb = input_lb @ w_positive + input_ub @ w_negative + b
+    ub = input_ub @ w_positive + input_lb @ w_negative + b
+    return lb, ub
+
+
+def get_triangle(lb, ub):
+    """
+    Return the upper side of the LP relaxation of post = max(pre, 0) over [lb, ub], post <= slope * pre + offset:
+    post <= pre if the node is active, post <= 0 if it is inactive, and the triangle otherwise.
+    :param lb: array of lower bounds of pre
+    :param ub: array of upper bounds of pre
+    :return: arrays slope and offset
+    """
+    unstable = (lb < 0) & (ub > 0)
+    width = np.where(unstable, ub - lb, 1.0)
+    slope = np.where(unstable, ub / width, np.where(lb >= 0, 1.0, 0.0))
+    offset = np.where(unstable, -ub * lb / width, 0.0)
+    return slope, offset
+
+
+def get_lp_bounds(weights, biases, input_lb, input_ub, bounds, layer, solver="gurobi"):
+    """
+    Return the bounds of the pre-activations of a hidden layer over the LP relaxation of the preceding layers.
+    :param weights: list of weight arrays of the network
+    :param biases: list of bias arrays of the network
+    :param input_lb: array (n, n_inputs)
+    :param input_ub: array (n, n_inputs)
+    :param bounds: list of (lb, ub) of the pre-activations of the layers before layer
+    :param layer: index of the hidden layer
+    :param solver: 'gurobi' or 'highs'
+    :return: arrays (n, n_nodes) of lower and upper bounds
+    """
+    if solver == "highs":
+        lb, ub = get_highs_lp_bounds(weights, biases, input_lb, input_ub, bounds, layer)
+    else:
+        lb, ub = get_gurobi_lp_bounds(weights, biases, input_lb, input_ub, bounds, layer)
+    return lb - LP_BOUND_TOLERANCE, ub + LP_BOUND_TOLERANCE
+
+
+def get_gurobi_lp_bounds(weights, biases, input_lb, input_ub, bounds, layer):
+    """
+    Solve the LPs of get_lp_bounds with Gurobi.
+    """
+    from gurobipy import Model, GRB
+
+    model = Model("bound_tightening")
+    model.Params.OutputFlag = 0
+    post = model.addMVar(input_lb.shape, lb=input_lb, ub=input_ub)
+    for k in range(layer):
+        lb, ub = bounds[k]
+        pre = model.addMVar(lb.shape, lb=lb, ub=ub)
+        model.addConstr(pre == post @ weights[k] + biases[k])
+        post_next = model.addMVar(lb.shape, lb=0.0, ub=np.maximum(ub, 0.0))
+        slope, offset = get_triangle(lb, ub)
+        model.addConstr(post_next >= pre)
+        model.addConstr(post_next <= pre * slope + offset)
+        post = post_next
+
+    expression = post @ weights[layer]
+    lb = np.zeros((input_lb.shape[0], weights[layer].shape[1]))
+    ub = np.zeros_like(lb)
+    for node in range(weights[layer].shape[1]):
+        for sense, values in [(GRB.MINIMIZE, lb), (GRB.MAXIMIZE, ub)]:
+            model.setObjective(expression[:, node].sum(), sense)
+            model.optimize()
+            if model.Status != GRB.OPTIMAL:
+                print("JANOS Error: The LP for the bounds of the neural network ended with status " +
+                      str(model.Status) + " ... ")
+                sys.exit(1)
+            values[:, node] = post.X @ weights[layer][:, node] + biases[layer][node]
+    model.dispose()
+    return lb, ub
+
+
+def get_highs_lp_bounds(weights, biases, input_lb, input_ub, bounds, layer):
+    """
+    Solve the LPs of get_lp_bounds with HiGHS. The variables are the inputs and, for every preceding layer, its
+    pre-activations and post-activations, each as an (n, n_nodes) block flattened by rows.
+    """
+    n = input_lb.shape[0]
+    applicants = sp.identity(n, format="csr")
+    var_lb = [input_lb.ravel()]
+    var_ub = [input_ub.ravel()]
+    equalities = []  # blocks of (column, matrix) and right-hand sides
+    inequalities = []
+    post_column = 0
+    n_vars = input_lb.size
+    for k in range(layer):
+        lb, ub = bounds[k]
+        nodes = sp.identity(lb.size, format="csr")
+        pre_column = n_vars
+        post_next_column = n_vars + lb.size
+        n_vars += 2 * lb.size
+        # pre - post @ w = b
+        equalities.append(([(pre_column, nodes), (post_column, -sp.kron(applicants, weights[k].T))],
+                           np.tile(biases[k], n)))
+        # pre - post_next <= 0 and post_next - slope * pre <= offset
+        slope, offset = get_triangle(lb, ub)
+        inequalities.append(([(pre_column, nodes), (post_next_column, -nodes)], np.zeros(lb.size)))
+        inequalities.append(([(pre_column, -sp.diags(slope.ravel())), (post_next_column, nodes)], offset.ravel()))
+        var_lb += [lb.ravel(), np.zeros(lb.size)]
+        var_ub += [ub.ravel(), np.maximum(ub, 0.0).ravel()]
+        post_column = post_next_column
+
+    a_eq, b_eq = stack_blocks(equalities, n_vars)
+    a_ub, b_ub = stack_blocks(inequalities, n_vars)
+    variable_bounds = np.column_stack((np.concatenate(var_lb), np.concatenate(var_ub)))
+    n_post = weights[layer].shape[0]
+    lb = np.zeros((n, weights[layer].shape[1]))
+    ub = np.zeros_like(lb)
+    for node in range(weights[layer].shape[1]):
+        objective = np.zeros(n_vars)
+        objective[post_column:post_column + n * n_post] = np.tile(weights[layer][:, node], n)
+        for sign, values in [(1.0, lb), (-1.0, ub)]:
+            result = linprog(sign * objective, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq, bounds=variable_bounds,
+                             method="highs")
+            if result.status != 0:
+                print("JANOS Error: The LP for the bounds of the neural network ended with status " +
+                      str(result.status) + " ... ")
+                sys.exit(1)
+            post = result.x[post_column:post_column + n * n_post].reshape(n, n_post)
+            values[:, node] = post @ weights[layer][:, node] + biases[layer][node]
+    return lb, ub
+
+
+def stack_blocks(constraints, n_vars):
+    """
+    Stack groups of constraints into one sparse matrix.
+    :param constraints: list of (blocks, rhs), where blocks is a list of (first column, sparse matrix) with as many rows
+        as rhs
+    :param n_vars: number of columns
+    :return: CSR matrix and right-hand side
+    """
+    rows, cols, data = [], [], []
+    row_offset = 0
+    for blocks, rhs in constraints:
+        for column, matrix in blocks:
+            matrix = sp.coo_matrix(matrix)
+            rows.append(matrix.row + row_offset)
+            cols.append(matrix.col + column)
+            data.append(matrix.data)
+        row_offset += rhs.size
+    matrix = sp.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(row_offset, n_vars))
+    return matrix, np.concatenate([rhs for _, rhs in constraints])
+
+
+def get_neuron_bounds(weights, biases, input_lb, input_ub, method="interval", solver="gurobi"):
+    """
+    Return the bounds of the pre-activations of every hidden layer.
+    :param weights: list of weight arrays of the network
+    :param biases: list of bias arrays of the network
+    :param input_lb: array (n, n_inputs)
+    :param input_ub: array (n, n_inputs)
+    :param method: 'interval' or 'lp'; the LP bounds are intersected with the interval bounds
+    :param solver: 'gurobi' or 'highs', the solver of the LPs
+    :return: list with (lb, ub) of every hidden layer, arrays of shape (n, n_nodes)
+    """
+    if method not in ["interval", "lp"]:
+        print("JANOS Error: Bound tightening must be 'interval' or 'lp' ... ")
+        sys.exit(1)
+    bounds = []
+    post_lb = input_lb
+    post_ub = input_ub
+    for layer in range(len(weights) - 1):
+        lb, ub = get_interval_bounds(weights[layer], biases[layer], post_lb, post_ub)
+        if method == "lp" and layer > 0:
+            # the first layer is affine in the inputs, so its interval bounds are already exact
+            lp_lb, lp_ub = get_lp_bounds(weights, biases, input_lb, input_ub, bounds, layer, solver)
+            lb = np.maximum(lb, lp_lb)
+            ub = np.minimum(ub, lp_ub)
+        bounds.append((lb, ub))
+        post_lb = np.maximum(lb, 0.0)
+        post_ub = np.maximum(ub, 0.0)
+    return bounds
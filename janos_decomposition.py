@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+Lagrangian decomposition of a BatchJModel by the price of its budget.
+
+In the scholarship models, the budget sum_i a_i x_i <= B is the only constraint that links the applicants. Dualizing it
+with a price lam >= 0 splits the problem into one subproblem per applicant,
+    max over x_i in the domain of x_i:  sum over predicted blocks c_i * f(features_i, x_i) + d_i x_i - lam a_i x_i,
+where f is the pretrained model (LinReg, LogReg or NN), c_i the objective coefficient of the predicted variable and
+d_i that of the regular variable. Every subproblem is one-dimensional, so it is solved by evaluating the pretrained
+model at candidate values of x_i: the values of a discrete domain, the breakpoints of the networks if all predictive
+models are neural networks (see janos_pwl), or n_candidates evenly spaced values of a continuous domain otherwise. The
+evaluations of all applicants are independent; they are split into chunks and computed by a pool of worker processes,
+created once per solve, with one batched predict per chunk.
+
+The applicants then coordinate on the price. If the candidates are exact (see below), the subproblems are a
+multiple-choice knapsack over the candidates, and the price is implied by its hull completion (see
+janos_fastpath.fill_multiple_choice_knapsack): starting from the best responses at lam = 0, the applicants move up
+their upper hulls by decreasing gain per unit of budget, the slope of the first move that does not fit is the lowest
+price at which the best responses fit, and the LP relaxation bounds the optimum. On an even grid, lam is found by
+bisection on the subgradient B - sum_i a_i x_i(lam) of the dual function D(lam) = lam B + sum_i max_x (value_i(x) -
+lam a_i x), which is an upper bound on the optimum for every lam >= 0. The primal solution is the best response to the
+lowest price found whose allocation fits into the budget, after which the applicants whose choice changes just below
+that price are upgraded by gain per unit of budget while the budget allows. The gap between the primal objective and
+the smallest dual value is the certificate; the bisection stops once it is within the MIPGap setting (1e-4 by default).
+
+On a continuous domain, the rest of the budget is then spent continuously (see spend_budget): the applicants move
+towards the next corner of their upper hulls while the moves fit, and one applicant is split, i.e., moves part of the
+way, with the pretrained model evaluated at its new value. The budget is therefore spent; the gap that remains is mostly
+the duality gap of a nonconvex problem, about the value of one applicant, which is small compared to the objective for
+many applicants but not for a handful.
+
+Discrete domains and breakpoints are exact: the subproblems are linear between neighbouring breakpoints, so their
+maximum is at one of them. With a single logistic regression model, the subproblems of a continuous domain are
+maximized exactly in closed form (see get_logistic_maxima) for the dual value. Otherwise, on an even grid, the dual
+value on the candidates is corrected into a bound for the continuous problem: between two candidates h apart, value_i -
+lam a_i x_i exceeds the larger endpoint by at most the interpolation error of the predictive model, M h^2 / 8 for
+LogReg, whose curvature M in x_i is at most coef^2 / (6 sqrt(3)), and L h / 2 for NN, whose Lipschitz constant L in x_i
+is at most the sum over paths of the products of absolute weights; linear regression is exact. Note that the objective
+is that of the pretrained models themselves, not of their piecewise-linear approximation in the MIP.
+
+Usage:
+
+    m.set_decomposition(LagrangianDecomposition(n_workers=4))
+    m.solve()
+
+The result is stored in m.gurobi_model as a janos_backends.SolverResult with status GRB.OPTIMAL if the gap is within
+the MIPGap setting and GRB.SUBOPTIMAL otherwise; if the budget cannot be met, the model is solved as a MIP instead.
+"""
+
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.neural_network import MLPRegressor
+from janos_batch import predict, sigmoid
+from janos_pwl import get_relu_breakpoints
+from janos_fastpath import fill_multiple_choice_knapsack
+from janos_backends import SolverResult, GRB
+from experiment_runner import get_number_of_workers, init_worker
+
+
+def evaluate_candidates(job):
+    """
+    Evaluate a pretrained model for a chunk of applicants at every candidate value of the decision feature.
+    :param job: tuple of the pretrained model, its feature names, the constant features (n, n_features), the index of
+        the decision feature and the candidate values (n, k)
+    :return: array (n, k) of predictions
+    """
+    pretrained_model, feature_names, constants, feature_index, candidates = job
+    n, k = candidates.shape
+    features = np.repeat(constants, k, axis=0)
+    features[:, feature_index] = candidates.ravel()
+    return predict(pretrained_model, features, feature_names).reshape(n, k)
+
+
+def get_interpolation_error(pretrained_model, feature_index, step):
+    """
+    Return how much a pretrained model can exceed the larger of its values at two points of one feature that are step
+    apart, anywhere between them, minus any linear function of the feature.
+    :param pretrained_model: LinearRegression, LogisticRegression or MLPRegressor
+    :param feature_index: int
+    :param step: array of distances between neighbouring candidates
+    :return: array like step; 0 for linear regression, which is linear
+    """
+    step = np.asarray(step, dtype=float)
+    if isinstance(pretrained_model, LinearRegression):
+        return np.zeros_like(step)
+    if isinstance(pretrained_model, LogisticRegression):
+        # the second derivative of the sigmoid is at most 1 / (6 sqrt(3)) in absolute value
+        curvature = float(np.ravel(pretrained_model.coef_)[feature_index]) ** 2 / (6 * np.sqrt(3))
+        return curvature * step ** 2 / 8
+    # the derivative of a ReLU is in [0, 1], so no path from the feature to the output amplifies more than the product
+    # of its absolute weights
+    gain = np.abs(pretrained_model.coefs_[0][feature_index, :])
+    for w in pretrained_model.coefs_[1:]:
+        gain = gain @ np.abs(w)
+    return float(np.sum(gain)) * step / 2
+
+
+def get_logistic_maxima(logit, slope, weight, linear, lower_bound, upper_bound):
+    """
+    Return the maximum over x in [lower_bound, upper_bound] of weight * sigmoid(logit + slope x) + linear x for every
+    variable. The maximum is at a bound or at a stationary point, where sigmoid(1 - sigmoid) = -linear / (weight slope)
+    has at most two solutions.
+    :param logit: array (n,), the logit at x = 0
+    :param slope: float, the coefficient of x in the logit
+    :param weight: array (n,), objective coefficient of the probability
+    :param linear: array (n,), objective coefficient of x
+    :param lower_bound: array (n,)
+    :param upper_bound: array (n,)
+    :return: array (n,)
+    """
+    points = [lower_bound, upper_bound]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = -linear / (weight * slope)
+        root = np.sqrt(np.where((share > 0) & (share <= 0.25), 1 - 4 * share, np.nan))
+        for probability in [(1 - root) / 2, (1 + root) / 2]:
+            x = (np.log(probability / (1 - probability)) - logit) / slope
+            points.append(np.where(np.isnan(x), lower_bound, np.clip(x, lower_bound, upper_bound)))
+    return np.max([weight * sigmoid(logit + slope * x) + linear * x for x in points], axis=0)
+
+
+class LagrangianDecomposition:
+    """
+    The LagrangianDecomposition class solves a BatchJModel whose applicants are linked only by one budget constraint
+    by pricing the budget (see the module docstring).
+    """
+
+    method = "lagrangian_decomposition"
+
+    def is_decomposable(self, m):
+        """
+        Return whether m has one block of regular variables, only predicted variables whose only decision feature is
+        that block, and at most one constraint, a budget on that block with nonnegative coefficients.
+        :param m: BatchJModel
+        :return: bool
+        """
+        regular_blocks = m.get_regular_variable_blocks()
+        if len(regular_blocks) != 1 or len(m.expression_constraints) > 0 or len(m.block_constraints) > 1:
+            return False
+        for block_constraint in m.block_constraints:
+            if block_constraint.sense != "less_equal" or np.any(block_constraint.coefficients < 0):
+                return False
+        for block in m.get_predicted_variable_blocks():
+            if block.opm is None:
+                return False
+            if not isinstance(block.opm.optimization_pm, (LinearRegression, LogisticRegression, MLPRegressor)):
+                return False
+            variable_inputs, _ = block.get_inputs()
+            if len(variable_inputs) != 1 or variable_inputs[0][1] is not regular_blocks[0]:
+                return False
+        return True
+
+    def get_candidates(self, block):
+        """
+        Return the candidate values of every variable of a block of regular variables.
+        :param block: RegularVariableBlock
+        :return: array (n, k), increasing in every row
+        """
+        if block.variable_type == "discrete":
+            return np.broadcast_to(block.discrete_domain, (block.n, block.discrete_domain.size))
+        if np.any(block.upper_bound - block.lower_bound > 1e6):
+            print("JANOS Error: The decomposition needs bounded domains; set the bounds of " + block.name + " ... ")
+            sys.exit(1)
+        steps = np.linspace(0.0, 1.0, self.n_candidates)
+        return block.lower_bound[:, None] + (block.upper_bound - block.lower_bound)[:, None] * steps[None, :]
+
+    def get_breakpoint_candidates(self, regular_block, blocks):
+        """
+        Return the breakpoints of the neural networks of blocks as functions of the regular variables (see janos_pwl),
+        merged per variable. Every subproblem is piecewise linear between them, so its maximum is at one of them.
+        :param regular_block: RegularVariableBlock with a continuous domain
+        :param blocks: PredictedVariableBlocks with neural networks
+        :return: array (n, k), increasing in every row
+        """
+        chunks = np.array_split(np.arange(regular_block.n), max(-(-regular_block.n // self.chunk_size), 1))
+        candidates = []
+        for block in blocks:
+            variable_inputs, constants = block.get_inputs()
+            pretrained_model = block.opm.optimization_pm
+            parts = [get_relu_breakpoints(
+                pretrained_model.coefs_, pretrained_model.intercepts_, constants[chunk], variable_inputs[0][0],
+                regular_block.lower_bound[chunk], regular_block.upper_bound[chunk])[0] for chunk in chunks]
+            # every chunk is padded to its own largest number of breakpoints; pad them all to the largest one
+            width = max(part.shape[1] for part in parts)
+            candidates.append(np.vstack([np.hstack((part, np.repeat(regular_block.upper_bound[chunk][:, None],
+                                                                    width - part.shape[1], axis=1)))
+                                         for chunk, part in zip(chunks, parts)]))
+        return np.sort(np.hstack(candidates), axis=1)
+
+    @staticmethod
+    def get_logistic_dual(block, regular_block, coefficients, budget):
+        """
+        Return the dual function of a model whose only predicted variables come from a logistic regression model, with
+        every subproblem maximized over the continuous domain in closed form (see get_logistic_maxima) rather than on
+        the candidates, so that it needs no correction for the interpolation error.
+        :param block: PredictedVariableBlock with a LogisticRegression
+        :param regular_block: RegularVariableBlock with a continuous domain
+        :param coefficients: array (n,) of budget coefficients
+        :param budget: float
+        :return: function from the price to the dual value
+        """
+        variable_inputs, constants = block.get_inputs()
+        feature_index = variable_inputs[0][0]
+        coef = np.ravel(block.opm.optimization_pm.coef_)
+        constants = np.array(constants, dtype=float)
+        constants[:, feature_index] = 0.0
+        logit = float(np.ravel(block.opm.optimization_pm.intercept_)[0]) + constants @ coef
+
+        def dual(price):
+            linear = regular_block.objective_coefficient - price * coefficients
+            maxima = get_logistic_maxima(logit, coef[feature_index], block.objective_coefficient, linear,
+                                         regular_block.lower_bound, regular_block.upper_bound)
+            return float(maxima.sum()) + (price * budget if price > 0 else 0.0)
+        return dual
+
+    def get_predictions(self, block, candidates, executor):
+        """
+        Evaluate the pretrained model of a block of predicted variables at the candidate values of every variable.
+        :param block: PredictedVariableBlock
+        :param candidates: array (n, k)
+        :param executor: ProcessPoolExecutor that evaluates the chunks; None evaluates them in this process
+        :return: array (n, k)
+        """
+        variable_inputs, constants = block.get_inputs()
+        feature_index = variable_inputs[0][0]
+        pretrained_model = block.opm.optimization_pm
+        feature_names = list(block.opm.feature_names)
+        chunks = np.array_split(np.arange(block.n), max(-(-block.n // self.chunk_size), 1))
+        jobs = [(pretrained_model, feature_names, constants[chunk], feature_index, np.asarray(candidates[chunk]))
+                for chunk in chunks]
+        if executor is None or len(jobs) == 1:
+            return np.vstack([evaluate_candidates(job) for job in jobs])
+        return np.vstack(list(executor.map(evaluate_candidates, jobs)))
+
+    def solve(self, m):
+        """
+        Solve m by pricing its budget and store the solution in the blocks.
+        :param m: BatchJModel for which is_decomposable(m) holds
+        :return: SolverResult; None if the cheapest candidates alone exceed the budget, so that the caller can fall
+            back to the solver
+        """
+        start_time = time.perf_counter()
+        n_workers = get_number_of_workers(self.n_workers)
+        regular_block = m.get_regular_variable_blocks()[0]
+        rows = np.arange(regular_block.n)
+
+        # the subproblems: the objective value and budget use of every applicant at every candidate
+        candidates = self.get_candidates(regular_block)
+        exact = regular_block.variable_type == "discrete"
+        predicted_blocks = m.get_predicted_variable_blocks()
+        if not exact and all(isinstance(block.opm.optimization_pm, MLPRegressor) for block in predicted_blocks):
+            candidates = self.get_breakpoint_candidates(regular_block, predicted_blocks)
+            exact = True
+        value = regular_block.objective_coefficient[:, None] * candidates
+        step = (regular_block.upper_bound - regular_block.lower_bound) / (self.n_candidates - 1)
+        slack = 0.0
+        predictions = {}
+        # one pool of workers evaluates the chunks of every block
+        n_chunks = -(-regular_block.n // self.chunk_size)
+        executor = None
+        if n_workers > 1 and n_chunks > 1:
+            executor = ProcessPoolExecutor(max_workers=min(n_workers, n_chunks), initializer=init_worker)
+        try:
+            for block in predicted_blocks:
+                predictions[block] = self.get_predictions(block, candidates, executor)
+                value = value + block.objective_coefficient[:, None] * predictions[block]
+                if not exact:
+                    error = get_interpolation_error(block.opm.optimization_pm, block.get_inputs()[0][0][0], step)
+                    slack += float(np.sum(np.abs(block.objective_coefficient) * error))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if len(m.block_constraints) == 1:
+            coefficients = m.block_constraints[0].coefficients
+            budget = float(m.block_constraints[0].rhs)
+        else:
+            coefficients = np.zeros(regular_block.n)
+            budget = np.inf
+        cost = coefficients[:, None] * candidates
+        if cost.min(axis=1).sum() > budget:
+            return None
+
+        # a single logistic regression has an exact dual function, which makes the interpolation error irrelevant
+        exact_dual = None
+        if not exact and len(predicted_blocks) == 1 and \
+                isinstance(predicted_blocks[0].opm.optimization_pm, LogisticRegression):
+            exact_dual = self.get_logistic_dual(predicted_blocks[0], regular_block, coefficients, budget)
+            slack = 0.0
+
+        def respond(price):
+            # best response of every applicant; ties go to the cheaper candidate, which comes first
+            scores = value - price * cost
+            choice = scores.argmax(axis=1)
+            if exact_dual is None:
+                dual = float(scores[rows, choice].sum()) + (price * budget if price > 0 else 0.0)
+            else:
+                dual = exact_dual(price)
+            return choice, float(cost[rows, choice].sum()), dual
+
+        settings = {key.lower(): setting for key, setting in m.gurobi_param_settings.items()}
+        tolerance = settings.get("mipgap", 1e-4)
+        self.iterations = 0
+
+        if exact:
+            # the candidates are exact, so the subproblems are a multiple-choice knapsack: the hull completion starts
+            # from the best responses at price 0 and upgrades along the upper hulls by decreasing gain per unit of
+            # budget, which also gives the lowest price at which the best responses fit and the LP bound
+            choice, obj_val, obj_bound, self.price = fill_multiple_choice_knapsack(cost, value, budget)
+            if regular_block.variable_type == "discrete":
+                return self.get_result(regular_block, predictions, candidates, [(choice, None)], obj_bound,
+                                       tolerance, start_time)
+            # on a continuous domain, the rest of the budget is spent after the completion, or instead of it on the
+            # first segment that does not fit, whichever is better
+            lp_choice = fill_multiple_choice_knapsack(cost, value, budget, fill_remaining=False)[0]
+            return self.get_result(regular_block, predictions, candidates,
+                                   [self.spend_budget(value, cost, budget, choice, rows, skip=True),
+                                    self.spend_budget(value, cost, budget, lp_choice, rows)],
+                                   obj_bound, tolerance, start_time)
+
+        # the lowest price at which the best responses fit into the budget is in [low, high]
+        self.price = 0.0
+        choice, used, obj_bound = respond(0.0)
+        if used > budget:
+            low, low_choice = 0.0, choice
+            high = 1.0
+            choice, used, dual = respond(high)
+            obj_bound = min(obj_bound, dual)
+            while used > budget:
+                low, low_choice = high, choice
+                high *= 2
+                choice, used, dual = respond(high)
+                obj_bound = min(obj_bound, dual)
+            while self.iterations < self.max_iterations:
+                obj_val = self.get_primal(value, cost, budget, choice, low_choice, rows)[1]
+                if obj_bound + slack - obj_val <= tolerance * max(abs(obj_val), 1e-10):
+                    break
+                self.iterations += 1
+                price = (low + high) / 2
+                price_choice, price_used, dual = respond(price)
+                obj_bound = min(obj_bound, dual)
+                if price_used > budget:
+                    low, low_choice = price, price_choice
+                else:
+                    high, choice = price, price_choice
+            choice = self.get_primal(value, cost, budget, choice, low_choice, rows)[0]
+            self.price = high
+        return self.get_result(regular_block, predictions, candidates,
+                               [self.spend_budget(value, cost, budget, choice, rows, skip=True),
+                                self.spend_budget(value, cost, budget, choice, rows)], obj_bound + slack, tolerance,
+                               start_time)
+
+    @staticmethod
+    def get_solution(regular_block, predictions, candidates, choice, split):
+        """
+        Return the values of the blocks for the chosen candidates. A split applicant moves from its candidate towards
+        another by a share of the way, which spends the rest of the budget on a continuous domain; the pretrained
+        models are evaluated at its new value, which is kept if it is at least as good.
+        :param choice: array (n,) with the candidate of every applicant
+        :param split: None, or the split applicant, the candidate it moves towards and the share of the way (see
+            spend_budget)
+        :return: dict from every block to its values, and the objective value
+        """
+        rows = np.arange(regular_block.n)
+        values = {regular_block: candidates[rows, choice]}
+        for block, table in predictions.items():
+            values[block] = table[rows, choice]
+        if split is not None:
+            i, following, share = split
+            x = values[regular_block][i] + share * (candidates[i, following] - values[regular_block][i])
+            new_values = {regular_block: x}
+            for block in predictions:
+                variable_inputs, constants = block.get_inputs()
+                new_values[block] = evaluate_candidates((block.opm.optimization_pm, list(block.opm.feature_names),
+                                                         constants[[i]], variable_inputs[0][0], np.array([[x]])))[0, 0]
+            gain = sum(block.objective_coefficient[i] * (new_value - values[block][i])
+                       for block, new_value in new_values.items())
+            if gain >= 0:
+                for block, new_value in new_values.items():
+                    values[block][i] = new_value
+        obj_val = sum(float(block.objective_coefficient @ block_values) for block, block_values in values.items())
+        return values, obj_val
+
+    def get_result(self, regular_block, predictions, candidates, solutions, obj_bound, tolerance, start_time):
+        """
+        Store the best of the solutions in the blocks and return the result of the solve.
+        :param solutions: list of the choice of every applicant and the split applicant (see get_solution)
+        :return: SolverResult
+        """
+        values, obj_val = max((self.get_solution(regular_block, predictions, candidates, choice, split)
+                               for choice, split in solutions), key=lambda solution: solution[1])
+        for block, block_values in values.items():
+            block.X = block_values
+        obj_bound = max(obj_bound, obj_val)
+        status = GRB.OPTIMAL
+        if obj_bound - obj_val > tolerance * max(abs(obj_val), 1e-10):
+            status = GRB.SUBOPTIMAL
+        return SolverResult(status, obj_val, obj_bound, time.perf_counter() - start_time, self.method)
+
+    @staticmethod
+    def get_primal(value, cost, budget, choice, low_choice, rows):
+        """
+        Start from the best responses choice, which fit into the budget, and switch the applicants whose best response
+        low_choice at a lower price differs, by gain per unit of budget, while the budget allows.
+        :return: the choice of every applicant and the objective value
+        """
+        choice = choice.copy()
+        changed = np.flatnonzero(low_choice != choice)
+        d_value = value[changed, low_choice[changed]] - value[changed, choice[changed]]
+        d_cost = cost[changed, low_choice[changed]] - cost[changed, choice[changed]]
+        order = np.argsort(-d_value / np.maximum(d_cost, 1e-12), kind="stable")
+        remaining = budget - float(cost[rows, choice].sum())
+        n_taken = int(np.searchsorted(np.cumsum(d_cost[order]), remaining, side="right"))
+        switched = changed[order[:n_taken]]
+        choice[switched] = low_choice[switched]
+        return choice, float(value[rows, choice].sum())
+
+    @staticmethod
+    def spend_budget(value, cost, budget, choice, rows, skip=False):
+        """
+        Spend what is left of the budget on a continuous domain: every applicant can move from its candidate towards
+        the candidate with the largest gain per unit of budget (the next corner of its upper hull). The moves are taken
+        by decreasing gain per unit of budget while they fit, and repeated from the new candidates; the first move that
+        does not fit is taken for the share of the way that the remaining budget pays for. With skip, only the moves
+        that fit are considered, as long as there are any, which is better where a long move crosses a region in which
+        the pretrained model is convex (e.g., the lower part of the sigmoid).
+        :return: the choice of every applicant, and None or the split applicant, the candidate it moves towards and the
+            share of the way
+        """
+        choice = choice.copy()
+        remaining = budget - float(cost[rows, choice].sum())
+        while remaining > 0:
+            d_value = value - value[rows, choice][:, None]
+            d_cost = cost - cost[rows, choice][:, None]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slope = np.where((d_cost > 0) & (~skip | (d_cost <= remaining)), d_value / d_cost, -np.inf)
+            following = slope.argmax(axis=1)
+            best = slope[rows, following]
+            moving = np.flatnonzero(best > 0)
+            if moving.size == 0:
+                if not skip:
+                    break
+                skip = False
+                continue
+            order = moving[np.argsort(-best[moving], kind="stable")]
+            step_cost = d_cost[order, following[order]]
+            taken = np.cumsum(step_cost) <= remaining
+            if skip:
+                # every move fits on its own; after the first that does not fit with the others, the moves are taken
+                # while they fit
+                taken[:] = False
+                cheapest_remaining = np.minimum.accumulate(step_cost[::-1])[::-1]
+                left = remaining
+                for position in range(order.size):
+                    if cheapest_remaining[position] > left:
+                        break
+                    if step_cost[position] <= left:
+                        taken[position] = True
+                        left -= step_cost[position]
+            choice[order[taken]] = following[order[taken]]
+            remaining -= float(step_cost[taken].sum())
+            if not skip and not np.all(taken):
+                position = np.flatnonzero(~taken)[0]
+                i = order[position]
+                return choice, (i, following[i], remaining / step_cost[position])
+        return choice, None
+
+    def __init__(self, n_workers=None, n_candidates=129, chunk_size=5000, max_iterations=100):
+        """
+        :param n_workers: number of worker processes that evaluate the subproblems; None uses JANOS_N_WORKERS or all
+            cores
+        :param n_candidates: number of candidate values of a continuous domain
+        :param chunk_size: largest number of applicants evaluated in one batched predict
+        :param max_iterations: largest number of bisection steps on the price
+        """
+        if n_candidates < 2:
+            print("JANOS Error: The decomposition needs at least 2 candidate values per variable ... ")
+            sys.exit(1)
+        self.n_workers = n_workers
+        self.n_candidates = n_candidates
+        self.chunk_size = chunk_size
+        self.max_iterations = max_iterations
+        self.iterations = 0  # bisection steps of the last solve
+        self.price = None  # price of the budget in the last solve
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Fast paths that solve special structures of a BatchJModel exactly without building a MIP.
+
+Linear knapsack:
+    If every predicted variable comes from a LinearRegression model, every regular variable is continuous, and the
+    only constraint is one budget sum_i a_i x_i <= B with a_i >= 0 (plus the bounds of the variables), then the
+    objective is affine in the regular variables and the problem is a continuous knapsack. Sorting the variables by
+    objective gain per unit of budget and filling the budget greedily solves it exactly in O(n log n). The order does
+    not depend on the budget, so sweep_linear_knapsack solves the model for many budgets from one sort.
+
+Multiple-choice knapsack:
+    If the only regular variables are one block with a discrete domain, every predicted variable is encoded by a
+    lookup table of that block (PredictedVariableBlock.setLookupTable), and the only constraint is one budget
+    sum_i a_i x_i <= B, then every variable chooses one value of the domain with a known objective value and budget
+    use. The LP relaxation is solved exactly by walking the upper convex hull of (cost, value) of every variable and
+    taking hull segments in the order of decreasing slope, which also gives the Lagrangian bound. The integer solution
+    takes the segments that fit into the budget; it is accepted if its gap to the bound is within the MIPGap setting
+    (1e-4 by default), as a Gurobi solve would be, and otherwise the model is solved as a MIP.
+
+A fast path stores its result in m.gurobi_model as a janos_backends.SolverResult, which has the attributes the scripts
+read from a Gurobi model (status, objVal, objBound, runtime, ...), and the solution in block.X, like
+BatchJModel.optimize.
+"""
+
+import time
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from janos_main import JANOS
+from janos_backends import SolverResult, GRB
+
+
+def get_affine_objective(m):
+    """
+    If every predicted variable of m comes from a LinearRegression model, write the objective as
+    constant + sum over regular blocks of gain[block] @ block.
+    :param m: BatchJModel
+    :return: constant and dict from regular block to its array of gains; None if the objective is not affine
+    """
+    gain = {block: block.objective_coefficient.copy() for block in m.get_regular_variable_blocks()}
+    constant = 0.0
+    for block in m.get_predicted_variable_blocks():
+        if block.opm is None or not isinstance(block.opm.optimization_pm, LinearRegression):
+            return None
+        coef = np.ravel(block.opm.optimization_pm.coef_)
+        intercept = float(np.ravel(block.opm.optimization_pm.intercept_)[0])
+        variable_inputs, constants = block.get_inputs()
+        constant += float(block.objective_coefficient @ (intercept + constants @ coef))
+        for feature_index, regular_block in variable_inputs:
+            if regular_block not in gain:
+                return None
+            gain[regular_block] += block.objective_coefficient * coef[feature_index]
+    return constant, gain
+
+
+def is_linear_knapsack(m):
+    """
+    Return whether m has the structure of a continuous knapsack that solve_linear_knapsack solves exactly, with a
+    bounded optimum: every variable that the budget does not limit must have a finite bound (below MAX_DOUBLE_VAL in
+    absolute value) in the direction of its gain, and the variables of the budget a finite lower bound. Otherwise the
+    solver decides, e.g., that the model is unbounded.
+    :param m: BatchJModel
+    :return: bool
+    """
+    if len(m.get_predicted_variable_blocks()) == 0:
+        return False
+    for block in m.get_regular_variable_blocks():
+        if block.variable_type != "continuous":
+            return False
+    if len(m.block_constraints) > 1 or len(m.expression_constraints) > 0:
+        return False
+    for block_constraint in m.block_constraints:
+        if block_constraint.sense != "less_equal" or np.any(block_constraint.coefficients < 0):
+            return False
+    affine_objective = get_affine_objective(m)
+    if affine_objective is None:
+        return False
+
+    _, gain = affine_objective
+    budget_coefficients = {block_constraint.block: block_constraint.coefficients
+                           for block_constraint in m.block_constraints
+                           if block_constraint.rhs < JANOS.MAX_DOUBLE_VAL}
+    for block, block_gain in gain.items():
+        a = budget_coefficients.get(block, np.zeros(block.n))
+        if np.any((block.upper_bound >= JANOS.MAX_DOUBLE_VAL) & (block_gain > 0) & (a == 0)):
+            return False
+        if np.any((block.lower_bound <= JANOS.MIN_DOUBLE_VAL) & ((block_gain <= 0) | (a > 0))):
+            return False
+    return True
+
+
+def fill_linear_knapsack(block, a, g, budgets):
+    """
+    Fill every budget greedily: the variables of block start at their lower bounds, variables that do not use the
+    budget go to their best bound, and the rest are raised in the order of decreasing gain per unit of budget. The
+    order does not depend on the budget, so one sort gives the solution for every budget, which is the parametric
+    solution of the LP in its right-hand side.
+    :param block: RegularVariableBlock of the budget
+    :param a: array of budget coefficients, a >= 0
+    :param g: array of objective gains
+    :param budgets: array (k,) of right-hand sides
+    :return: array (k, n) with the solution for every budget; None if the lower bounds alone exceed some budget
+    """
+    x = block.lower_bound.copy()
+    budgets = np.asarray(budgets, dtype=float) - float(a @ x)
+    if np.any(budgets < 0):
+        return None
+
+    free = a == 0
+    x[free & (g > 0)] = block.upper_bound[free & (g > 0)]
+    candidates = np.flatnonzero(~free & (g > 0))
+    order = candidates[np.argsort(-g[candidates] / a[candidates], kind="stable")]
+    capacity = a[order] * (block.upper_bound[order] - block.lower_bound[order])
+    used_before = np.concatenate(([0.0], np.cumsum(capacity)[:-1]))
+    fill = np.clip(budgets[:, None] - used_before[None, :], 0.0, capacity[None, :])
+    solutions = np.repeat(x[None, :], budgets.size, axis=0)
+    solutions[:, order] += fill / a[order]
+    return solutions
+
+
+def get_linear_predictions(m, solution):
+    """
+    Return the values of the predicted variables of a model for which get_affine_objective(m) is not None.
+    :param m: BatchJModel
+    :param solution: dict from every regular block to its values, an array (n,) or (number of solutions, n)
+    :return: dict from every predicted block to its values, of the same shape
+    """
+    predictions = {}
+    for block in m.get_predicted_variable_blocks():
+        coef = np.ravel(block.opm.optimization_pm.coef_)
+        intercept = float(np.ravel(block.opm.optimization_pm.intercept_)[0])
+        variable_inputs, constants = block.get_inputs()
+        predictions[block] = intercept + constants @ coef
+        for feature_index, regular_block in variable_inputs:
+            predictions[block] = predictions[block] + coef[feature_index] * solution[regular_block]
+    return predictions
+
+
+def solve_linear_knapsack(m):
+    """
+    Solve a model for which is_linear_knapsack(m) holds and store the solution in the blocks.
+    :param m: BatchJModel
+    :return: SolverResult; None if the lower bounds alone exceed the budget, so that the caller can fall back to
+        the solver (which can explain the infeasibility)
+    """
+    start_time = time.perf_counter()
+    constant, gain = get_affine_objective(m)
+
+    # Without a budget, every variable goes to the bound that its gain favors.
+    solution = {block: np.where(gain[block] > 0, block.upper_bound, block.lower_bound)
+                for block in m.get_regular_variable_blocks()}
+
+    if len(m.block_constraints) == 1:
+        block_constraint = m.block_constraints[0]
+        block = block_constraint.block
+        solutions = fill_linear_knapsack(block, block_constraint.coefficients, gain[block], [block_constraint.rhs])
+        if solutions is None:
+            return None
+        solution[block] = solutions[0]
+
+    obj_val = constant
+    for block, x in solution.items():
+        block.X = x
+        obj_val += float(gain[block] @ x)
+    for block, x in get_linear_predictions(m, solution).items():
+        block.X = x
+
+    return SolverResult(GRB.OPTIMAL, obj_val, obj_val, time.perf_counter() - start_time, "linear_knapsack")
+
+
+def sweep_linear_knapsack(m, budgets):
+    """
+    Solve a model for which is_linear_knapsack(m) holds and that has a budget for every budget in budgets, from one
+    sort of the variables (see fill_linear_knapsack).
+    :param m: BatchJModel
+    :param budgets: array (k,) of right-hand sides of the budget
+    :return: array (k,) of objective values and dict from block to an array (k, n) with its values in every solution;
+        None if the lower bounds alone exceed some budget
+    """
+    constant, gain = get_affine_objective(m)
+    block_constraint = m.block_constraints[0]
+    solutions = fill_linear_knapsack(block_constraint.block, block_constraint.coefficients,
+                                     gain[block_constraint.block], budgets)
+    if solutions is None:
+        return None
+
+    values = {}
+    obj_vals = np.full(solutions.shape[0], constant)
+    for block in m.get_regular_variable_blocks():
+        if block is block_constraint.block:
+            values[block] = solutions
+        else:
+            values[block] = np.repeat(np.where(gain[block] > 0, block.upper_bound, block.lower_bound)[None, :],
+                                      solutions.shape[0], axis=0)
+        obj_vals += values[block] @ gain[block]
+    values.update(get_linear_predictions(m, values))
+    return obj_vals, values
+
+
+def get_choice_values(m):
+    """
+    If the only regular variables of m are one block with a discrete domain and every predicted variable is encoded
+    by a lookup table of it, write the objective as the sum over variables of the value of the chosen domain value.
+    :param m: BatchJModel
+    :return: the regular block, an array (n, k) with the objective value of every variable and domain value, and the
+        lookup table of every predicted block; None if the model does not have this structure
+    """
+    regular_blocks = m.get_regular_variable_blocks()
+    if len(regular_blocks) != 1 or regular_blocks[0].variable_type != "discrete":
+        return None
+    regular_block = regular_blocks[0]
+    values = regular_block.objective_coefficient[:, None] * regular_block.discrete_domain[None, :]
+    tables = {}
+    for block in m.get_predicted_variable_blocks():
+        if block.opm is None or not block.lookup_table:
+            return None
+        table_block, tables[block] = block.get_lookup_table()
+        if table_block is not regular_block:
+            return None
+        values = values + block.objective_coefficient[:, None] * tables[block]
+    return regular_block, values, tables
+
+
+def is_multiple_choice_knapsack(m):
+    """
+    Return whether m has the structure of a multiple-choice knapsack that solve_multiple_choice_knapsack solves.
+    :param m: BatchJModel
+    :return: bool
+    """
+    regular_blocks = m.get_regular_variable_blocks()
+    if len(m.get_predicted_variable_blocks()) == 0 or len(regular_blocks) != 1:
+        return False
+    if regular_blocks[0].variable_type != "discrete":
+        return False
+    if len(m.block_constraints) > 1 or len(m.expression_constraints) > 0:
+        return False
+    for block_constraint in m.block_constraints:
+        if block_constraint.sense != "less_equal":
+            return False
+    for block in m.get_predicted_variable_blocks():
+        if block.opm is None or not block.lookup_table:
+            return False
+    return True
+
+
+def get_hull_segments(cost, value):
+    """
+    Walk the upper convex hull of the points (cost_ik, value_ik) of every variable i from its cheapest point (the most
+    valuable among equally cheap points) along segments of positive and decreasing slope.
+    :param cost: array (n, k)
+    :param value: array (n, k)
+    :return: the starting point of every variable, and arrays with the variable, end point, slope, cost increase and
+        value increase of every segment, ordered by step
+    """
+    n, k = cost.shape
+    rows = np.arange(n)
+    cheapest = cost == cost.min(axis=1, keepdims=True)
+    current = np.where(cheapest, value, -np.inf).argmax(axis=1)
+    start = current.copy()
+    active = np.ones(n, dtype=bool)
+    segments = []
+    for _ in range(k - 1):
+        d_cost = cost - cost[rows, current][:, None]
+        d_value = value - value[rows, current][:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(d_cost > 0, d_value / d_cost, -np.inf)
+        following = slope.argmax(axis=1)
+        best = slope[rows, following]
+        active &= best > 0
+        if not np.any(active):
+            break
+        i = np.flatnonzero(active)
+        segments.append((i, following[i], best[i], d_cost[i, following[i]], d_value[i, following[i]]))
+        current[i] = following[i]
+    if len(segments) == 0:
+        return start, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0)
+    return (start,) + tuple(np.concatenate(column) for column in zip(*segments))
+
+
+def fill_multiple_choice_knapsack(cost, value, budget, fill_remaining=True):
+    """
+    Choose one point (cost_ik, value_ik) of every variable i within the budget: start from the cheapest points and
+    take the segments of the upper convex hulls by decreasing slope while they fit, then spend the remaining budget on
+    later segments that fit, as long as every earlier segment of their variable was taken.
+    :param cost: array (n, k)
+    :param value: array (n, k)
+    :param budget: float
+    :param fill_remaining: False stops at the first segment that does not fit, e.g., to take a share of it
+    :return: the choice of every variable, the objective value, the bound of the LP relaxation and the slope of the
+        first segment that did not fit (0 if all fit); None if the cheapest points alone exceed the budget
+    """
+    choice, variable, following, slope, d_cost, d_value = get_hull_segments(cost, value)
+    rows = np.arange(cost.shape[0])
+    budget -= float(cost[rows, choice].sum())
+    if budget < 0:
+        return None
+    obj_val = float(value[rows, choice].sum())
+
+    # take the segments by decreasing slope while they fit; the first that does not fit bounds the LP relaxation
+    order = np.argsort(-slope, kind="stable")
+    used = np.cumsum(d_cost[order])
+    n_taken = int(np.searchsorted(used, budget, side="right"))
+    taken = order[:n_taken]
+    choice[variable[taken]] = following[taken]
+    obj_val += float(d_value[taken].sum())
+    budget -= float(d_cost[taken].sum())
+    obj_bound = obj_val
+    price = 0.0
+    if n_taken < order.size:
+        price = float(slope[order[n_taken]])
+        obj_bound += float(budget * price)
+    if n_taken < order.size and fill_remaining:
+        # the remaining budget goes to later segments that fit, as long as every earlier segment of their variable
+        # was taken
+        skipped = np.zeros(cost.shape[0], dtype=bool)
+        skipped[variable[order[n_taken]]] = True
+        remaining = order[n_taken + 1:]
+        cheapest_remaining = np.minimum.accumulate(d_cost[remaining][::-1])[::-1]
+        for position, segment in enumerate(remaining):
+            if cheapest_remaining[position] > budget:
+                break
+            i = variable[segment]
+            if skipped[i] or d_cost[segment] > budget:
+                skipped[i] = True
+                continue
+            choice[i] = following[segment]
+            budget -= float(d_cost[segment])
+            obj_val += float(d_value[segment])
+    return choice, obj_val, obj_bound, price
+
+
+def solve_multiple_choice_knapsack(m):
+    """
+    Solve a model for which is_multiple_choice_knapsack(m) holds and store the solution in the blocks.
+    :param m: BatchJModel
+    :return: SolverResult; None if the cheapest choices alone exceed the budget or the gap of the solution exceeds
+        the MIPGap setting, so that the caller can fall back to the solver
+    """
+    start_time = time.perf_counter()
+    choice_values = get_choice_values(m)
+    if choice_values is None:
+        return None
+    regular_block, value, tables = choice_values
+    domain = regular_block.discrete_domain
+    if len(m.block_constraints) == 1:
+        cost = m.block_constraints[0].coefficients[:, None] * domain[None, :]
+        budget = float(m.block_constraints[0].rhs)
+    else:
+        cost = np.zeros_like(value)
+        budget = np.inf
+
+    completion = fill_multiple_choice_knapsack(cost, value, budget)
+    if completion is None:
+        return None
+    choice, obj_val, obj_bound, _ = completion
+    rows = np.arange(regular_block.n)
+
+    gap = 0.0
+    if obj_val != 0:
+        gap = abs(obj_bound - obj_val) / abs(obj_val)
+    settings = {key.lower(): setting for key, setting in m.gurobi_param_settings.items()}
+    if gap > settings.get("mipgap", 1e-4):
+        return None
+
+    regular_block.X = domain[choice]
+    for block, table in tables.items():
+        block.X = table[rows, choice]
+    return SolverResult(GRB.OPTIMAL, obj_val, obj_bound, time.perf_counter() - start_time, "multiple_choice_knapsack")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized scholarship heuristics, the baselines of rewrite_08_20200430_s1.py.
+
+Both heuristics give one scholarship level to as many applicants as the budget allows and the lowest level to all
+others; they differ in which applicants they choose:
+    greedy (David): the applicants whose enroll probability increases the most with the scholarship,
+    non-greedy (Teng): the applicants with the highest enroll probability with the scholarship.
+The input is the table of enroll probabilities of every applicant at every level of the scholarship domain (e.g.,
+from applicant_pool.ApplicantPool.get_baseline_probabilities). The paper gives the highest level; with level=None, the
+heuristics try every level above the lowest one and keep the best allocation, so they also apply to domains with
+several levels. The applicants are chosen by partial selection (np.argpartition) in O(n) per level instead of sorting
+them, so the heuristics run on millions of applicants.
+
+Usage in a script:
+
+    allocation, obj_val = greedy_heuristic(probabilities, scholarships, BUDGET, level=scholarships[-1])
+"""
+
+import sys
+import numpy as np
+
+
+def get_top_k(scores, k):
+    """
+    Return the positions of the k largest scores, in no particular order.
+    :param scores: array (n,)
+    :param k: int
+    :return: array of positions
+    """
+    k = min(max(int(k), 0), scores.size)
+    if k == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k == scores.size:
+        return np.arange(scores.size)
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+def check_probabilities(probabilities, levels, budget):
+    """
+    Check the inputs of a heuristic.
+    :return: the probabilities as an array (n, number of levels) and the levels as an array sorted like its columns
+    """
+    probabilities = np.asarray(probabilities, dtype=float)
+    levels = np.asarray(levels, dtype=float).ravel()
+    if probabilities.ndim != 2 or probabilities.shape[1] != levels.size:
+        print("JANOS Error: The probabilities of a heuristic need one column per scholarship level ... ")
+        sys.exit(1)
+    if np.any(np.diff(levels) <= 0):
+        print("JANOS Error: The scholarship levels of a heuristic must be increasing ... ")
+        sys.exit(1)
+    if budget < probabilities.shape[0] * levels[0]:
+        print("JANOS Error: The budget does not cover the lowest scholarship of every applicant ... ")
+        sys.exit(1)
+    return probabilities, levels
+
+
+def allocate_level(probabilities, levels, budget, level_index, scores):
+    """
+    Give level level_index to the applicants with the largest scores, as many as the budget allows, and the lowest
+    level to all others.
+    :param probabilities: array (n, number of levels)
+    :param levels: increasing array of scholarship levels
+    :param budget: total scholarship budget
+    :param level_index: index of the level to give
+    :param scores: array (n,) by which the applicants are chosen
+    :return: array (n,) with the scholarship of every applicant, and the expected enrollment
+    """
+    n = probabilities.shape[0]
+    n_chosen = int(np.floor((budget - n * levels[0]) / (levels[level_index] - levels[0]) + 1e-9))
+    chosen = get_top_k(scores, n_chosen)
+    allocation = np.full(n, levels[0])
+    allocation[chosen] = levels[level_index]
+    obj_val = probabilities[:, 0].sum() + (probabilities[chosen, level_index] - probabilities[chosen, 0]).sum()
+    return allocation, float(obj_val)
+
+
+def run_heuristic(probabilities, levels, budget, level, greedy):
+    probabilities, levels = check_probabilities(probabilities, levels, budget)
+    if level is None:
+        level_indices = range(1, levels.size)
+    else:
+        matches = np.flatnonzero(np.isclose(levels, level))
+        if matches.size == 0 or matches[0] == 0:
+            print("JANOS Error: The level of a heuristic must be a scholarship level above the lowest one ... ")
+            sys.exit(1)
+        level_indices = [matches[0]]
+
+    best = (np.full(probabilities.shape[0], levels[0]), float(probabilities[:, 0].sum()))
+    for level_index in level_indices:
+        if greedy:
+            scores = probabilities[:, level_index] - probabilities[:, 0]
+        else:
+            scores = probabilities[:, level_index]
+        allocation, obj_val = allocate_level(probabilities, levels, budget, level_index, scores)
+        if obj_val > best[1]:
+            best = (allocation, obj_val)
+    return best
+
+
+def greedy_heuristic(probabilities, levels, budget, level=None):
+    """
+    Give the scholarship to the applicants whose enroll probability increases the most with it.
+    :param probabilities: array (n, number of levels), the enroll probability of every applicant at every level
+    :param levels: increasing list or array of scholarship levels
+    :param budget: total scholarship budget
+    :param level: the scholarship to give; None tries every level above the lowest one and keeps the best
+    :return: array (n,) with the scholarship of every applicant, and the expected enrollment
+    """
+    return run_heuristic(probabilities, levels, budget, level, greedy=True)
+
+
+def non_greedy_heuristic(probabilities, levels, budget, level=None):
+    """
+    Give the scholarship to the applicants with the highest enroll probability with it.
+    :param probabilities: array (n, number of levels), the enroll probability of every applicant at every level
+    :param levels: increasing list or array of scholarship levels
+    :param budget: total scholarship budget
+    :param level: the scholarship to give; None tries every level above the lowest one and keeps the best
+    :return: array (n,) with the scholarship of every applicant, and the expected enrollment
+    """
+    return run_heuristic(probabilities, levels, budget, level, greedy=False)
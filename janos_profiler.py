@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in phase profiler for BatchJModel.
+
+m.get_time() only reports the time from creating a JModel to the end of the solve. With profiling enabled
+(BatchJModel(profile=True)), the model records for each phase of building and solving:
+    time: wall time in seconds,
+    mem: memory allocated and still held at the end of the phase, in MB (from tracemalloc),
+    vars / constrs: number of variables and constraints added to the optimization model.
+Phases may be nested; the time and memory of a nested phase are not counted in the enclosing phase, so the phases
+add up to the total.
+
+The phases are:
+    declare: declaring blocks, predictive models and constraints, from creating the model until solve() is called,
+    variables: adding the regular variables,
+    pm_encoding: encoding the predictive models,
+    breakpoints: generating the breakpoints of logistic regression models,
+    bound_tightening: computing the bounds of the hidden nodes of neural networks,
+    constraints: adding the user constraints,
+    assembly: assembling the sparse constraint matrix,
+    solver_load: handing the model and parameters to the solver,
+    solve: solving.
+"""
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PHASES = ["declare", "variables", "pm_encoding", "breakpoints", "bound_tightening", "constraints", "assembly",
+          "solver_load", "solve"]
+METRICS = ["time", "mem", "vars", "constrs"]
+
+
+def get_profile_columns():
+    """
+    Return the names of the columns written by PhaseProfiler.get_values, e.g., 'solve_time'.
+    :return: list of str
+    """
+    return [phase + "_" + metric for phase in PHASES for metric in METRICS]
+
+
+def get_traced_memory():
+    """
+    Return the size of the memory blocks traced by tracemalloc, in bytes; 0 if tracemalloc is not tracing.
+    """
+    if not tracemalloc.is_tracing():
+        return 0
+    return tracemalloc.get_traced_memory()[0]
+
+
+class NullProfiler:
+    """
+    The NullProfiler class is used when profiling is disabled; it records nothing.
+    """
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def begin(self, name):
+        pass
+
+    def end(self):
+        pass
+
+    def set_matrix_model(self, matrix_model):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_values(self):
+        return []
+
+
+class PhaseProfiler:
+    """
+    The PhaseProfiler class records the time, allocated memory and model size of every phase.
+    """
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Record everything inside the with-block as phase name.
+        :param name: one of PHASES
+        """
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def begin(self, name):
+        """
+        Start phase name; the phase that is currently running is paused until this phase ends.
+        :param name: one of PHASES
+        :return:
+        """
+        if name not in self.totals:
+            print("JANOS Error: Unknown profiling phase " + str(name) + " ... ")
+            sys.exit(1)
+        self.pause()
+        self.stack.append(name)
+        self.resume()
+
+    def end(self):
+        """
+        End the current phase and resume the enclosing one.
+        :return:
+        """
+        if not self.stack:
+            return
+        self.pause()
+        self.stack.pop()
+        self.resume()
+
+    def pause(self):
+        if not self.stack:
+            return
+        totals = self.totals[self.stack[-1]]
+        totals["time"] += time.perf_counter() - self.started["time"]
+        totals["mem"] += (get_traced_memory() - self.started["mem"]) / 1e6
+        vars_now, constrs_now = self.get_model_size()
+        totals["vars"] += vars_now - self.started["vars"]
+        totals["constrs"] += constrs_now - self.started["constrs"]
+
+    def resume(self):
+        if not self.stack:
+            return
+        self.started["vars"], self.started["constrs"] = self.get_model_size()
+        self.started["mem"] = get_traced_memory()
+        self.started["time"] = time.perf_counter()
+
+    def get_model_size(self):
+        if self.matrix_model is None:
+            return 0, 0
+        return self.matrix_model.n_vars, self.matrix_model.n_constrs
+
+    def set_matrix_model(self, matrix_model):
+        """
+        Count the variables and constraints added to matrix_model from now on.
+        """
+        self.pause()
+        self.matrix_model = matrix_model
+        self.resume()
+
+    def get_summary(self):
+        """
+        Return the recorded metrics.
+        :return: dict from phase name to dict from metric name to value
+        """
+        return {phase: dict(self.totals[phase]) for phase in PHASES}
+
+    def get_values(self):
+        """
+        Return the recorded metrics in the order of get_profile_columns().
+        :return: list
+        """
+        return [self.totals[phase][metric] for phase in PHASES for metric in METRICS]
+
+    def stop(self):
+        """
+        Stop tracing allocations if this profiler started it.
+        :return:
+        """
+        if self.started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.started_tracing = False
+
+    def __init__(self):
+        self.totals = {phase: {metric: 0 for metric in METRICS} for phase in PHASES}
+        self.stack = []
+        self.started = {}
+        self.matrix_model = None
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
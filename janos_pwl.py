@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Exact piecewise-linear response of a ReLU network in one feature, for every predicted variable.
+
+When all features of an applicant but one (e.g., merit) are constants, the output of a ReLU network is a continuous
+piecewise-linear function of that feature: it only changes slope where the pre-activation of some hidden node crosses
+zero. The kinks are enumerated layer by layer for all applicants at once:
+    the pre-activations of the first hidden layer are affine in the feature, so every node has at most one kink,
+    given the kinks of the layers before it, the pre-activations of the next layer are affine between consecutive
+        kinks, so their zero crossings are found by evaluating them at the kinks and interpolating where the sign
+        changes.
+The breakpoints of an applicant are the bounds of its domain and the kinks in between; the network is evaluated at
+them, and breakpoints at which the slope of the output does not change (e.g., a kink of a node that does not reach the
+output) are dropped. Between two breakpoints the response is exactly linear, so the network is encoded by a
+piecewise-linear function of the feature (see janos_batch.encode_piecewise_linear) instead of layer by layer.
+
+The breakpoints are stored as arrays (n, largest number of breakpoints); the breakpoints of a row are increasing and
+padded at the end by repeating the upper bound.
+"""
+
+import numpy as np
+
+# breakpoints closer than this are merged, and slopes that differ by less than this (relative) are considered equal
+BREAKPOINT_TOLERANCE = 1e-9
+
+
+def evaluate_layer(weights, biases, constants, feature_index, points, layer):
+    """
+    Evaluate the pre-activations of a layer of a ReLU network at points of one feature.
+    :param weights: list of weight arrays of the network
+    :param biases: list of bias arrays of the network
+    :param constants: array (n, n_features) of the other features
+    :param feature_index: int
+    :param points: array (n, k) of values of the feature
+    :param layer: index of the layer; len(weights) - 1 is the output layer
+    :return: array (n, k, number of nodes of the layer)
+    """
+    features = np.repeat(constants[:, None, :], points.shape[1], axis=1)
+    features[:, :, feature_index] = points
+    post = features
+    for k in range(layer):
+        post = np.maximum(post @ weights[k] + biases[k], 0.0)
+    return post @ weights[layer] + biases[layer]
+
+
+def compact(points, values, keep, upper_bound):
+    """
+    Move the points to keep to the front of every row, in increasing order, and pad the rows with the upper bound.
+    :param points: array (n, k)
+    :param values: None, or array (n, k) of the values at the points
+    :param keep: boolean array (n, k)
+    :param upper_bound: array (n,)
+    :return: points and values of shape (n, largest number of points kept, at least 2), and the number of points kept
+        in every row
+    """
+    order = np.argsort(np.where(keep, points, np.inf), axis=1, kind="stable")
+    n_points = keep.sum(axis=1)
+    width = max(int(n_points.max()), 2)
+    order = order[:, :width]
+    padding = np.arange(width)[None, :] >= n_points[:, None]
+    points = np.where(padding, upper_bound[:, None], np.take_along_axis(points, order, axis=1))
+    if values is not None:
+        last = np.take_along_axis(values, np.take_along_axis(order, np.maximum(n_points - 1, 0)[:, None], axis=1),
+                                  axis=1)
+        values = np.where(padding, last, np.take_along_axis(values, order, axis=1))
+    return points, values, n_points
+
+
+def get_relu_breakpoints(weights, biases, constants, feature_index, lower_bound, upper_bound):
+    """
+    Return the breakpoints of the output of a ReLU network with one output as a function of one feature over
+    [lower_bound, upper_bound], and the output at the breakpoints.
+    :param weights: list of weight arrays of the network
+    :param biases: list of bias arrays of the network
+    :param constants: array (n, n_features) of the other features; the column of the feature is ignored
+    :param feature_index: int
+    :param lower_bound: array (n,)
+    :param upper_bound: array (n,)
+    :return: breakpoints and values, arrays (n, k) with increasing rows padded by the upper bound, and the number of
+        breakpoints of every row (1 if the bounds are equal)
+    """
+    n = constants.shape[0]
+    lower_bound = np.broadcast_to(np.asarray(lower_bound, dtype=float), (n,))
+    upper_bound = np.broadcast_to(np.asarray(upper_bound, dtype=float), (n,))
+    breakpoints = np.column_stack([lower_bound, upper_bound])
+    n_breakpoints = np.where(upper_bound > lower_bound, 2, 1)
+
+    for layer in range(len(weights) - 1):
+        pre = evaluate_layer(weights, biases, constants, feature_index, breakpoints, layer)
+        left = pre[:, :-1, :]
+        right = pre[:, 1:, :]
+        crossing = left * right < 0
+        share = left / np.where(crossing, left - right, 1.0)
+        start = breakpoints[:, :-1, None]
+        kinks = start + share * (breakpoints[:, 1:, None] - start)
+        points = np.concatenate([breakpoints, kinks.reshape(n, -1)], axis=1)
+        keep = np.concatenate([np.arange(breakpoints.shape[1])[None, :] < n_breakpoints[:, None],
+                               crossing.reshape(n, -1)], axis=1)
+        points, _, _ = compact(points, None, keep, upper_bound)
+        # merge kinks that coincide, e.g., of nodes with the same zero crossing
+        keep = np.concatenate([np.ones((n, 1), dtype=bool), np.diff(points, axis=1) > BREAKPOINT_TOLERANCE], axis=1)
+        breakpoints, _, n_breakpoints = compact(points, None, keep, upper_bound)
+
+    values = evaluate_layer(weights, biases, constants, feature_index, breakpoints, len(weights) - 1)[:, :, 0]
+
+    # drop the breakpoints at which the slope of the output does not change
+    width = np.diff(breakpoints, axis=1)
+    slope = np.diff(values, axis=1) / np.where(width > 0, width, 1.0)
+    bend = np.abs(np.diff(slope, axis=1)) > BREAKPOINT_TOLERANCE * (1 + np.abs(slope[:, 1:]))
+    columns = np.arange(breakpoints.shape[1])[None, :]
+    keep = (columns == 0) | (columns == n_breakpoints[:, None] - 1)
+    keep[:, 1:-1] |= bend & (columns[:, 1:-1] < n_breakpoints[:, None] - 1)
+    breakpoints, values, n_breakpoints = compact(breakpoints, values, keep, upper_bound)
+    return breakpoints, values, n_breakpoints
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of fitted predictive models and scalers.
+
+Every script fits the same scalers and predictive models on college_student_enroll-s1-1.csv at startup. fit_cached
+fits an sklearn estimator only if the cache has no estimator of the same class and hyperparameters fitted on the same
+data; otherwise it loads the fitted estimator from disk. The key of an entry is the SHA-256 hash of
+    the module and name of the estimator class,
+    its hyperparameters (estimator.get_params()),
+    the training data (values, column names and dtypes of X and y),
+    the versions of scikit-learn and NumPy, so that an upgrade does not load estimators pickled by another version.
+Entries are written to a temporary file and renamed, so parallel runs can share the cache; if two runs fit the same
+estimator at once, both write the same content. When the cache exceeds its size limit, the least recently used entries
+are evicted.
+
+The cache directory is the JANOS_MODEL_CACHE environment variable or, if it is unset, .janos_model_cache in the working
+directory. The size limit is JANOS_MODEL_CACHE_MB megabytes (256 by default).
+
+Usage in a script:
+
+    scaler_sat = fit_cached(StandardScaler(), X[["SAT"]])
+    my_logistic_regression = fit_cached(LogisticRegression(random_state=0, solver='lbfgs'), X[features], y)
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+import sklearn
+
+CACHE_EXTENSION = ".pkl"
+
+
+def hash_data(hasher, data):
+    """
+    Add the values, column names and dtypes of a DataFrame, Series or array to a hash.
+    :param hasher: hashlib object
+    :param data: pandas DataFrame or Series, NumPy array, or None
+    :return:
+    """
+    if data is None:
+        hasher.update(b"None")
+        return
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        hasher.update(repr(list(data.columns) if isinstance(data, pd.DataFrame) else data.name).encode())
+        hasher.update(repr(list(data.dtypes) if isinstance(data, pd.DataFrame) else data.dtype).encode())
+        data = data.to_numpy()
+    data = np.ascontiguousarray(data)
+    hasher.update(repr((data.shape, data.dtype.str)).encode())
+    if data.dtype == object:
+        # the buffer of an object array holds pointers; hash the values (e.g., strings) instead
+        hasher.update(pd.util.hash_array(data.ravel()).tobytes())
+    else:
+        hasher.update(data.tobytes())
+
+
+def get_cache_key(estimator, X, y=None):
+    """
+    Return the key of an estimator fitted on (X, y).
+    :param estimator: unfitted sklearn estimator
+    :param X: training features
+    :param y: training targets, or None for transformers such as StandardScaler
+    :return: str, hexadecimal SHA-256 hash
+    """
+    hasher = hashlib.sha256()
+    hasher.update((type(estimator).__module__ + "." + type(estimator).__name__).encode())
+    hasher.update(("sklearn " + sklearn.__version__ + " numpy " + np.__version__).encode())
+    hasher.update(repr(sorted(estimator.get_params(deep=True).items())).encode())
+    hash_data(hasher, X)
+    hash_data(hasher, y)
+    return hasher.hexdigest()
+
+
+class ModelCache:
+    """
+    The ModelCache class stores fitted estimators in a directory, one pickle file per key.
+    """
+
+    def fit(self, estimator, X, y=None):
+        """
+        Return the estimator fitted on (X, y), from the cache if possible.
+        :param estimator: unfitted sklearn estimator
+        :param X: training features
+        :param y: training targets, or None
+        :return: fitted estimator (the given object if it was fitted, otherwise the cached one)
+        """
+        key = get_cache_key(estimator, X, y)
+        fitted = self.load(key)
+        if fitted is not None:
+            return fitted
+        if y is None:
+            estimator.fit(X)
+        else:
+            estimator.fit(X, y)
+        self.save(key, estimator)
+        return estimator
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def load(self, key):
+        """
+        Load an entry and mark it as recently used.
+        :param key: str
+        :return: the fitted estimator, or None if the cache has no (readable) entry for key
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as file:
+                fitted = pickle.load(file)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return fitted
+
+    def save(self, key, estimator):
+        """
+        Store an entry atomically and evict the least recently used entries beyond the size limit.
+        :param key: str
+        :param estimator: fitted estimator
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            pickle.dump(estimator, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self.get_path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits into max_bytes.
+        :return:
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_EXTENSION):
+                try:
+                    status = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, name))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total_size -= size
+
+    def __init__(self, directory=None, max_bytes=None):
+        """
+        :param directory: cache directory; None uses JANOS_MODEL_CACHE or .janos_model_cache
+        :param max_bytes: size limit; None uses JANOS_MODEL_CACHE_MB megabytes or 256 MB
+        """
+        if directory is None:
+            directory = os.environ.get("JANOS_MODEL_CACHE", ".janos_model_cache")
+        if max_bytes is None:
+            max_bytes = float(os.environ.get("JANOS_MODEL_CACHE_MB", 256)) * 2 ** 20
+        if max_bytes <= 0:
+            print("JANOS Error: The size limit of the model cache must be positive ... ")
+            sys.exit(1)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+
+def fit_cached(estimator, X, y=None, cache=None):
+    """
+    Return the estimator fitted on (X, y), from the on-disk cache if the same estimator was fitted on the same data
+    before.
+    :param estimator: unfitted sklearn estimator
+    :param X: training features
+    :param y: training targets, or None
+    :param cache: ModelCache; None uses the default cache
+    :return: fitted estimator
+    """
+    if cache is None:
+        cache = ModelCache()
+    return cache.fit(estimator, X, y)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Shared writer for the result files of the evaluation scripts.
+
+A ResultSink keeps the result file open, buffers the rows and writes them in batches. The format follows the file
+extension:
+    .txt or .tsv: tab-separated values,
+    .csv: comma-separated values,
+    .parquet: Parquet (needs pyarrow); the rows are written in one go when the sink is closed.
+Every file starts with a header of column names, missing values are written as NULL, and rows shorter than the header
+are padded with NULL, so that all rows of a file have the same columns.
+
+Usage in a script:
+
+    with ResultSink(filename, ["PM", "student_size", "configuration", "iteration", "janos_time", ...]) as sink:
+        run_grid(run_simulations, jobs, n_workers, sink)
+
+read_results reads any of these files into a pandas DataFrame, and summarize_scale_results regenerates
+data_all_scale_20200501_summary.csv from the result files of the linear regression, logistic regression and neural
+network scripts:
+
+    python result_sink.py data_all_scale_20200501_summary.csv 20200501_linear_regression_*.txt \
+        20200501_logistic_regression_*.txt 20200501_neural_network_*.txt
+"""
+
+import os
+import sys
+import csv
+import pandas as pd
+
+NULL = "NULL"
+DELIMITERS = {".txt": "\t", ".tsv": "\t", ".csv": ","}
+
+
+def get_file_format(filename):
+    """
+    Return the format of a result file from its extension.
+    :param filename: str
+    :return: '.txt', '.tsv', '.csv' or '.parquet'
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in DELIMITERS and extension != ".parquet":
+        print("JANOS Error: Result files must end with .txt, .tsv, .csv or .parquet ... ")
+        sys.exit(1)
+    return extension
+
+
+class ResultSink:
+    """
+    The ResultSink class writes the rows of a result file in batches through a file handle that stays open.
+    """
+
+    def write(self, row):
+        """
+        Add a row; the buffered rows are written once there are buffer_size of them.
+        :param row: list of values, at most one per column
+        :return:
+        """
+        if len(row) > len(self.columns):
+            print("JANOS Error: A row of " + self.filename + " has more values than columns ... ")
+            sys.exit(1)
+        row = [NULL if value is None else value for value in row]
+        self.buffer.append(row + [NULL] * (len(self.columns) - len(row)))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        """
+        Add several rows.
+        :param rows: list of rows
+        :return:
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """
+        Write the buffered rows to the file (text formats only; Parquet rows are kept until the sink is closed).
+        :return:
+        """
+        if self.writer is None:
+            return
+        self.writer.writerows(self.buffer)
+        self.buffer = []
+        self.file.flush()
+
+    def close(self):
+        """
+        Write the remaining rows and close the file.
+        :return:
+        """
+        if self.file_format == ".parquet":
+            table = pd.DataFrame(self.buffer, columns=self.columns).replace(NULL, None)
+            table.to_parquet(self.filename, index=False)
+            self.buffer = []
+        elif self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, filename, columns, buffer_size=100):
+        """
+        Create the result file and write its header.
+        :param filename: str; the extension selects the format
+        :param columns: list of column names
+        :param buffer_size: number of rows written at a time
+        """
+        self.filename = filename
+        self.columns = list(columns)
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.file_format = get_file_format(filename)
+        self.file = None
+        self.writer = None
+        if self.file_format != ".parquet":
+            self.file = open(filename, "w", newline="")
+            self.writer = csv.writer(self.file, delimiter=DELIMITERS[self.file_format], lineterminator="\n")
+            self.writer.writerow(self.columns)
+            self.file.flush()
+
+
+def read_results(filename):
+    """
+    Read a result file written by a ResultSink.
+    :param filename: str
+    :return: pandas DataFrame; NULL values are missing
+    """
+    file_format = get_file_format(filename)
+    if file_format == ".parquet":
+        return pd.read_parquet(filename)
+    return pd.read_csv(filename, sep=DELIMITERS[file_format], na_values=[NULL])
+
+
+def get_model_label(pm, configuration):
+    """
+    Return the label of a predictive model in the summary, e.g., LogReg(10) for 10 breakpoints and NN(2) for the
+    second network size.
+    :param pm: 'LinReg', 'LogReg' or 'NN'
+    :param configuration: number of breakpoints, index of the network size, or missing (None, NaN or NULL)
+    :return: str
+    """
+    if configuration is None or pd.isna(configuration) or str(configuration) == NULL:
+        return pm
+    if pm == "LogReg":
+        return pm + "(" + str(int(configuration)) + ")"
+    if pm == "NN":
+        return pm + "(" + str(int(configuration) + 1) + ")"
+    return pm
+
+
+def summarize_scale_results(filenames):
+    """
+    Average the JANOS time of every predictive model, student size and configuration over the simulations, in the
+    layout of data_all_scale_20200501_summary.csv.
+    :param filenames: result files of evaluate_linear_regression, evaluate_logistic_regression and
+        evaluate_neural_network
+    :return: pandas DataFrame with the columns Label, student_size, configuration, Average of janos_time and Model
+    """
+    results = pd.concat([read_results(filename) for filename in filenames], ignore_index=True)
+    results["configuration"] = results["configuration"].fillna(NULL).astype(str).str.replace(r"\.0$", "", regex=True)
+    summary = results.groupby(["PM", "student_size", "configuration"], sort=False)["janos_time"].mean().reset_index()
+    summary.columns = ["Label", "student_size", "configuration", "Average of janos_time"]
+    summary["Model"] = [get_model_label(pm, configuration)
+                        for pm, configuration in zip(summary["Label"], summary["configuration"])]
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python result_sink.py summary.csv result_file [result_file ...]")
+        sys.exit(1)
+    summarize_scale_results(sys.argv[2:]).to_csv(sys.argv[1], index=False)
@@ -16,6 +16,13 @@ from datetime import datetime
 import time
 from sklearn.neural_network import MLPRegressor
 from sklearn.linear_model import LinearRegression
+from experiment_runner import build_grid, run_grid, get_worker_models
+from janos_batch import BatchJModel
+from janos_profiler import get_profile_columns
+from result_sink import ResultSink
+from model_cache import fit_cached
+from applicant_pool import ApplicantPool
+from janos_heuristics import greedy_heuristic, non_greedy_heuristic
 
 pd.options.mode.chained_assignment = None
 
@@ -38,6 +45,11 @@ student_sizes = [500, 1000]
 interview_sizes = [20]
 LAYERS = 1
 nodes_per_layer = 10
+n_workers = None  # None uses every core (or JANOS_N_WORKERS); 1 runs the grid serially
+profile_phases = False  # True adds the time, memory and model size of every JANOS phase as extra columns
+result_format = "txt"  # "txt" (tab-separated), "csv" or "parquet"
+greedy_start = True  # True passes the allocation of the greedy heuristic to JANOS as its initial solution
+lookup_table = False  # True encodes JANOS_discrete with the predictions for every scholarship level (exact)
 
 """
 pretrained model
@@ -48,8 +60,8 @@ y = historical_student_data[["enroll"]]
 
 # Before training the model, standardize SAT and GPA.
 # For convenience, we do not standardize merit.
-scaler_sat = StandardScaler().fit(X[["SAT"]])
-scaler_gpa = StandardScaler().fit(X[["GPA"]])
+scaler_sat = fit_cached(StandardScaler(), X[["SAT"]])
+scaler_gpa = fit_cached(StandardScaler(), X[["GPA"]])
 X['SAT_scaled'] = scaler_sat.transform(X[['SAT']])
 X['GPA_scaled'] = scaler_gpa.transform(X[['GPA']])
 
@@ -57,233 +69,188 @@ X['GPA_scaled'] = scaler_gpa.transform(X[['GPA']])
 applications["SAT_scaled"] = scaler_sat.transform(applications[["SAT"]])
 applications["GPA_scaled"] = scaler_gpa.transform(applications[["GPA"]])
 
-now = datetime.now()
-date_time = now.strftime("%H-%M-%S-%Y%m%d")
-filename = "rewrite_08_s1_full_" + date_time + ".txt"
-output = open(filename, "w")
-output.write("Algorithm\tPModel\tn_students\titeration\tobj_val\truntime\n")
-output.close()
+# The samples of all simulations, as row positions into the applications
+applicant_pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+applicant_pool.draw_samples(student_sizes, range(n_simulations))
 
-for model_id in range(3):
-    # if model_id != 1:
-    #     continue
-    if model_id == 0:
-        continue
+"""
+Experiments:
+"""
+model_ids = [1, 2]  # 0: LinReg, 1: LogReg, 2: NN
 
+pretrained_models = {}
+model_names = {}
+for model_id in model_ids:
     if model_id == 0:
-        my_logistic_regression = LinearRegression().fit(X[["SAT_scaled", "GPA_scaled", "merit"]], y)
+        pretrained_models[model_id] = fit_cached(LinearRegression(), X[["SAT_scaled", "GPA_scaled", "merit"]], y)
     if model_id == 1:
-        my_logistic_regression = LogisticRegression(random_state=0, solver='lbfgs').fit(
-            X[["SAT_scaled", "GPA_scaled", "merit"]], y)
+        pretrained_models[model_id] = fit_cached(LogisticRegression(random_state=0, solver='lbfgs'),
+                                                 X[["SAT_scaled", "GPA_scaled", "merit"]], y)
     if model_id == 2:
-        my_logistic_regression = MLPRegressor(hidden_layer_sizes=[10], random_state=0)
-        my_logistic_regression.fit(X[["SAT_scaled", "GPA_scaled", "merit"]], y)
+        pretrained_models[model_id] = fit_cached(MLPRegressor(hidden_layer_sizes=[10], random_state=0),
+                                                 X[["SAT_scaled", "GPA_scaled", "merit"]], y)
 
     if model_id == 0:
-        model_name = "LinReg"
+        model_names[model_id] = "LinReg"
     if model_id == 1:
-        model_name = "LogReg"
+        model_names[model_id] = "LogReg"
     if model_id == 2:
-        model_name = "NN"
-
-    for n_students in student_sizes:
-        n_applications = n_students
-        n_administration_letters = n_students
-        BUDGET = int(0.2 * n_students)
-
-        for sim_idx in range(n_simulations):
-
-            # randomly select n_administration_letters samples.
-            random_sample = applications.sample(n_administration_letters, random_state=sim_idx)
-            random_sample = random_sample.reset_index()
-
-            random_sample["no_merit"] = [scholarships[0]] * n_applications
-            random_sample["yes_merit"] = [scholarships[-1]] * n_applications
-
-            if model_id == 1:
-                predicted_probabilities = my_logistic_regression.predict_proba(
-                    random_sample[["SAT_scaled", "GPA_scaled", "no_merit"]])
-                predicted_probabilities = pd.DataFrame(predicted_probabilities, columns=["0", '1'])
-                random_sample["enroll_probability_no_merit"] = predicted_probabilities["1"]
-
-                predicted_probabilities = my_logistic_regression.predict_proba(
-                    random_sample[["SAT_scaled", "GPA_scaled", "yes_merit"]])
-                predicted_probabilities = pd.DataFrame(predicted_probabilities, columns=["0", "1"])
-                random_sample["enroll_probability_yes_merit"] = predicted_probabilities["1"]
-            else:
-                predicted_probabilities = my_logistic_regression.predict(
-                    random_sample[["SAT_scaled", "GPA_scaled", "no_merit"]])
-                # predicted_probabilities = pd.DataFrame(predicted_probabilities, columns=["0", '1'])
-                random_sample["enroll_probability_no_merit"] = predicted_probabilities
-
-                predicted_probabilities = my_logistic_regression.predict(
-                    random_sample[["SAT_scaled", "GPA_scaled", "yes_merit"]])
-                # predicted_probabilities = pd.DataFrame(predicted_probabilities, columns=["0", "1"])
-                random_sample["enroll_probability_yes_merit"] = predicted_probabilities
-
-            random_sample["enroll_probability_diff"] = random_sample['enroll_probability_yes_merit'] - random_sample[
-                'enroll_probability_no_merit']
-
-            """
-            non-greedy heuristic (Teng)
-            """
-            # Sort by enroll_probability_yes_merit
-            baseline_start_time = time.time()
-            random_sample = random_sample.sort_values(by=['enroll_probability_yes_merit'], ascending=False)
-            random_sample = random_sample.reset_index(drop=True)
-
-            obj_val = 0.0
-            for i in range(n_administration_letters):
-                if i < int(BUDGET / scholarships[-1]):
-                    probability = random_sample['enroll_probability_yes_merit'][i]
-                else:
-                    probability = random_sample['enroll_probability_no_merit'][i]
-                obj_val += probability
-            baseline_end_time = time.time()
-            total_time = baseline_end_time - baseline_end_time
-            output = open(filename, "a")
-            output.write("non-greedy\t" + model_name + "\t" + str(n_students) + "\t" + str(sim_idx) + "\t" + str(
-                obj_val) + "\t" + str(total_time) + "\n")
-            output.close()
-            """
-            JANOS: predict and prescribe (discrete)
-            """
-            m = JModel()
-
-            # Define regular variables
-            assign_scholarship = m.add_regular_variables([n_administration_letters], "assign_scholarship")
-            for app_index in range(n_administration_letters):
-                assign_scholarship[app_index].setDiscreteDomain(scholarships)
-                assign_scholarship[app_index].setObjectiveCoefficient(0)
-
-            # Define predicted variables
-            # First, we need to create structures of predictive models. In this case, we associate such a structure with an existing / pretrained logistic regression model.
-
-            logistic_regression_model = OptimizationPredictiveModel(m, pretrained_model=my_logistic_regression,
-                                                                    feature_names=["SAT_scaled", "GPA_scaled", "merit"])
-
-            # Now, we could define the predicted decision variables and associate them with the predicted model structure.
-            enroll_probabilities = m.add_predicted_variables([n_administration_letters], "enroll_probs")
-            for app_index in range(n_administration_letters):
-                enroll_probabilities[app_index].setObjectiveCoefficient(1)
-                mapping_of_vars = {"merit": assign_scholarship[app_index],
-                                   "SAT_scaled": random_sample["SAT_scaled"][app_index],
-                                   "GPA_scaled": random_sample["GPA_scaled"][app_index]}
-                enroll_probabilities[app_index].setPM(logistic_regression_model, mapping_of_vars)
-
-            # Construct constraints
-            # \sum_i x_i <= BUDGET
-            scholarship_deployed = Expression()
-
-            for app_index in range(n_administration_letters):
-                scholarship_deployed.add_term(assign_scholarship[app_index], 1)
-
-            m.add_constraint(scholarship_deployed, "less_equal", BUDGET)
-
-            # solve the model
-            m.add_gurobi_param_settings('TimeLimit', 1800)
-            m.add_gurobi_param_settings('DUALREDUCTIONS', 0)
-            m.add_gurobi_param_settings('MIPGap', 0.001)
-            m.add_gurobi_param_settings('Threads', 1)
-            m.set_output_flag(0)
-            m.solve()
-
-            status = m.gurobi_model.status
-            output = open(filename, "a")
-            output.write("janos_discrete\t" + model_name + "\t" + str(n_students) + "\t" + str(sim_idx) + "\t" + str(
-                m.gurobi_model.objBound) + "\t" + str(m.get_time()) + "\t" + str(status) + "\n")
-            output.close()
-            #            if status == GRB.Status.UNBOUNDED:
-            #                print('The model cannot be solved because it is unbounded')
-            #                sys.exit(0)
-            #            elif status == GRB.Status.OPTIMAL:
-            #                output.write("janos_discrete\t" + model_name + "\t" + str(n_students) + "\t" + str(sim_idx) + "\t" + str(m.gurobi_model.objVal) + "\t" + str(m.get_time()) + "\n")
-            #
-            #            elif status != GRB.Status.INF_OR_UNBD and status != GRB.Status.INFEASIBLE:
-            #                print('Optimization was stopped with status %d' % status)
-            #            else:
-            #                # if none of the above, then do IIS
-            #                print('The model is infeasible; computing IIS')
-            #                m.gurobi_model.computeIIS()
-            #                m.gurobi_model.write("ip_model_inf.ilp")
-            #                if m.gurobi_model.IISMinimal:
-            #                    print('IIS is minimal\n')
-            #                else:
-            #                    print('IIS is not minimal\n')
-            #                print('\nThe following constraint(s) cannot be satisfied:')
-            #                for c in m.gurobi_model.getConstrs():
-            #                    if c.IISConstr:
-            #                        print('%s' % c.constrName)
-            """
-            greedy heuristic (David)
-            """
-            # sort by enroll_probability_diff
-            baseline_start_time = time.time()
-            random_sample = random_sample.sort_values(by=['enroll_probability_diff'], ascending=False)
-            random_sample = random_sample.reset_index(drop=True)
-
-            obj_val = 0.0
-            for i in range(n_administration_letters):
-                if i < int(BUDGET / scholarships[-1]):
-                    probability = random_sample['enroll_probability_yes_merit'][i]
-                else:
-                    probability = random_sample['enroll_probability_no_merit'][i]
-                obj_val += probability
-            baseline_end_time = time.time()
-            total_time = baseline_end_time - baseline_end_time
-            output = open(filename, "a")
-            output.write("greedy\t" + model_name + "\t" + str(n_students) + "\t" + str(sim_idx) + "\t" + str(
-                obj_val) + "\t" + str(total_time) + "\n")
-            output.close()
-
-            """
-            JANOS: predict and prescribe (continuous)
-            """
-            m = JModel()
-
-            # Define regular variables
-            assign_scholarship = m.add_regular_variables([n_administration_letters], "assign_scholarship")
-            for app_index in range(n_administration_letters):
-                assign_scholarship[app_index].setContinuousDomain(scholarships[0], scholarships[-1])
-                assign_scholarship[app_index].setObjectiveCoefficient(0)
-
-            # Define predicted variables
-            # First, we need to create structures of predictive models. In this case, we associate such a structure with an existing / pretrained logistic regression model.
-
-            logistic_regression_model = OptimizationPredictiveModel(m, pretrained_model=my_logistic_regression,
-                                                                    feature_names=["SAT_scaled", "GPA_scaled", "merit"])
-
-            # Now, we could define the predicted decision variables and associate them with the predicted model structure.
-            enroll_probabilities = m.add_predicted_variables([n_administration_letters], "enroll_probs")
-            for app_index in range(n_administration_letters):
-                enroll_probabilities[app_index].setObjectiveCoefficient(1)
-                mapping_of_vars = {"merit": assign_scholarship[app_index],
-                                   "SAT_scaled": random_sample["SAT_scaled"][app_index],
-                                   "GPA_scaled": random_sample["GPA_scaled"][app_index]}
-                enroll_probabilities[app_index].setPM(logistic_regression_model, mapping_of_vars)
-
-            # Construct constraints
-            # \sum_i x_i <= BUDGET
-            scholarship_deployed = Expression()
-
-            for app_index in range(n_administration_letters):
-                scholarship_deployed.add_term(assign_scholarship[app_index], 1)
-
-            m.add_constraint(scholarship_deployed, "less_equal", BUDGET)
-
-            # solve the model
-            m.add_gurobi_param_settings('TimeLimit', 1800)
-            m.add_gurobi_param_settings('DUALREDUCTIONS', 0)
-            m.add_gurobi_param_settings('MIPGap', 0.001)
-            m.add_gurobi_param_settings('Threads', 1)
-            m.set_output_flag(0)
-            m.solve()
-
-            status = m.gurobi_model.status
-            output = open(filename, "a")
-            output.write("janos_continuous\t" + model_name + "\t" + str(n_students) + "\t" + str(sim_idx) + "\t" + str(
-                m.gurobi_model.objBound) + "\t" + str(m.get_time()) + "\t" + str(status) + "\n")
-            output.close()
+        model_names[model_id] = "NN"
+
+
+def build_model(n_applications, BUDGET, constant_features, my_logistic_regression, discrete):
+    """
+    Build the JANOS model of one cell of the grid.
+    :param n_applications: number of applicants
+    :param BUDGET: total scholarship budget
+    :param constant_features: dict from "SAT_scaled" and "GPA_scaled" to the values of the applicants
+    :param my_logistic_regression: pretrained model
+    :param discrete: True for the scholarship levels, False for any scholarship between the lowest and highest level
+    :return: the model, the block of scholarships and the block of enroll probabilities
+    """
+    m = BatchJModel(profile=profile_phases)
+
+    # Define regular variables
+    assign_scholarship = m.add_regular_variable_block(n_applications, "assign_scholarship")
+    if discrete:
+        assign_scholarship.setDiscreteDomain(scholarships)
+    else:
+        assign_scholarship.setContinuousDomain(scholarships[0], scholarships[-1])
+    assign_scholarship.setObjectiveCoefficient(0)
+
+    # Define predicted variables
+    # First, we need to create structures of predictive models. In this case, we associate such a structure with an existing / pretrained logistic regression model.
+
+    logistic_regression_model = OptimizationPredictiveModel(m, pretrained_model=my_logistic_regression,
+                                                            feature_names=["SAT_scaled", "GPA_scaled", "merit"])
+
+    # Now, we could define the predicted decision variables and associate them with the predicted model structure.
+    enroll_probabilities = m.add_predicted_variable_block(n_applications, "enroll_probs")
+    enroll_probabilities.setObjectiveCoefficient(1)
+    mapping_of_vars = {"merit": assign_scholarship,
+                       "SAT_scaled": constant_features["SAT_scaled"],
+                       "GPA_scaled": constant_features["GPA_scaled"]}
+    enroll_probabilities.setPM(logistic_regression_model, mapping_of_vars)
+    if discrete and lookup_table:
+        enroll_probabilities.setLookupTable()
+
+    # Construct constraints
+    # \sum_i x_i <= BUDGET
+    m.add_block_constraint(assign_scholarship, np.ones(n_applications), "less_equal", BUDGET)
+
+    # solve the model
+    m.add_gurobi_param_settings('TimeLimit', 1800)
+    m.add_gurobi_param_settings('DUALREDUCTIONS', 0)
+    m.add_gurobi_param_settings('MIPGap', 0.001)
+    m.add_gurobi_param_settings('Threads', 1)
+    m.set_output_flag(0)
+
+    return m, assign_scholarship, enroll_probabilities
+
+
+def run_simulation(job, models):
+    """
+    Solve one (model_id, n_students, sim_idx) cell of the grid with the heuristics and both JANOS variants.
+    :param job: tuple of model_id, n_students and sim_idx
+    :param models: dict of the JANOS models built for earlier simulations of the same cell, which are reused
+    :return: list of output rows
+    """
+    model_id, n_students, sim_idx = job
+    my_logistic_regression = pretrained_models[model_id]
+    model_name = model_names[model_id]
+    rows = []
+
+    n_applications = n_students
+    n_administration_letters = n_students
+    BUDGET = int(0.2 * n_students)
+
+    # randomly select n_administration_letters samples.
+    sample = applicant_pool.get_sample(n_administration_letters, sim_idx)
+    constant_features = applicant_pool.get_features(sample)
+
+    # enroll probabilities at every scholarship level, predicted once for all applications and this model
+    baseline_probabilities = applicant_pool.get_baseline_probabilities(
+        my_logistic_regression, ["SAT_scaled", "GPA_scaled", "merit"], "merit", scholarships)[sample]
+
+    """
+    non-greedy heuristic (Teng)
+    """
+    # the largest scholarship to the applicants with the largest enroll probability with it
+    baseline_start_time = time.perf_counter()
+    _, obj_val = non_greedy_heuristic(baseline_probabilities, scholarships, BUDGET, level=scholarships[-1])
+    baseline_end_time = time.perf_counter()
+    total_time = baseline_end_time - baseline_start_time
+    rows.append(["non-greedy", model_name, n_students, sim_idx, obj_val, total_time])
+
+    """
+    greedy heuristic (David)
+    """
+    # the largest scholarship to the applicants whose enroll probability increases the most with it; run before
+    # JANOS, which starts from this allocation, and written after JANOS_discrete
+    baseline_start_time = time.perf_counter()
+    greedy_merit, obj_val = greedy_heuristic(baseline_probabilities, scholarships, BUDGET, level=scholarships[-1])
+    baseline_end_time = time.perf_counter()
+    total_time = baseline_end_time - baseline_start_time
+    greedy_row = ["greedy", model_name, n_students, sim_idx, obj_val, total_time]
+
+    """
+    JANOS: predict and prescribe (discrete)
+    """
+    if "janos_discrete" in models:
+        # The model of this cell has been built for an earlier simulation; only the applicants change.
+        m, assign_scholarship, enroll_probabilities = models["janos_discrete"]
+        enroll_probabilities.setConstantFeatures(constant_features)
+    else:
+        m, assign_scholarship, enroll_probabilities = build_model(n_administration_letters, BUDGET, constant_features,
+                                                                  my_logistic_regression, True)
+        models["janos_discrete"] = (m, assign_scholarship, enroll_probabilities)
+    if greedy_start:
+        m.set_initial_solution(assign_scholarship, greedy_merit)
+    m.solve()
+
+    status = m.gurobi_model.status
+    rows.append(["janos_discrete", model_name, n_students, sim_idx, m.gurobi_model.objBound, m.get_time(), status] +
+                m.get_profile())
+    #            if status == GRB.Status.UNBOUNDED:
+    #                print('The model cannot be solved because it is unbounded')
+    #                sys.exit(0)
+    #            elif status == GRB.Status.OPTIMAL:
+    #                output.write("janos_discrete\t" + model_name + "\t" + str(n_students) + "\t" + str(sim_idx) + "\t" + str(m.gurobi_model.objVal) + "\t" + str(m.get_time()) + "\n")
+    #
+    #            elif status != GRB.Status.INF_OR_UNBD and status != GRB.Status.INFEASIBLE:
+    #                print('Optimization was stopped with status %d' % status)
+    #            else:
+    #                # if none of the above, then do IIS
+    #                print('The model is infeasible; computing IIS')
+    #                m.gurobi_model.computeIIS()
+    #                m.gurobi_model.write("ip_model_inf.ilp")
+    #                if m.gurobi_model.IISMinimal:
+    #                    print('IIS is minimal\n')
+    #                else:
+    #                    print('IIS is not minimal\n')
+    #                print('\nThe following constraint(s) cannot be satisfied:')
+    #                for c in m.gurobi_model.getConstrs():
+    #                    if c.IISConstr:
+    #                        print('%s' % c.constrName)
+    rows.append(greedy_row)
+
+    """
+    JANOS: predict and prescribe (continuous)
+    """
+    if "janos_continuous" in models:
+        m, assign_scholarship, enroll_probabilities = models["janos_continuous"]
+        enroll_probabilities.setConstantFeatures(constant_features)
+    else:
+        m, assign_scholarship, enroll_probabilities = build_model(n_administration_letters, BUDGET, constant_features,
+                                                                  my_logistic_regression, False)
+        models["janos_continuous"] = (m, assign_scholarship, enroll_probabilities)
+    if greedy_start:
+        m.set_initial_solution(assign_scholarship, greedy_merit)
+    m.solve()
+
+    status = m.gurobi_model.status
+    rows.append(["janos_continuous", model_name, n_students, sim_idx, m.gurobi_model.objBound, m.get_time(),
+                 status] + m.get_profile())
 
 #            if status == GRB.Status.UNBOUNDED:
 #                print('The model cannot be solved because it is unbounded')
@@ -307,3 +274,28 @@ for model_id in range(3):
 #                    if c.IISConstr:
 #                        print('%s' % c.constrName)
 #                sys.exit(1)
+    return rows
+
+
+def run_cached_simulation(job):
+    """
+    Solve one (model_id, n_students, sim_idx) cell of the grid. The JANOS models built by this process for an earlier
+    simulation of the same model and student size are updated in place with the new applicants.
+    :param job: tuple of the axes of the grid and the simulation index
+    :return: list of output rows
+    """
+    return run_simulation(job, get_worker_models(job[:-1]))
+
+
+if __name__ == "__main__":
+    now = datetime.now()
+    date_time = now.strftime("%H-%M-%S-%Y%m%d")
+    filename = "rewrite_08_s1_full_" + date_time + "." + result_format
+    # the heuristics have no solver status, which is NULL in their rows
+    columns = ["Algorithm", "PModel", "n_students", "iteration", "obj_val", "runtime", "status"]
+    if profile_phases:
+        columns += get_profile_columns()
+
+    jobs = build_grid(model_ids, student_sizes, range(n_simulations))
+    with ResultSink(filename, columns) as sink:
+        run_grid(run_cached_simulation, jobs, n_workers, sink)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures of the tests: the scaled student data and applications that the scripts read, and small pretrained
+models fitted on them.
+"""
+
+import os
+import sys
+import types
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import janos_main
+except ImportError:
+    # janos_main is the development copy of the janos package; the README runs the scripts with janos instead
+    import janos
+    import janos.janos
+    janos_main = types.ModuleType("janos_main")
+    for module in [janos, janos.janos]:
+        janos_main.__dict__.update({name: value for name, value in vars(module).items() if not name.startswith("_")})
+    sys.modules["janos_main"] = janos_main
+
+FEATURES = ["SAT_scaled", "GPA_scaled", "merit"]
+SCHOLARSHIPS = [0, 0.5, 1.0, 1.5, 2.0, 2.5]
+
+
+@pytest.fixture(scope="session")
+def data():
+    """
+    :return: the historical students and the applications, with scaled SAT and GPA
+    """
+    historical_student_data = pd.read_csv(os.path.join(ROOT, "college_student_enroll-s1-1.csv"))
+    applications = pd.read_csv(os.path.join(ROOT, "college_applications6000.csv"))
+    X = historical_student_data[["SAT", "GPA", "merit"]].copy()
+    y = historical_student_data["enroll"].to_numpy()
+    for feature in ["SAT", "GPA"]:
+        scaler = StandardScaler().fit(X[[feature]])
+        X[feature + "_scaled"] = scaler.transform(X[[feature]])
+        applications[feature + "_scaled"] = scaler.transform(applications[[feature]])
+    return X, y, applications
+
+
+@pytest.fixture(scope="session")
+def models(data):
+    """
+    :return: dict from "LinReg", "LogReg", "NN" (one hidden layer) and "DeepNN" (three hidden layers) to the fitted
+        model
+    """
+    X, y, _ = data
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return {"LinReg": LinearRegression().fit(X[FEATURES], y),
+                "LogReg": LogisticRegression(random_state=0, solver="lbfgs").fit(X[FEATURES], y),
+                "NN": MLPRegressor(hidden_layer_sizes=[10], random_state=0).fit(X[FEATURES], y),
+                "DeepNN": MLPRegressor(hidden_layer_sizes=[10, 10, 10], random_state=0).fit(X[FEATURES], y)}
+
+
+def get_sample(applications, n, seed=0):
+    """
+    :return: dict from "SAT_scaled" and "GPA_scaled" to the values of a sample of n applicants
+    """
+    sample = applications.sample(n, random_state=seed)
+    return {feature: sample[feature].to_numpy() for feature in ["SAT_scaled", "GPA_scaled"]}
+
+
+def build_model(pretrained_model, constant_features, discrete, budget_share=0.2, encoding=None):
+    """
+    Build the scholarship model of rewrite_08_20200430_s1.py.
+    :param pretrained_model: fitted model
+    :param constant_features: dict from "SAT_scaled" and "GPA_scaled" to arrays
+    :param discrete: True for the scholarship levels, False for a continuous domain between them
+    :param budget_share: budget per applicant
+    :param encoding: None, "lookup_table", "piecewise_linear", or the bound tightening of a neural network ("bigM",
+        "interval" or "lp")
+    :return: the model, the scholarships and the enroll probabilities
+    """
+    from janos_main import OptimizationPredictiveModel
+    from janos_batch import BatchJModel
+    n = constant_features["SAT_scaled"].size
+    m = BatchJModel()
+    m.set_output_flag(0)
+    m.add_gurobi_param_settings("MIPGap", 1e-6)
+    assign_scholarship = m.add_regular_variable_block(n, "assign_scholarship")
+    if discrete:
+        assign_scholarship.setDiscreteDomain(SCHOLARSHIPS)
+    else:
+        assign_scholarship.setContinuousDomain(SCHOLARSHIPS[0], SCHOLARSHIPS[-1])
+    predictive_model = OptimizationPredictiveModel(m, pretrained_model=pretrained_model, feature_names=FEATURES)
+    enroll_probabilities = m.add_predicted_variable_block(n, "enroll_probs")
+    enroll_probabilities.setObjectiveCoefficient(1)
+    enroll_probabilities.setPM(predictive_model, dict(constant_features, merit=assign_scholarship))
+    if encoding == "lookup_table":
+        enroll_probabilities.setLookupTable()
+    elif encoding == "piecewise_linear":
+        enroll_probabilities.setPiecewiseLinear()
+    elif encoding is not None:
+        enroll_probabilities.setBoundTightening(None if encoding == "bigM" else encoding)
+    m.add_block_constraint(assign_scholarship, np.ones(n), "less_equal", budget_share * n)
+    return m, assign_scholarship, enroll_probabilities
+
+
+def predict_enrollment(pretrained_model, constant_features, scholarships):
+    """
+    :return: the enroll probabilities that the pretrained model predicts for the scholarships
+    """
+    features = pd.DataFrame(dict(constant_features, merit=scholarships))[FEATURES]
+    if isinstance(pretrained_model, LogisticRegression):
+        return pretrained_model.predict_proba(features)[:, 1]
+    return np.ravel(pretrained_model.predict(features))
+
+
+def solve_by_dynamic_programming(table, costs, budget):
+    """
+    :param table: array (n, number of levels) of the value of every applicant at every level
+    :param costs: integer cost of every level
+    :param budget: integer budget
+    :return: the optimal value of the multiple-choice knapsack
+    """
+    best = np.zeros(budget + 1)
+    for values in table:
+        best = np.max([np.concatenate((np.full(cost, -np.inf), best[:budget + 1 - cost])) + value
+                       for cost, value in zip(costs, values)], axis=0)
+    return best.max()
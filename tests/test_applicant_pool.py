@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of applicant_pool.
+"""
+
+import numpy as np
+from conftest import FEATURES, SCHOLARSHIPS
+from applicant_pool import ApplicantPool
+from janos_batch import get_formulation, DERIVED_CACHE_SIZE
+
+
+def test_baseline_probabilities_stay_cached(data, models):
+    _, _, applications = data
+    pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+    baseline_probabilities = pool.get_baseline_probabilities(models["NN"], FEATURES, "merit", SCHOLARSHIPS)
+    formulation = get_formulation(models["NN"])
+    for seed in range(2 * DERIVED_CACHE_SIZE):
+        formulation.get_derived("lookup_table", [seed], lambda: np.zeros(1))
+    assert pool.get_baseline_probabilities(models["NN"], FEATURES, "merit", SCHOLARSHIPS) is baseline_probabilities
+    assert len(formulation.derived) == DERIVED_CACHE_SIZE
+
+
+def test_samples_match_dataframe_sample(data):
+    _, _, applications = data
+    pool = ApplicantPool(applications, ["SAT_scaled", "GPA_scaled"])
+    for size, seed, replace in [(50, 0, False), (500, 3, False), (len(applications), 1, False), (8000, 2, True)]:
+        reference = applications.sample(size, random_state=seed, replace=replace)
+        sample = pool.get_sample(size, seed, replace)
+        assert np.array_equal(applications.index[sample], reference.index)
+        features = pool.get_features(sample)
+        for feature_name in ["SAT_scaled", "GPA_scaled"]:
+            assert np.array_equal(features[feature_name], reference[feature_name].to_numpy())
+    assert pool.draw_samples([50], [0])[(50, 0)] is pool.get_sample(50, 0)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the encodings of janos_batch.
+"""
+
+import numpy as np
+import pytest
+from conftest import get_sample, build_model, predict_enrollment
+
+
+def test_lazy_refinement_keeps_coarse_encoding(data, models):
+    _, _, applications = data
+    constant_features = get_sample(applications, 12)
+    m, assign_scholarship, enroll_probabilities = build_model(models["LogReg"], constant_features, False)
+    enroll_probabilities.setLazyRefinement(0.01, max_rounds=0)
+    m.solve()
+    error = np.abs(predict_enrollment(models["LogReg"], constant_features, assign_scholarship.X) -
+                   enroll_probabilities.X)
+    coarse = enroll_probabilities.breakpoints.copy()
+
+    enroll_probabilities.max_refinement_rounds = 1
+    n_refined = enroll_probabilities.refine()
+    refined = enroll_probabilities.refined_breakpoints
+    assert n_refined == np.sum(error > 0.01 + 1e-6) > 0
+    for row in range(12):
+        old = np.unique(coarse[row])
+        new = np.unique(refined[row])
+        if error[row] <= 0.01 - 1e-6:
+            assert np.array_equal(old, new)
+        else:
+            # the new breakpoints are inside one interval of the coarse encoding
+            assert np.all(np.isin(old, new))
+            added = np.setdiff1d(new, old)
+            assert np.searchsorted(old, added.min()) == np.searchsorted(old, added.max())
+
+
+def test_lazy_refinement_meets_tolerance(data, models):
+    _, _, applications = data
+    constant_features = get_sample(applications, 12)
+    m, assign_scholarship, enroll_probabilities = build_model(models["LogReg"], constant_features, False)
+    enroll_probabilities.setLazyRefinement(0.01)
+    m.solve()
+    error = np.abs(predict_enrollment(models["LogReg"], constant_features, assign_scholarship.X) -
+                   enroll_probabilities.X)
+    assert enroll_probabilities.refinement_rounds < enroll_probabilities.max_refinement_rounds
+    assert np.all(error <= 0.01 + 1e-6)
+    # most applicants keep the few intervals of the coarse encoding
+    assert np.median(enroll_probabilities.n_intervals) < 10
+
+
+def test_update_of_compiled_model(data, models):
+    _, _, applications = data
+    first_sample = get_sample(applications, 20, seed=0)
+    second_sample = get_sample(applications, 20, seed=1)
+    m, _, enroll_probabilities = build_model(models["NN"], first_sample, True, encoding="lookup_table")
+    m.set_fast_paths(False)
+    m.solve()
+    compiled_model = m.backend.compiled_model[1]
+    enroll_probabilities.setConstantFeatures(second_sample)
+    m.solve()
+    # the lookup values are coefficients, so the rows of the lookup tables were replaced in the compiled model
+    assert m.backend.compiled_model[1] is compiled_model
+    fresh_model, _, _ = build_model(models["NN"], second_sample, True, encoding="lookup_table")
+    fresh_model.set_fast_paths(False)
+    fresh_model.solve()
+    assert m.gurobi_model.objVal == pytest.approx(fresh_model.gurobi_model.objVal, rel=1e-6)
+    rows = [constr.index for constr in m.backend.compiled_model[0].gurobi_constrs]
+    assert np.allclose(compiled_model.getA().toarray()[rows], fresh_model.gurobi_model.getA().toarray())
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the neuron bounds of janos_bounds.
+"""
+
+import numpy as np
+import pytest
+from conftest import get_sample, build_model, SCHOLARSHIPS
+from janos_backends import has_gurobi, GRB
+from janos_bounds import get_neuron_bounds
+
+
+def get_input_bounds(applications, n):
+    sample = get_sample(applications, n)
+    input_lb = np.column_stack((sample["SAT_scaled"], sample["GPA_scaled"], np.full(n, min(SCHOLARSHIPS))))
+    input_ub = input_lb.copy()
+    input_ub[:, 2] = max(SCHOLARSHIPS)
+    return input_lb, input_ub
+
+
+@pytest.mark.skipif(not has_gurobi(), reason="needs gurobipy")
+def test_lp_bounds_of_both_solvers(data, models):
+    _, _, applications = data
+    network = models["DeepNN"]
+    input_lb, input_ub = get_input_bounds(applications, 20)
+    gurobi_bounds = get_neuron_bounds(network.coefs_, network.intercepts_, input_lb, input_ub, "lp", "gurobi")
+    highs_bounds = get_neuron_bounds(network.coefs_, network.intercepts_, input_lb, input_ub, "lp", "highs")
+    for (gurobi_lb, gurobi_ub), (highs_lb, highs_ub) in zip(gurobi_bounds, highs_bounds):
+        assert np.allclose(gurobi_lb, highs_lb, atol=1e-5)
+        assert np.allclose(gurobi_ub, highs_ub, atol=1e-5)
+
+
+def test_lp_bounds_tighten_interval_bounds(data, models):
+    _, _, applications = data
+    network = models["DeepNN"]
+    input_lb, input_ub = get_input_bounds(applications, 20)
+    interval_bounds = get_neuron_bounds(network.coefs_, network.intercepts_, input_lb, input_ub, "interval")
+    lp_bounds = get_neuron_bounds(network.coefs_, network.intercepts_, input_lb, input_ub, "lp", "highs")
+    for (interval_lb, interval_ub), (lp_lb, lp_ub) in zip(interval_bounds, lp_bounds):
+        assert np.all(lp_lb >= interval_lb) and np.all(lp_ub <= interval_ub)
+    # the bounds contain the pre-activations of the network at every scholarship
+    for scholarship in np.linspace(min(SCHOLARSHIPS), max(SCHOLARSHIPS), 11):
+        post = input_lb.copy()
+        post[:, 2] = scholarship
+        for (lb, ub), w, b in zip(lp_bounds, network.coefs_, network.intercepts_):
+            pre = post @ w + b
+            assert np.all(pre >= lb - 1e-9) and np.all(pre <= ub + 1e-9)
+            post = np.maximum(pre, 0.0)
+
+
+def test_lp_bound_tightening_with_highs(data, models):
+    _, _, applications = data
+    objectives = []
+    for encoding in ["interval", "lp"]:
+        m, _, _ = build_model(models["DeepNN"], get_sample(applications, 10), True, encoding=encoding)
+        m.set_solver("highs")
+        m.solve()
+        assert m.gurobi_model.status == GRB.OPTIMAL
+        objectives.append(m.gurobi_model.objVal)
+    assert objectives[0] == pytest.approx(objectives[1], rel=1e-6)
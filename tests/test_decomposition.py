@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of janos_decomposition.
+"""
+
+import numpy as np
+import pytest
+from conftest import get_sample, build_model, predict_enrollment, solve_by_dynamic_programming, SCHOLARSHIPS
+from janos_decomposition import LagrangianDecomposition
+
+
+def test_breakpoint_candidates_of_several_chunks(data, models):
+    # chunks of a deep network have different numbers of breakpoints
+    _, _, applications = data
+    m, assign_scholarship, enroll_probabilities = build_model(models["DeepNN"], get_sample(applications, 600), False)
+    chunked = LagrangianDecomposition(n_workers=1, chunk_size=50)
+    candidates = chunked.get_breakpoint_candidates(assign_scholarship, [enroll_probabilities])
+    reference = LagrangianDecomposition(n_workers=1).get_breakpoint_candidates(assign_scholarship,
+                                                                               [enroll_probabilities])
+    assert candidates.shape[0] == 600
+    assert np.all(np.diff(candidates, axis=1) >= 0)
+    assert np.allclose(candidates[:, -1], assign_scholarship.upper_bound)
+    for row in range(600):
+        assert np.array_equal(np.unique(candidates[row]), np.unique(reference[row]))
+
+    m.set_decomposition(chunked)
+    m.solve()
+    assert assign_scholarship.X.sum() <= 0.2 * 600 + 1e-6
+
+
+@pytest.mark.parametrize("model_name", ["LogReg", "NN", "DeepNN"])
+def test_discrete_decomposition_is_the_multiple_choice_knapsack(data, models, model_name):
+    _, _, applications = data
+    n = 300
+    constant_features = get_sample(applications, n, seed=2)
+    table = np.column_stack([predict_enrollment(models[model_name], constant_features, np.full(n, level))
+                             for level in SCHOLARSHIPS])
+    reference = solve_by_dynamic_programming(table, [int(2 * level) for level in SCHOLARSHIPS], int(2 * 0.2 * n))
+    m, assign_scholarship, enroll_probabilities = build_model(models[model_name], constant_features, True)
+    m.set_decomposition(LagrangianDecomposition(n_workers=1))
+    m.solve()
+    assert assign_scholarship.X.sum() <= 0.2 * n + 1e-6
+    assert np.allclose(enroll_probabilities.X, predict_enrollment(models[model_name], constant_features,
+                                                                  assign_scholarship.X))
+    # the decomposition is a heuristic with a valid bound, which is optimal if the duality gap closes
+    assert reference * (1 - 1e-3) <= m.gurobi_model.objVal <= reference + 1e-6
+    assert m.gurobi_model.objBound >= reference - 1e-6
+    if m.gurobi_model.status == 2:
+        assert m.gurobi_model.objVal == pytest.approx(reference, abs=1e-6)
+
+
+def test_continuous_budget_is_spent(data, models):
+    _, _, applications = data
+    constant_features = get_sample(applications, 12)
+    reference, _, enroll_probabilities = build_model(models["NN"], constant_features, False)
+    enroll_probabilities.setPiecewiseLinear()
+    reference.solve()
+
+    m, assign_scholarship, _ = build_model(models["NN"], constant_features, False)
+    m.set_decomposition(LagrangianDecomposition(n_workers=1))
+    m.solve()
+    assert abs(assign_scholarship.X.sum() - 0.2 * 12) < 1e-6
+    assert m.gurobi_model.objVal >= reference.gurobi_model.objVal - 0.05
+    assert m.gurobi_model.objBound >= reference.gurobi_model.objVal - 1e-6
+
+
+def test_logistic_regression_dual_is_exact(data, models):
+    _, _, applications = data
+    m, assign_scholarship, enroll_probabilities = build_model(models["LogReg"], get_sample(applications, 1000),
+                                                              False)
+    m.add_gurobi_param_settings("MIPGap", 1e-3)
+    m.set_decomposition(LagrangianDecomposition(n_workers=1))
+    m.solve()
+    assert m.gurobi_model.status == 2
+    assert abs(assign_scholarship.X.sum() - 200) < 1e-6
+    probabilities = predict_enrollment(models["LogReg"], get_sample(applications, 1000), assign_scholarship.X)
+    assert np.allclose(enroll_probabilities.X, probabilities)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the encodings of the predictive models in janos_batch, against the exact lookup table (a multiple-choice
+knapsack) and against each other.
+"""
+
+import numpy as np
+import pytest
+from conftest import get_sample, build_model, predict_enrollment, solve_by_dynamic_programming, SCHOLARSHIPS
+
+N = 20
+
+
+def solve(pretrained_model, constant_features, discrete, encoding=None, fast_paths=False):
+    m, assign_scholarship, enroll_probabilities = build_model(pretrained_model, constant_features, discrete,
+                                                              encoding=encoding)
+    m.set_fast_paths(fast_paths)
+    m.solve()
+    assert m.gurobi_model.status == 2
+    return m.gurobi_model.objVal, assign_scholarship.X, enroll_probabilities.X
+
+
+@pytest.mark.parametrize("model_name", ["LinReg", "NN", "DeepNN"])
+def test_discrete_encoding_is_exact(data, models, model_name):
+    _, _, applications = data
+    constant_features = get_sample(applications, N)
+    reference, _, _ = solve(models[model_name], constant_features, True, "lookup_table")
+    obj_val, scholarships, probabilities = solve(models[model_name], constant_features, True)
+    assert obj_val == pytest.approx(reference, abs=1e-4)
+    assert np.all(np.isin(np.round(scholarships, 6), SCHOLARSHIPS))
+    assert np.allclose(probabilities, predict_enrollment(models[model_name], constant_features, scholarships),
+                       atol=1e-4)
+
+
+def test_logistic_encoding_is_close_to_exact(data, models):
+    # the sigmoid is linearized between breakpoints, so the solution is near optimal for the true probabilities
+    _, _, applications = data
+    constant_features = get_sample(applications, N)
+    reference, _, _ = solve(models["LogReg"], constant_features, True, "lookup_table")
+    _, scholarships, _ = solve(models["LogReg"], constant_features, True)
+    true_val = predict_enrollment(models["LogReg"], constant_features, scholarships).sum()
+    assert reference - 0.01 * N <= true_val <= reference + 1e-6
+
+
+@pytest.mark.parametrize("model_name", ["LinReg", "LogReg", "NN"])
+def test_lookup_table_is_the_multiple_choice_knapsack(data, models, model_name):
+    _, _, applications = data
+    constant_features = get_sample(applications, N)
+    table = np.column_stack([predict_enrollment(models[model_name], constant_features, np.full(N, level))
+                             for level in SCHOLARSHIPS])
+    # the levels are multiples of 0.5
+    reference = solve_by_dynamic_programming(table, [int(2 * level) for level in SCHOLARSHIPS], int(2 * 0.2 * N))
+    obj_val, scholarships, probabilities = solve(models[model_name], constant_features, True, "lookup_table")
+    levels = np.searchsorted(SCHOLARSHIPS, np.round(scholarships, 6))
+    assert np.allclose(probabilities, table[np.arange(N), levels])
+    assert obj_val == pytest.approx(reference, abs=1e-5)
+
+
+@pytest.mark.parametrize("discrete", [True, False])
+def test_neural_network_encodings_agree(data, models, discrete):
+    _, _, applications = data
+    constant_features = get_sample(applications, 10)
+    objectives = {}
+    for encoding in ["bigM", "interval", "lp", "piecewise_linear"]:
+        obj_val, scholarships, probabilities = solve(models["DeepNN"], constant_features, discrete, encoding)
+        assert np.allclose(probabilities, predict_enrollment(models["DeepNN"], constant_features, scholarships),
+                           atol=1e-4)
+        objectives[encoding] = obj_val
+    for encoding in ["interval", "lp", "piecewise_linear"]:
+        assert objectives[encoding] == pytest.approx(objectives["bigM"], abs=1e-4)
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of experiment_runner.
+"""
+
+from experiment_runner import build_grid, get_worker_models
+
+
+def test_worker_models_are_kept_per_cell():
+    jobs = build_grid([1, 2], [50], range(3))
+    assert jobs[:3] == [(1, 50, 0), (1, 50, 1), (1, 50, 2)]
+    models = get_worker_models(jobs[0][:-1])
+    models["janos_discrete"] = "model"
+    assert get_worker_models(jobs[1][:-1]) is models
+    assert get_worker_models(jobs[3][:-1]) == {}
+    assert get_worker_models(jobs[0][:-1]) == {}
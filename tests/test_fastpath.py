@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the fast paths of janos_fastpath against the MIP and the exact multiple-choice knapsack.
+"""
+
+import numpy as np
+import pytest
+from conftest import get_sample, build_model, predict_enrollment, solve_by_dynamic_programming, SCHOLARSHIPS
+
+
+def test_linear_knapsack(data, models):
+    _, _, applications = data
+    constant_features = get_sample(applications, 50)
+    objectives = []
+    for fast_paths in [False, True]:
+        m, assign_scholarship, _ = build_model(models["LinReg"], constant_features, False)
+        m.set_fast_paths(fast_paths)
+        m.solve()
+        assert m.gurobi_model.status == 2
+        assert assign_scholarship.X.sum() <= 0.2 * 50 + 1e-6
+        objectives.append(m.gurobi_model.objVal)
+    assert m.gurobi_model.method == "linear_knapsack"
+    assert objectives[1] == pytest.approx(objectives[0], abs=1e-6)
+
+
+@pytest.mark.parametrize("model_name", ["LogReg", "NN"])
+def test_multiple_choice_knapsack(data, models, model_name):
+    _, _, applications = data
+    n = 300
+    constant_features = get_sample(applications, n, seed=1)
+    table = np.column_stack([predict_enrollment(models[model_name], constant_features, np.full(n, level))
+                             for level in SCHOLARSHIPS])
+    reference = solve_by_dynamic_programming(table, [int(2 * level) for level in SCHOLARSHIPS], int(2 * 0.2 * n))
+    m, assign_scholarship, enroll_probabilities = build_model(models[model_name], constant_features, True,
+                                                              encoding="lookup_table")
+    m.solve()
+    assert m.gurobi_model.method == "multiple_choice_knapsack"
+    assert m.gurobi_model.status == 2
+    assert assign_scholarship.X.sum() <= 0.2 * n + 1e-6
+    assert np.allclose(enroll_probabilities.X, predict_enrollment(models[model_name], constant_features,
+                                                                  assign_scholarship.X))
+    assert m.gurobi_model.objVal == pytest.approx(reference, abs=1e-6)
+    assert m.gurobi_model.objBound >= reference - 1e-6
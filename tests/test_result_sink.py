@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the result files of result_sink.
+"""
+
+import numpy as np
+import pytest
+from result_sink import ResultSink, read_results, summarize_scale_results
+
+COLUMNS = ["PM", "student_size", "configuration", "iteration", "janos_time"]
+
+
+@pytest.mark.parametrize("extension", [".txt", ".tsv", ".csv", ".parquet"])
+def test_round_trip(tmp_path, extension):
+    if extension == ".parquet":
+        pytest.importorskip("pyarrow")
+    filename = str(tmp_path / ("results" + extension))
+    rows = [["LogReg", 50, 10, 0, 1.5], ["LinReg", 50, None, 1, 0.25], ["NN", 100], ["greedy", 100, 2, 2, 3.0]]
+    with ResultSink(filename, COLUMNS, buffer_size=2) as sink:
+        sink.write_rows(rows[:3])
+        sink.write(rows[3])
+    results = read_results(filename)
+    assert list(results.columns) == COLUMNS
+    assert list(results["PM"]) == ["LogReg", "LinReg", "NN", "greedy"]
+    assert list(results["student_size"]) == [50, 50, 100, 100]
+    # None and the padding of short rows are read back as missing values
+    assert np.array_equal(results["configuration"].to_numpy(dtype=float), [10, np.nan, np.nan, 2], equal_nan=True)
+    assert np.array_equal(results["janos_time"].to_numpy(dtype=float), [1.5, 0.25, np.nan, 3.0], equal_nan=True)
+    if extension != ".parquet":
+        with open(filename) as file:
+            assert file.read().splitlines()[3].endswith("NULL")
+
+
+def test_summary_of_mixed_files(tmp_path):
+    linear = str(tmp_path / "linear.txt")
+    logistic = str(tmp_path / "logistic.csv")
+    with ResultSink(linear, COLUMNS) as sink:
+        sink.write(["LinReg", 50, None, 0, 1.0])
+        sink.write(["LinReg", 50, None, 1, 3.0])
+    with ResultSink(logistic, COLUMNS) as sink:
+        sink.write(["LogReg", 50, 10, 0, 2.0])
+        sink.write(["LogReg", 50])
+    summary = summarize_scale_results([linear, logistic])
+    assert list(summary["Model"]) == ["LinReg", "LogReg(10)", "LogReg"]
+    assert list(summary["Average of janos_time"].fillna(-1)) == [2.0, 2.0, -1]